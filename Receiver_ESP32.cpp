@@ -1,12 +1,28 @@
 #include <esp_now.h>
 #include <WiFi.h>
 
+// Her mesaja sıra numarası ve alıcı saati (millis) eklenir.
+// Python tarafı (clock_sync.py) bunlarla saat farkını ve kayıp mesajları hesaplar.
+// Format: "ir laser fired from gun a1 seq=12 t=345678"
+// Gönderici "A1"/"A2" yollar; harf silahı, rakam düğmeyi belirtir, ikisi de iletilir.
+uint32_t sequenceNumber = 0;
+
 void OnDataRecv(const esp_now_recv_info *recv_info, const uint8_t *incomingData, int len) {
-  String receivedString = "";
-  for (int i = 0; i < 2; i++) {
-    receivedString += (char)incomingData[i];
+  unsigned long receivedAt = millis();
+  if (len < 1) {
+    return;
+  }
+  char gun = tolower((char)incomingData[0]);
+
+  Serial.print("ir laser fired from gun ");
+  Serial.print(gun);
+  if (len > 1 && isdigit(incomingData[1])) {
+    Serial.print((char)incomingData[1]);
   }
-    Serial.println(receivedString);
+  Serial.print(" seq=");
+  Serial.print(sequenceNumber++);
+  Serial.print(" t=");
+  Serial.println(receivedAt);
 }
 
 void setup() {
@@ -33,6 +33,13 @@ const unsigned long LASER_DURATION = 50;
 const unsigned long MOTOR_DURATION = 100;
 const unsigned long BUZZER_DURATION = 200;
 
+// Lazer kodu (blink_codes.py): USE_LASER_CODE açıkken lazer tek 50 ms darbe yerine
+// her biti LASER_BIT_MS süren bu kodu yanıp söner, kamera silahı koddan tanır.
+// Her silahın kodu farklı olmalı, ilk bit her zaman 1 (a: "101101", c: "110101").
+const bool USE_LASER_CODE = false;
+const char LASER_CODE[] = "101101";
+const unsigned long LASER_BIT_MS = 25;
+
 void OnDataSent(const uint8_t *mac_addr, esp_now_send_status_t status) {
   Serial.print("Send Status: ");
   Serial.println(status == ESP_NOW_SEND_SUCCESS ? "Success" : "Fail");
@@ -119,7 +126,15 @@ void loop() {
 
   unsigned long now = millis();
 
-  if (laserActive && (now - laserStart >= LASER_DURATION)) {
+  if (laserActive && USE_LASER_CODE) {
+    unsigned long slot = (now - laserStart) / LASER_BIT_MS;
+    if (slot >= strlen(LASER_CODE)) {
+      digitalWrite(LASER_CONTROL_PIN, LOW);
+      laserActive = false;
+    } else {
+      digitalWrite(LASER_CONTROL_PIN, LASER_CODE[slot] == '1' ? HIGH : LOW);
+    }
+  } else if (laserActive && (now - laserStart >= LASER_DURATION)) {
     digitalWrite(LASER_CONTROL_PIN, LOW);
     laserActive = false;
   }
@@ -1,5 +1,10 @@
+import os
+import sys
 import cv2
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from camera_modes import decode_fourcc, probe_modes
+
 # Open the webcam
 cap = cv2.VideoCapture(0)
 
@@ -7,6 +12,8 @@ cap = cv2.VideoCapture(0)
 properties = {
     cv2.CAP_PROP_FRAME_WIDTH: "Frame Width",
     cv2.CAP_PROP_FRAME_HEIGHT: "Frame Height",
+    cv2.CAP_PROP_FPS: "FPS",
+    cv2.CAP_PROP_FOURCC: "FOURCC",
     cv2.CAP_PROP_BRIGHTNESS: "Brightness",
     cv2.CAP_PROP_CONTRAST: "Contrast",
     cv2.CAP_PROP_SATURATION: "Saturation",
@@ -23,7 +30,14 @@ for prop_id, prop_name in properties.items():
     # If value is -1, it usually means "not supported" on Mac
     if value == -1 or value == 0:
         print(f"{prop_name}: Not supported or 0")
+    elif prop_id == cv2.CAP_PROP_FOURCC:
+        print(f"{prop_name}: {decode_fourcc(value)}")
     else:
         print(f"{prop_name}: {value}")
 
-cap.release()
\ No newline at end of file
+cap.release()
+
+# Full resolution / FOURCC / FPS scan. Use camera_modes.py to store the best one.
+print("=== Supported capture modes ===")
+for mode in probe_modes(0, backend=cv2.CAP_ANY, sample_frames=30):
+    print(mode)
@@ -0,0 +1,289 @@
+import os
+import time
+import sqlite3
+import argparse
+import datetime
+import threading
+import logging
+
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+logger = logging.getLogger("Analytics")
+
+HEATMAP_BINS = (96, 54)  # projector 16:9, 20 px cells at 1920x1080
+MAX_SHOT_INTERVAL = 10.0  # s, longer gaps are pauses, not reaction time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    ended REAL,
+    screen_width INTEGER NOT NULL,
+    screen_height INTEGER NOT NULL,
+    bins_x INTEGER NOT NULL,
+    bins_y INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hits (
+    session_id INTEGER NOT NULL,
+    time REAL NOT NULL,
+    gun TEXT NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    latency_ms REAL,
+    surface TEXT NOT NULL DEFAULT 'screen'
+);
+CREATE INDEX IF NOT EXISTS hits_time ON hits (time);
+CREATE TABLE IF NOT EXISTS heatmaps (
+    session_id INTEGER NOT NULL,
+    surface TEXT NOT NULL DEFAULT 'screen',
+    gun TEXT NOT NULL,
+    counts BLOB NOT NULL,
+    PRIMARY KEY (session_id, surface, gun)
+);
+"""
+
+
+def migrate(connection):
+    """Adds the surface columns to databases written before side surfaces existed."""
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(hits)")}
+    if columns and "surface" not in columns:
+        connection.execute("ALTER TABLE hits ADD COLUMN surface TEXT NOT NULL DEFAULT 'screen'")
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(heatmaps)")}
+    if columns and "surface" not in columns:
+        # The primary key changes, so the table is rebuilt
+        connection.executescript("""
+            ALTER TABLE heatmaps RENAME TO heatmaps_old;
+            CREATE TABLE heatmaps (
+                session_id INTEGER NOT NULL,
+                surface TEXT NOT NULL DEFAULT 'screen',
+                gun TEXT NOT NULL,
+                counts BLOB NOT NULL,
+                PRIMARY KEY (session_id, surface, gun)
+            );
+            INSERT INTO heatmaps (session_id, gun, counts) SELECT session_id, gun, counts FROM heatmaps_old;
+            DROP TABLE heatmaps_old;
+        """)
+
+
+class HitAnalytics:
+    """
+    Per-surface and per-gun hit heatmaps and hit rows, persisted to SQLite.
+
+    record_hit() only increments a preallocated histogram cell and appends a
+    tuple to a list; the writer thread swaps that list out every
+    flush_interval seconds and on close() and writes it with one
+    executemany() transaction, together with snapshots of the histograms.
+    Times are stored as wall-clock epoch seconds so sessions can be grouped by
+    day. Every surface's heatmap covers its own output region with the same
+    number of bins; the main screen "screen" is (0, 0, screen_width, screen_height).
+    """
+    def __init__(self, database="analytics.sqlite", screen_width=1920, screen_height=1080,
+                 bins=HEATMAP_BINS, flush_interval=30):
+        self.database = database
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.bins_x, self.bins_y = bins
+        self.flush_interval = flush_interval
+        self.cell_width = screen_width / self.bins_x
+        self.cell_height = screen_height / self.bins_y
+
+        self.histograms = {}
+        self.pending = []
+        self.recorded_hits = 0
+        self.session_id = None
+        self.stop_event = threading.Event()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._writer, name="analytics", daemon=True)
+        self.thread.start()
+
+    def histogram(self, gun, surface="screen"):
+        histogram = self.histograms.get((surface, gun))
+        if histogram is None:
+            # Only the first hit of a gun on a surface allocates
+            histogram = self.histograms.setdefault(
+                (surface, gun), np.zeros((self.bins_y, self.bins_x), dtype=np.int32))
+        return histogram
+
+    def record_hit(self, gun, x, y, frame_time, trigger_time, surface="screen", region=None):
+        # frame_time: monotonic s, trigger_time: monotonic ms (see take_gun_signal),
+        # region: (x, y, width, height) of the surface in output coordinates
+        if region is None:
+            column = int(x / self.cell_width)
+            row = int(y / self.cell_height)
+        else:
+            region_x, region_y, width, height = region
+            column = int((x - region_x) * self.bins_x / width)
+            row = int((y - region_y) * self.bins_y / height)
+        column = min(self.bins_x - 1, max(0, column))
+        row = min(self.bins_y - 1, max(0, row))
+        self.histogram(gun, surface)[row, column] += 1
+        self.pending.append((frame_time, gun, x, y, frame_time * 1000 - trigger_time, surface))
+        self.recorded_hits += 1
+
+    def _writer(self):
+        # The connection belongs to this thread, sqlite3 objects must not cross threads
+        connection = sqlite3.connect(self.database)
+        try:
+            connection.executescript(SCHEMA)
+            migrate(connection)
+            with connection:
+                cursor = connection.execute(
+                    "INSERT INTO sessions (started, screen_width, screen_height, bins_x, bins_y) VALUES (?, ?, ?, ?, ?)",
+                    (time.time(), self.screen_width, self.screen_height, self.bins_x, self.bins_y))
+            self.session_id = cursor.lastrowid
+            self.ready.set()
+
+            while not self.stop_event.wait(self.flush_interval):
+                self._flush(connection)
+            self._flush(connection, ended=time.time())
+        except sqlite3.Error as e:
+            logger.error(f"Analytics database error: {e}")
+        finally:
+            self.ready.set()
+            connection.close()
+
+    def _flush(self, connection, ended=None):
+        rows, self.pending = self.pending, []
+        wall_offset = time.time() - time.monotonic()
+        histograms = [(key, histogram.copy()) for key, histogram in list(self.histograms.items())]
+        with connection:
+            connection.executemany(
+                "INSERT INTO hits (session_id, time, gun, x, y, latency_ms, surface) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(self.session_id, t + wall_offset, gun, x, y, latency, surface)
+                 for t, gun, x, y, latency, surface in rows])
+            connection.executemany(
+                "INSERT OR REPLACE INTO heatmaps (session_id, surface, gun, counts) VALUES (?, ?, ?, ?)",
+                [(self.session_id, surface, gun, histogram.tobytes()) for (surface, gun), histogram in histograms])
+            if ended is not None:
+                connection.execute("UPDATE sessions SET ended = ? WHERE id = ?", (ended, self.session_id))
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(timeout=10)
+        logger.info(f"Analytics stored {self.recorded_hits} hits in {self.database}.")
+
+
+def day_range(day):
+    start = datetime.datetime.combine(day, datetime.time()).timestamp()
+    return start, start + 24 * 3600
+
+
+def load_heatmaps(connection, start, end):
+    """
+    Sums the stored per-session histograms of all sessions overlapping [start, end)
+    into {(surface, gun): array}.
+    """
+    totals = {}
+    query = """
+        SELECT h.surface, h.gun, h.counts, s.bins_x, s.bins_y FROM heatmaps h JOIN sessions s ON s.id = h.session_id
+        WHERE s.started < ? AND COALESCE(s.ended, s.started) >= ?
+    """
+    for surface, gun, counts, bins_x, bins_y in connection.execute(query, (end, start)):
+        key = (surface, gun)
+        histogram = np.frombuffer(counts, dtype=np.int32).reshape(bins_y, bins_x)
+        if key in totals and totals[key].shape != histogram.shape:
+            histogram = cv2.resize(histogram.astype(np.float32), totals[key].shape[::-1],
+                                   interpolation=cv2.INTER_AREA).astype(np.int32)
+        totals[key] = totals[key] + histogram if key in totals else histogram.copy()
+    return totals
+
+
+# One gun's hits of a time range, with the time since that gun's previous hit in the same session
+SHOTS = """
+    WITH data AS (
+        SELECT latency_ms, time - LAG(time) OVER (PARTITION BY session_id ORDER BY time) AS interval
+        FROM hits WHERE time >= ? AND time < ? AND gun = ?
+    )
+"""
+
+
+def quantile(connection, params, column, condition, condition_params, count, q):
+    # ORDER BY ... OFFSET picks the quantile inside SQLite instead of fetching the column
+    row = connection.execute(
+        f"{SHOTS} SELECT {column} FROM data WHERE {condition} ORDER BY {column} LIMIT 1 OFFSET ?",
+        params + condition_params + (min(count - 1, int(q * count)),)).fetchone()
+    return row[0] if row else float("nan")
+
+
+def hit_statistics(connection, start, end):
+    """
+    Per-gun hit counts, trigger-to-frame latency and time between shots for [start, end).
+    Everything is aggregated in SQL, only one row per gun and statistic comes back.
+    """
+    statistics = {}
+    rows = connection.execute(
+        "SELECT gun, COUNT(*) FROM hits WHERE time >= ? AND time < ? GROUP BY gun ORDER BY gun",
+        (start, end)).fetchall()
+    for gun, hits in rows:
+        params = (start, end, gun)
+        latency_condition, latency_params = "latency_ms IS NOT NULL", ()
+        # Gaps longer than MAX_SHOT_INTERVAL are pauses between rounds, not reaction time
+        interval_condition, interval_params = "interval IS NOT NULL AND interval <= ?", (MAX_SHOT_INTERVAL,)
+        latency_count, latency_mean = connection.execute(
+            f"{SHOTS} SELECT COUNT(latency_ms), AVG(latency_ms) FROM data", params).fetchone()
+        interval_count, interval_mean = connection.execute(
+            f"{SHOTS} SELECT COUNT(interval), AVG(interval) FROM data WHERE {interval_condition}",
+            params + interval_params).fetchone()
+
+        stats = {"hits": hits, "latency_mean_ms": latency_mean, "shot_intervals": interval_count,
+                 "shot_interval_mean_s": interval_mean}
+        for q in (0.5, 0.9):
+            stats[f"latency_p{int(q * 100)}_ms"] = quantile(
+                connection, params, "latency_ms", latency_condition, latency_params, latency_count, q) \
+                if latency_count else float("nan")
+            stats[f"shot_interval_p{int(q * 100)}_s"] = quantile(
+                connection, params, "interval", interval_condition, interval_params, interval_count, q) \
+                if interval_count else float("nan")
+        statistics[gun] = stats
+    return statistics
+
+
+def render_heatmap(histogram, width=960):
+    """BGR image of a histogram, blurred and normalised to its own maximum."""
+    heat = cv2.GaussianBlur(histogram.astype(np.float32), (5, 5), 0)
+    heat /= heat.max() or 1.0
+    image = cv2.applyColorMap((heat * 255).astype(np.uint8), cv2.COLORMAP_JET)
+    height = width * histogram.shape[0] // histogram.shape[1]
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def report(database, day, output_directory):
+    start, end = day_range(day)
+    connection = sqlite3.connect(database)
+    try:
+        heatmaps = load_heatmaps(connection, start, end)
+        statistics = hit_statistics(connection, start, end)
+    finally:
+        connection.close()
+
+    if not heatmaps and not statistics:
+        print(f"No hits recorded on {day}.")
+        return
+    os.makedirs(output_directory, exist_ok=True)
+    for surface in {surface for surface, _ in heatmaps}:
+        heatmaps[(surface, "all")] = sum(h for (s, _), h in list(heatmaps.items()) if s == surface)
+    for (surface, gun), histogram in heatmaps.items():
+        path = os.path.join(output_directory, f"heatmap_{surface}_{gun.replace(':', '-')}.png")
+        cv2.imwrite(path, render_heatmap(histogram))
+        print(f"{path}: {int(histogram.sum())} hits")
+
+    print(f"{'gun':<6}{'hits':>7}{'latency mean/p50/p90 ms':>28}{'shot interval mean/p50/p90 s':>32}")
+    for gun, s in statistics.items():
+        latency = f"{s['latency_mean_ms'] or float('nan'):.0f} / {s['latency_p50_ms']:.0f} / {s['latency_p90_ms']:.0f}"
+        interval = (f"{s['shot_interval_mean_s'] or float('nan'):.2f} / {s['shot_interval_p50_s']:.2f} / "
+                    f"{s['shot_interval_p90_s']:.2f}")
+        print(f"{gun:<6}{s['hits']:>7}{latency:>28}{interval:>32}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Render hit heatmaps and shot statistics for one day.")
+    parser.add_argument("--database", default="analytics.sqlite")
+    parser.add_argument("--day", type=datetime.date.fromisoformat, default=datetime.date.today(),
+                        help="YYYY-MM-DD, default today")
+    parser.add_argument("--output", default=None, help="directory for the heatmap images")
+    args = parser.parse_args()
+    report(args.database, args.day, args.output or os.path.join("analytics_report", args.day.isoformat()))
@@ -0,0 +1,327 @@
+import time
+import asyncio
+import collections
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import serial
+
+from camera_session import get_session, release_session
+
+logger = logging.getLogger("AsyncRuntime")
+
+
+class AsyncRuntime:
+    """
+    Runs a LaserDetectionSystem on one asyncio event loop.
+
+    Serial input, capture, processing, injection and the preview are tasks.
+    Blocking calls (camera reads, OpenCV, serial reads, pyautogui) run on small
+    dedicated executors so they never share a worker. The frame queue drops its
+    oldest frame when processing falls behind; the hit queue applies real
+    backpressure, because hits must not be dropped. stop() cancels every task,
+    lets the frame being analysed finish and delivers its hits, waits for the
+    executors and releases the camera, serial port and servers before run()
+    returns.
+
+    restart(config) only restarts the processing and injection tasks, after
+    the same drain. The camera and serial port stay open, so applying a config
+    takes milliseconds.
+    """
+    def __init__(self, system, frame_queue_size=2, hit_queue_size=64, preview_fps=15, serial_timeout=0.2,
+                 show_preview=True):
+        self.system = system
+        self.show_preview = show_preview
+        self.frame_queue_size = frame_queue_size
+        self.hit_queue_size = hit_queue_size
+        self.preview_interval = 1.0 / preview_fps
+        self.serial_timeout = serial_timeout
+
+        self.loop = None
+        self.stop_requested = None
+        self.frame_queue = None
+        self.hit_queue = None
+        self.analysis_lock = None
+        self.analysed_hits = collections.deque()  # (frame_time, hits) analysed but not in hit_queue yet
+        self.subscription = None
+        self.preview_frame = None
+        self.dropped_frames = 0
+        self.tasks = []
+        self.pipeline_tasks = []
+
+    def run(self):
+        try:
+            asyncio.run(self.main())
+        except KeyboardInterrupt:
+            logger.info("Exiting...")
+
+    def stop(self):
+        # Safe to call from any thread
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.stop_requested.set)
+
+    def request_restart(self, config):
+        """Thread-safe wrapper for restart(); config maps LaserDetectionSystem attributes to new values."""
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(lambda: self.loop.create_task(self.restart(config)))
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stop_requested = asyncio.Event()
+        self.frame_queue = asyncio.Queue(maxsize=self.frame_queue_size)
+        self.hit_queue = asyncio.Queue(maxsize=self.hit_queue_size)
+        # Held by process() while it analyses a batch. Its hits are queued after releasing it, waiting
+        # on a full hit queue under the lock would block drain_pipeline() for good
+        self.analysis_lock = asyncio.Lock()
+        self.capture_executor = ThreadPoolExecutor(1, thread_name_prefix="capture")
+        self.process_executor = ThreadPoolExecutor(1, thread_name_prefix="process")
+        self.injection_executor = ThreadPoolExecutor(1, thread_name_prefix="injection")
+        self.serial_executor = ThreadPoolExecutor(1, thread_name_prefix="serial")
+
+        system = self.system
+        system.stop_event.clear()
+        # Button key presses come from handle_serial_line(), on this loop with one receiver
+        system.on_button = self.queue_button
+        session = system.camera = system.camera_session or get_session(
+            system.CAMERA_INDEX, system.CAMERA_MODE, system.cv2_backend)
+        try:
+            opened = await self.loop.run_in_executor(self.capture_executor, session.wait_until_opened, 10)
+            if not opened:
+                logger.error("Could not open camera.")
+                return
+            self.subscription = system.camera_subscription = session.subscribe()
+
+            self.tasks = [
+                asyncio.create_task(self.serial_input(), name="serial"),
+                asyncio.create_task(self.capture(), name="capture"),
+            ]
+            if self.show_preview:
+                self.tasks.append(asyncio.create_task(self.preview(), name="preview"))
+            self.start_pipeline()
+            await self.stop_requested.wait()
+        finally:
+            await self.shutdown()
+
+    def start_pipeline(self):
+        self.pipeline_tasks = [
+            asyncio.create_task(self.process(), name="process"),
+            asyncio.create_task(self.inject(), name="inject"),
+        ]
+
+    async def cancel(self, tasks):
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def drain_pipeline(self):
+        """Cancels process() and inject() once the batch in analysis is queued and every queued hit delivered."""
+        # analyse_frame has already taken the gun signal, cancelling it mid-call would lose the hit
+        async with self.analysis_lock:
+            await self.cancel([task for task in self.pipeline_tasks if task.get_name() == "process"])
+            if any(task.get_name() == "inject" and not task.done() for task in self.pipeline_tasks):
+                # Hits process() had not queued yet, inject() makes room for them
+                while self.analysed_hits:
+                    await self.hit_queue.put(self.analysed_hits[0])
+                    self.analysed_hits.popleft()
+                await self.hit_queue.join()
+            await self.cancel(self.pipeline_tasks)
+
+    async def restart(self, config):
+        start = time.perf_counter()
+        await self.drain_pipeline()
+        # Queued frames belong to the old config
+        while not self.frame_queue.empty():
+            self.frame_queue.get_nowait()
+        for name, value in config.items():
+            setattr(self.system, name, value)
+        self.start_pipeline()
+        logger.info(f"Pipeline restarted with {sorted(config)} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    async def shutdown(self):
+        system = self.system
+        system.stop_event.set()
+        if self.subscription is not None:
+            # Wakes a capture worker blocked in subscription.get()
+            self.subscription.close()
+        if system.serial_connection is not None:
+            try:
+                system.serial_connection.cancel_read()
+            except Exception:
+                pass
+        await self.cancel(self.tasks)
+        await self.drain_pipeline()
+
+        # Only left over if inject() was cancelled; deliver before tearing the outputs down
+        leftover = []
+        while not self.hit_queue.empty():
+            leftover.append(self.hit_queue.get_nowait())
+        leftover.extend(self.analysed_hits)
+        self.analysed_hits.clear()
+        for frame_time, hits in leftover:
+            await self.deliver_batch(frame_time, hits)
+
+        # Serial first, the serial hub can still queue button presses until it returns
+        for executor in (self.serial_executor, self.capture_executor, self.process_executor, self.injection_executor):
+            executor.shutdown(wait=True)
+        system.on_button = None
+
+        if self.subscription is not None:
+            system.camera.unsubscribe(self.subscription)
+        if system.camera_session is None:
+            release_session(system.CAMERA_INDEX)
+        if self.show_preview:
+            cv2.destroyAllWindows()
+        system.release_resources()
+        logger.info("Runtime stopped.")
+
+    async def serial_input(self):
+        system = self.system
+        if len(system.serial_ports) > 1:
+            # The hub multiplexes all receivers itself and returns once stop_event is set
+            await self.loop.run_in_executor(self.serial_executor, system.read_serial_ports)
+            return
+        if not system.serial_port:
+            return
+
+        partial = b""
+        while True:
+            if system.serial_connection is None:
+                await self.loop.run_in_executor(self.serial_executor, system.start_serial)
+                if system.serial_connection is None:
+                    await asyncio.sleep(system.SERIAL_RECONNECT_DELAY)
+                    continue
+                system.serial_connection.timeout = self.serial_timeout
+                partial = b""
+
+            line = await self.loop.run_in_executor(self.serial_executor, self.read_line)
+            if not line:
+                continue
+            if not line.endswith(b"\n"):
+                partial += line
+                continue
+            data = (partial + line).decode("utf-8", errors="replace").strip().lower()
+            partial = b""
+            system.handle_serial_line(data, time.monotonic() * 1000)
+
+    def read_line(self):
+        system = self.system
+        connection = system.serial_connection
+        try:
+            return connection.readline()
+        except (serial.SerialException, OSError, TypeError, AttributeError) as e:
+            if system.stop_event.is_set():
+                return None
+            logger.error(f"Serial error: {e}")
+            try:
+                connection.close()
+            except Exception:
+                pass
+            system.serial_connection = None
+            system.serial_reconnects.inc()
+            return None
+
+    async def capture(self):
+        system = self.system
+        while True:
+            item = await self.loop.run_in_executor(self.capture_executor, self.subscription.get, 0.5)
+            if item is None:
+                if not system.camera.is_running():
+                    logger.error("Could not read frame.")
+                    self.stop_requested.set()
+                    return
+                continue
+
+            frame, frame_time = item
+            system.capture_fps.tick()
+            if system.recorder and system.record_frames:
+                system.recorder.record_frame(frame, frame_time * 1000)
+            if self.frame_queue.full():
+                # Processing is behind: the newest frame is worth more than the oldest
+                self.frame_queue.get_nowait()
+                self.dropped_frames += 1
+            self.frame_queue.put_nowait(item)
+
+    def analyse(self, frame, frame_time):
+        # Frames are shared with the other session subscribers, draw on a copy
+        frame = frame.copy()
+        return frame, self.system.analyse_frame(frame, frame_time)
+
+    async def process(self):
+        system = self.system
+        while True:
+            frame, frame_time = await self.frame_queue.get()
+            async with self.analysis_lock:
+                try:
+                    if system.processing_mode == "gated":
+                        batch = system.gated_frames(frame, frame_time)
+                    elif system.should_analyse(frame_time):
+                        batch = [(frame, frame_time)]
+                    else:
+                        batch = []
+                    if not batch:
+                        # Gated mode while idle or a skipped frame: raw preview only
+                        self.preview_frame = frame
+                    for batch_frame, batch_time in batch:
+                        start = time.perf_counter()
+                        processed, hits = await self.loop.run_in_executor(
+                            self.process_executor, self.analyse, batch_frame, batch_time)
+                        if system.latency_controller:
+                            system.latency_controller.observe((time.perf_counter() - start) * 1000)
+                        self.preview_frame = processed
+                        if hits:
+                            self.analysed_hits.append((batch_time, hits))
+                except Exception:
+                    # One bad frame must not stop the pipeline
+                    logger.exception(f"Analysis of the frame at {frame_time:.3f} failed")
+            # Backpressure from inject(); a cancelled put leaves the hits to drain_pipeline()
+            while self.analysed_hits:
+                await self.hit_queue.put(self.analysed_hits[0])
+                self.analysed_hits.popleft()
+
+    def deliver(self, frame_time, hits):
+        for hit in hits:
+            self.system.deliver_hit(*hit)
+        self.system.flush_hits(frame_time)
+
+    def queue_button(self, gun_signal, timestamp, button=None):
+        # pyautogui.press() blocks, it runs after the hits already handed to the injection executor
+        self.injection_executor.submit(self.deliver_button, gun_signal, timestamp, button)
+
+    def deliver_button(self, gun_signal, timestamp, button):
+        try:
+            self.system.deliver_button(gun_signal, timestamp, button)
+        except Exception:
+            logger.exception(f"Delivery of the button of gun {gun_signal} failed")
+
+    async def deliver_batch(self, frame_time, hits):
+        try:
+            await self.loop.run_in_executor(self.injection_executor, self.deliver, frame_time, hits)
+        except Exception:
+            # E.g. pyautogui's FailSafeException, the next hits are still delivered
+            logger.exception(f"Delivery of {len(hits)} hit(s) from the frame at {frame_time:.3f} failed")
+
+    async def inject(self):
+        while True:
+            frame_time, hits = await self.hit_queue.get()
+            try:
+                await self.deliver_batch(frame_time, hits)
+            finally:
+                self.hit_queue.task_done()
+
+    async def preview(self):
+        # HighGUI has to run on the loop (main) thread on macOS
+        while True:
+            # The latency budget controller can slow the preview down or switch it off
+            await asyncio.sleep(max(self.preview_interval, self.system.PREVIEW_INTERVAL or 0))
+            frame = self.preview_frame
+            if frame is not None and self.system.PREVIEW_INTERVAL is not None:
+                self.preview_frame = None
+                cv2.imshow("Camera Feed", cv2.resize(frame, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA))
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord("q"):
+                self.stop_requested.set()
+                return
+            if key == ord("p"):
+                # Writing the profile must not stall the loop
+                await self.loop.run_in_executor(None, self.system.toggle_profiler)
@@ -0,0 +1,55 @@
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+
+class RunningBackground:
+    """
+    Exponential moving average of the red channel of one detection region.
+
+    The laser is a 50 ms pulse, so a spot is a sudden bright rise above the
+    background while red scenery of the game sits in it. The average is
+    updated only every `update_every` frames with weight `alpha`, and not at
+    pixels that just changed, so a laser pulse is not absorbed into it.
+    Pixels that stay changed for `absorb_after` frames are new scenery, e.g.
+    a red slide, and are copied into the background at once; that has to be
+    longer than the laser is on, blink codes included.
+    """
+    def __init__(self, alpha=0.05, update_every=4, threshold=40, absorb_after=30):
+        self.alpha = alpha
+        self.update_every = update_every
+        self.threshold = threshold
+        self.absorb_after = absorb_after
+        self.average = None  # float32
+        self.background = None  # uint8 copy of the average, compared against
+        self.persistence = None  # uint8, consecutive frames each pixel has been changed
+        self.frames = 0
+
+    def changed(self, region):
+        """Mask (uint8, 255) of the pixels whose red rose more than `threshold` above the background."""
+        red = cv2.extractChannel(region, 2)
+        if self.average is None or self.average.shape != red.shape:
+            self.average = red.astype(np.float32)
+            self.background = red.copy()
+            self.persistence = np.zeros(red.shape, np.uint8)
+            self.frames = 0
+            return np.zeros(red.shape, np.uint8)
+
+        _, mask = cv2.threshold(cv2.subtract(red, self.background), self.threshold, 255, cv2.THRESH_BINARY)
+        # +1 where changed, 0 elsewhere (saturates at 255)
+        self.persistence = cv2.add(self.persistence, 1, mask=mask)
+        _, persistent = cv2.threshold(self.persistence, self.absorb_after - 1, 255, cv2.THRESH_BINARY)
+        absorb = cv2.countNonZero(persistent) > 0
+        if absorb:
+            cv2.accumulateWeighted(red, self.average, 1.0, mask=persistent)
+            self.persistence[persistent > 0] = 0
+            mask = cv2.bitwise_and(mask, cv2.bitwise_not(persistent))
+        self.frames += 1
+        if self.frames >= self.update_every:
+            self.frames = 0
+            cv2.accumulateWeighted(red, self.average, self.alpha, mask=cv2.bitwise_not(mask))
+            absorb = True
+        if absorb:
+            self.background = cv2.convertScaleAbs(self.average)
+        return mask
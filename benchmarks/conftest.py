@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# make_system is shared with soak.py, tests import it from here
+from synthetic_scene import SyntheticScene, RESOLUTIONS, make_system
+
+
+@pytest.fixture(params=list(RESOLUTIONS), scope="session")
+def scene(request):
+    width, height = RESOLUTIONS[request.param]
+    return SyntheticScene(width, height, seed=1)
@@ -0,0 +1,140 @@
+import time
+import sqlite3
+import datetime
+
+import numpy as np
+import pytest
+
+from analytics import HEATMAP_BINS, HitAnalytics, hit_statistics, load_heatmaps, report
+
+SIDE_REGION = (1920, 0, 640, 480)
+
+
+def record_session(database):
+    analytics = HitAnalytics(database, flush_interval=3600)
+    base = time.monotonic() - 30
+    frame_time = base
+    for i in range(10):
+        # 0.5 s between shots, and one 20 s pause that is not reaction time
+        frame_time += 20.5 if i == 6 else 0.5
+        analytics.record_hit("a", 960 + i, 540, frame_time, frame_time * 1000 - (40 + i))
+    analytics.record_hit("c", 1920 + 600, 20, base + 1, (base + 1) * 1000 - 80, "side", SIDE_REGION)
+    analytics.record_hit("c", 1910, 1070, base + 2, (base + 2) * 1000 - 60)
+    assert analytics.ready.wait(5)
+    session_id = analytics.session_id
+    analytics.close()
+    return session_id
+
+
+def test_schema_and_rows(tmp_path):
+    database = str(tmp_path / "analytics.sqlite")
+    session_id = record_session(database)
+    connection = sqlite3.connect(database)
+    try:
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert tables == {"sessions", "hits", "heatmaps"}
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(hits)")]
+        assert columns == ["session_id", "time", "gun", "x", "y", "latency_ms", "surface"]
+        primary_key = [row[1] for row in sorted(connection.execute("PRAGMA table_info(heatmaps)"), key=lambda r: r[5])
+                       if row[5]]
+        assert primary_key == ["session_id", "surface", "gun"]
+
+        started, ended, bins_x, bins_y = connection.execute(
+            "SELECT started, ended, bins_x, bins_y FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        assert (bins_x, bins_y) == HEATMAP_BINS and started <= ended
+        rows = connection.execute("SELECT gun, x, y, latency_ms, surface, time FROM hits ORDER BY time").fetchall()
+        assert len(rows) == 12
+        assert {(gun, surface) for gun, _, _, _, surface, _ in rows} == {("a", "screen"), ("c", "side"),
+                                                                        ("c", "screen")}
+        # Stored in wall-clock time
+        assert abs(rows[-1][5] - time.time()) < 60
+        assert [latency for gun, *_, latency, _, _ in rows if gun == "a"] == pytest.approx(range(40, 50))
+    finally:
+        connection.close()
+
+
+def test_heatmaps_are_keyed_by_surface(tmp_path):
+    database = str(tmp_path / "analytics.sqlite")
+    record_session(database)
+    record_session(database)
+    connection = sqlite3.connect(database)
+    try:
+        now = time.time()
+        heatmaps = load_heatmaps(connection, now - 3600, now + 3600)
+        assert set(heatmaps) == {("screen", "a"), ("screen", "c"), ("side", "c")}
+        # Two sessions summed
+        assert heatmaps[("screen", "a")].sum() == 20
+        assert np.argwhere(heatmaps[("screen", "a")]).tolist() == [[27, 48]]
+        # The side hit is binned within its own region, the screen one at the bottom right corner
+        assert np.argwhere(heatmaps[("side", "c")]).tolist() == [[2, 90]]
+        assert np.argwhere(heatmaps[("screen", "c")]).tolist() == [[53, 95]]
+        assert load_heatmaps(connection, now + 3600, now + 7200) == {}
+    finally:
+        connection.close()
+
+
+def test_hit_statistics(tmp_path):
+    database = str(tmp_path / "analytics.sqlite")
+    record_session(database)
+    connection = sqlite3.connect(database)
+    try:
+        now = time.time()
+        statistics = hit_statistics(connection, now - 3600, now + 3600)
+    finally:
+        connection.close()
+    assert list(statistics) == ["a", "c"]
+    a = statistics["a"]
+    assert a["hits"] == 10
+    assert a["latency_mean_ms"] == pytest.approx(44.5)
+    assert a["latency_p50_ms"] == pytest.approx(45) and a["latency_p90_ms"] == pytest.approx(49)
+    # The 20.5 s pause is left out
+    assert a["shot_intervals"] == 8
+    assert a["shot_interval_mean_s"] == pytest.approx(0.5)
+    assert a["shot_interval_p90_s"] == pytest.approx(0.5)
+    c = statistics["c"]
+    assert c["hits"] == 2 and c["latency_mean_ms"] == pytest.approx(70) and c["shot_intervals"] == 1
+
+
+def test_old_database_is_migrated(tmp_path):
+    database = str(tmp_path / "analytics.sqlite")
+    connection = sqlite3.connect(database)
+    now = time.time()
+    with connection:
+        connection.executescript("""
+            CREATE TABLE sessions (id INTEGER PRIMARY KEY, started REAL NOT NULL, ended REAL,
+                screen_width INTEGER NOT NULL, screen_height INTEGER NOT NULL,
+                bins_x INTEGER NOT NULL, bins_y INTEGER NOT NULL);
+            CREATE TABLE hits (session_id INTEGER NOT NULL, time REAL NOT NULL, gun TEXT NOT NULL,
+                x INTEGER NOT NULL, y INTEGER NOT NULL, latency_ms REAL);
+            CREATE TABLE heatmaps (session_id INTEGER NOT NULL, gun TEXT NOT NULL, counts BLOB NOT NULL,
+                PRIMARY KEY (session_id, gun));
+        """)
+        connection.execute("INSERT INTO sessions VALUES (1, ?, ?, 1920, 1080, 96, 54)", (now - 60, now - 30))
+        connection.execute("INSERT INTO hits VALUES (1, ?, 'a', 10, 10, 50.0)", (now - 45,))
+        counts = np.zeros((54, 96), np.int32)
+        counts[0, 0] = 1
+        connection.execute("INSERT INTO heatmaps VALUES (1, 'a', ?)", (counts.tobytes(),))
+    connection.close()
+
+    record_session(database)
+    connection = sqlite3.connect(database)
+    try:
+        assert connection.execute("SELECT surface FROM hits WHERE session_id = 1").fetchall() == [("screen",)]
+        heatmaps = load_heatmaps(connection, now - 3600, now + 3600)
+        assert heatmaps[("screen", "a")].sum() == 11 and heatmaps[("screen", "a")][0, 0] == 1
+        assert hit_statistics(connection, now - 3600, now + 3600)["a"]["hits"] == 11
+    finally:
+        connection.close()
+
+
+def test_report_writes_heatmaps_per_surface(tmp_path):
+    database = str(tmp_path / "analytics.sqlite")
+    record_session(database)
+    connection = sqlite3.connect(database)
+    started, = connection.execute("SELECT started FROM sessions").fetchone()
+    connection.close()
+    output = tmp_path / "report"
+    report(database, datetime.date.fromtimestamp(started), str(output))
+    assert sorted(path.name for path in output.iterdir()) == [
+        "heatmap_screen_a.png", "heatmap_screen_all.png", "heatmap_screen_c.png",
+        "heatmap_side_all.png", "heatmap_side_c.png"]
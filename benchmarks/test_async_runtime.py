@@ -0,0 +1,184 @@
+import threading
+import time
+
+from async_runtime import AsyncRuntime
+from camera_session import FrameSubscription
+from conftest import make_system
+from serial_protocol import format_gun_line
+from synthetic_scene import SyntheticScene
+
+
+class SceneSession:
+    """Stands in for a CameraSession, the test pushes the frames."""
+    def __init__(self):
+        self.subscription = None
+
+    def wait_until_opened(self, timeout=None):
+        return True
+
+    def is_running(self):
+        return True
+
+    def subscribe(self, maxsize=2):
+        self.subscription = FrameSubscription(maxsize)
+        return self.subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+
+
+def start_runtime(scene):
+    system = make_system(scene)
+    system.camera_session = SceneSession()
+    delivered = []
+    system.deliver_hit = lambda gun, *hit: delivered.append(gun)
+    analysing = threading.Event()
+    analyse_frame = system.analyse_frame
+
+    def slow_analyse_frame(frame, frame_time):
+        # Keeps the hit in flight on the process executor while the runtime restarts or stops
+        analysing.set()
+        time.sleep(0.3)
+        return analyse_frame(frame, frame_time)
+
+    system.analyse_frame = slow_analyse_frame
+    runtime = AsyncRuntime(system, show_preview=False)
+    thread = threading.Thread(target=runtime.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while system.camera_session.subscription is None or runtime.analysis_lock is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    system.gun_signal_queue.put(("a", 10_000.0, True))
+    system.camera_session.subscription.push((scene.render([scene.projector_point_to_camera((800, 300))]), 10.0))
+    assert analysing.wait(5)
+    return runtime, thread, delivered
+
+
+def test_restart_delivers_hit_in_analysis():
+    scene = SyntheticScene(1280, 720, seed=6, distractors=0)
+    runtime, thread, delivered = start_runtime(scene)
+    try:
+        runtime.request_restart({"ANALYSIS_FRAME_SKIP": 2})
+        deadline = time.monotonic() + 5
+        while runtime.system.ANALYSIS_FRAME_SKIP != 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        # The restart waited for the frame and its hit
+        assert delivered == ["a"]
+        assert all(not task.done() for task in runtime.pipeline_tasks)
+    finally:
+        runtime.stop()
+        thread.join(5)
+    assert delivered == ["a"]
+
+
+def test_stop_delivers_hit_in_analysis():
+    scene = SyntheticScene(1280, 720, seed=6, distractors=0)
+    runtime, thread, delivered = start_runtime(scene)
+    runtime.stop()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert delivered == ["a"]
+
+
+def start(system, **options):
+    system.camera_session = SceneSession()
+    runtime = AsyncRuntime(system, show_preview=False, **options)
+    thread = threading.Thread(target=runtime.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while system.camera_session.subscription is None or runtime.analysis_lock is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return runtime, thread
+
+
+def shoot(scene, system, frames, delivered):
+    """One shot per frame, each pushed once the previous one was delivered or lost."""
+    frame = scene.render([scene.projector_point_to_camera((800, 300))])
+    for i in range(frames):
+        frame_time = 10.0 + i / 30
+        system.gun_signal_queue.put(("a", frame_time * 1000, True))
+        system.camera_session.subscription.push((frame, frame_time))
+        deadline = time.monotonic() + 5
+        while len(delivered) <= i:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+
+def test_failed_deliveries_do_not_stop_injection():
+    scene = SyntheticScene(1280, 720, seed=6, distractors=0)
+    system = make_system(scene)
+    delivered = []
+
+    def deliver_hit(gun, x, y, frame_time, *hit):
+        delivered.append(frame_time)
+        if len(delivered) <= 3:
+            # Like pyautogui's FailSafeException
+            raise RuntimeError("mouse in a corner")
+
+    system.deliver_hit = deliver_hit
+    # With a one-hit queue a stopped inject() would block process() after the second frame
+    runtime, thread = start(system, hit_queue_size=1)
+    try:
+        shoot(scene, system, 6, delivered)
+    finally:
+        runtime.stop()
+        thread.join(5)
+    assert not thread.is_alive()
+    assert len(delivered) == 6
+
+
+def test_failed_analysis_does_not_stop_processing():
+    scene = SyntheticScene(1280, 720, seed=6, distractors=0)
+    system = make_system(scene)
+    delivered = []
+    system.deliver_hit = lambda gun, x, y, frame_time, *hit: delivered.append(frame_time)
+    analyse_frame = system.analyse_frame
+
+    def failing_analyse_frame(frame, frame_time):
+        if frame_time == 10.0:
+            # The first shot is lost with its frame
+            delivered.append(None)
+            raise ValueError("bad frame")
+        return analyse_frame(frame, frame_time)
+
+    system.analyse_frame = failing_analyse_frame
+    runtime, thread = start(system)
+    try:
+        shoot(scene, system, 3, delivered)
+        runtime.request_restart({"ANALYSIS_FRAME_SKIP": 2})
+        deadline = time.monotonic() + 5
+        while system.ANALYSIS_FRAME_SKIP != 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        runtime.stop()
+        thread.join(5)
+    assert not thread.is_alive()
+    assert delivered == [None, 10.0 + 1 / 30, 10.0 + 2 / 30]
+
+
+def test_buttons_are_pressed_off_the_loop():
+    scene = SyntheticScene(1280, 720, seed=6, distractors=0)
+    system = make_system(scene)
+    pressed = []
+    system.deliver_button = lambda gun, timestamp, button=None: pressed.append(
+        (gun, button, threading.current_thread().name))
+    runtime, thread = start(system)
+    try:
+        # As serial_input() hands the line over with one receiver
+        runtime.loop.call_soon_threadsafe(system.handle_serial_line, format_gun_line("b", button="2"), 1000.0)
+        deadline = time.monotonic() + 5
+        while not pressed:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        runtime.stop()
+        thread.join(5)
+    assert not thread.is_alive()
+    (gun, button, thread_name), = pressed
+    assert (gun, button) == ("b", "2") and thread_name.startswith("injection")
+    assert system.on_button is None
@@ -0,0 +1,50 @@
+import numpy as np
+
+from conftest import make_system
+from synthetic_scene import SyntheticScene
+
+
+def test_difference_mode_ignores_static_red_scenery():
+    scene = SyntheticScene(1280, 720, seed=4, distractors=0)
+    # Red scenery the size of a laser dot: the colour filter cannot tell it from a shot
+    rng = np.random.default_rng(4)
+    scenery = [scene.projector_point_to_camera(p) for p in rng.uniform((100, 100), (1800, 980), (15, 2))]
+    SyntheticScene.draw_spots(scene.base, scenery, radius=4.0)
+
+    counts = {}
+    for mode in ("colour", "difference"):
+        system = make_system(scene)
+        system.DETECTION_MODE = mode
+        for _ in range(10):
+            assert len(system.detect_laser_spots(scene.render())) == (len(scenery) if mode == "colour" else 0)
+        laser = scene.projector_point_to_camera((700, 400))
+        spots = system.detect_laser_spots(scene.render([laser]))
+        counts[mode] = system.candidate_blobs.quantiles((0.5,))[0.5]
+        if mode == "difference":
+            assert len(spots) == 1
+            assert np.hypot(spots[0]["center"][0] - laser[0], spots[0]["center"][1] - laser[1]) < 1.0
+            # The pulse is not absorbed into the background while it lasts
+            assert len(system.detect_laser_spots(scene.render([laser]))) == 1
+    print(f"median candidate blobs per frame: {counts}")
+    assert counts["difference"] <= 2 < counts["colour"]
+
+
+def test_difference_mode_absorbs_scenery_appearing_later():
+    scene = SyntheticScene(1280, 720, seed=4, distractors=0)
+    system = make_system(scene)
+    system.DETECTION_MODE = "difference"
+    for _ in range(10):
+        assert system.detect_laser_spots(scene.render()) == []
+
+    # A red slide appears mid-session: a sudden change at first, new scenery once it persists
+    rng = np.random.default_rng(5)
+    scenery = [scene.projector_point_to_camera(p) for p in rng.uniform((100, 100), (1800, 980), (10, 2))]
+    SyntheticScene.draw_spots(scene.base, scenery, radius=4.0)
+    counts = [len(system.detect_laser_spots(scene.render())) for _ in range(200)]
+    print(f"scenery blobs reported in frames 0, 10, 40, 199: {counts[0]}, {counts[10]}, {counts[40]}, {counts[199]}")
+    assert counts[0] == len(scenery)
+    assert all(count == 0 for count in counts[system.BACKGROUND_ABSORB_FRAMES + 5:])
+
+    # The laser is still found on top of the absorbed scenery
+    laser = scene.projector_point_to_camera((700, 400))
+    assert len(system.detect_laser_spots(scene.render([laser]))) == 1
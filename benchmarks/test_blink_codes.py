@@ -0,0 +1,71 @@
+import numpy as np
+
+from blink_codes import DEFAULT_CODES, BlinkDecoder
+from conftest import make_system
+from synthetic_scene import SyntheticScene
+
+FPS = 120
+BIT_MS = 25.0
+
+
+def shoot(system, scene, shots, signals, start=10.0, seconds=0.4, seed=0):
+    """
+    Analyses frames at FPS with every (gun, projector point, trigger s) in `shots`
+    blinking its code, capture times jittered like a real camera. Returns the hits.
+    """
+    rng = np.random.default_rng(seed)
+    for gun, timestamp in signals:
+        system.gun_signal_queue.put((gun, timestamp * 1000, True))
+    hits = []
+    for i in range(int(seconds * FPS)):
+        t = start + i / FPS + rng.uniform(-0.001, 0.001)
+        spots = []
+        for gun, point, trigger in shots:
+            slot = int((t - trigger) * 1000 // BIT_MS)
+            if 0 <= slot < len(DEFAULT_CODES[gun]) and DEFAULT_CODES[gun][slot] == "1":
+                spots.append(scene.projector_point_to_camera(point))
+        hits.extend(system.analyse_frame(scene.render(spots), t))
+    return hits
+
+
+def test_decoder_reads_codes_at_any_phase():
+    decoder = BlinkDecoder(DEFAULT_CODES, BIT_MS)
+    for gun, code in DEFAULT_CODES.items():
+        for phase in np.linspace(0, 1, 7, endpoint=False):
+            decoder.active.clear()
+            decoder.last_time = None
+            trigger = 1.0 + phase / FPS
+            decoded = []
+            for i in range(FPS):
+                t = 1.0 + i / FPS
+                slot = int((t - trigger) * 1000 // BIT_MS)
+                on = 0 <= slot < len(code) and code[slot] == "1"
+                for accumulator in decoder.update({7: ((0, 0), 20)} if on else {}, t):
+                    decoded.append(decoder.decode(accumulator))
+            assert decoded == [gun], (gun, phase)
+
+
+def test_simultaneous_shots_are_told_apart():
+    scene = SyntheticScene(1280, 720, seed=5)
+    system = make_system(scene, blink_codes=DEFAULT_CODES, blink_bit_ms=BIT_MS)
+    shots = [("a", (500, 400), 10.0502), ("c", (1400, 700), 10.0507)]
+    # Both serial lines carry (almost) the same trigger time, serial order cannot tell the spots apart
+    hits = shoot(system, scene, shots, [("c", 10.0507), ("a", 10.0502)])
+    assert sorted(hit[0] for hit in hits) == ["a", "c"]
+    for gun, x, y, _, trigger_time, confidence, surface in hits:
+        point = dict((g, p) for g, p, _ in shots)[gun]
+        assert np.hypot(x - point[0], y - point[1]) < 4
+        assert confidence > 0.5 and surface == "screen"
+    assert system.optical_attributions.labels("agree").value == 2
+    assert not system.pending_gun_signals
+
+
+def test_serial_disagreement_and_static_spots():
+    scene = SyntheticScene(1280, 720, seed=5)
+    # A static red dot is always on and matches no code
+    SyntheticScene.draw_spots(scene.base, [scene.projector_point_to_camera((200, 200))], radius=3.0)
+    system = make_system(scene, blink_codes=DEFAULT_CODES, blink_bit_ms=BIT_MS)
+    hits = shoot(system, scene, [("c", (900, 500), 10.1)], [("a", 10.1)])
+    assert [hit[0] for hit in hits] == ["c"]
+    assert system.optical_attributions.labels("disagree").value == 1
+    assert system.optical_attributions.labels("unknown").value >= 1
@@ -0,0 +1,80 @@
+import threading
+
+import numpy as np
+
+from conftest import make_system
+from screen_calibration import CalibrationDriftTracker, estimate_screen_quad
+from synthetic_scene import SyntheticScene
+
+# Corners as if the camera had slipped a few pixels since the operator calibrated
+SLIP = np.float32([[6, -4], [5, -4], [6, -3], [5, -5]])
+
+
+def corner_error(corners, scene):
+    return float(np.max(np.hypot(*(np.float32(corners) - np.float32(scene.corners)).T)))
+
+
+def test_estimate_screen_quad():
+    scene = SyntheticScene(1920, 1080, seed=2)
+    quad = estimate_screen_quad(scene.render(), np.float32(scene.corners) + SLIP)
+    assert quad is not None
+    assert corner_error(quad, scene) < 1.5
+
+
+def test_drift_tracker_converges_in_bounded_steps():
+    scene = SyntheticScene(1920, 1080, seed=2)
+    system = make_system(scene)
+    system.set_projector_corners(np.float32(scene.corners) + SLIP)
+    tracker = CalibrationDriftTracker(system, max_step=1.0)
+
+    start_error = corner_error(system.projector_corners, scene)
+    previous = system.projector_corners
+    for _ in range(20):
+        tracker.check(scene.render())
+        assert np.max(np.abs(system.projector_corners - previous)) <= 1.0
+        previous = system.projector_corners
+    print(f"corner error {start_error:.1f} px -> {corner_error(previous, scene):.1f} px "
+          f"after {tracker.corrections} corrections")
+    assert corner_error(previous, scene) < 1.5
+    # The operator's corners stay the reference of later corrections
+    np.testing.assert_allclose(system.calibration.reference, np.float32(scene.corners) + SLIP)
+
+
+def test_drift_tracker_refuses_large_moves():
+    scene = SyntheticScene(1920, 1080, seed=2)
+    system = make_system(scene)
+    system.set_projector_corners(np.float32(scene.corners) + SLIP)
+    tracker = CalibrationDriftTracker(system, max_drift=4.0)
+    for _ in range(10):
+        assert not tracker.check(scene.render())
+    np.testing.assert_allclose(system.projector_corners, np.float32(scene.corners) + SLIP)
+
+
+def test_swap_while_analysing():
+    scene = SyntheticScene(1280, 720, seed=3, distractors=0)
+    system = make_system(scene)
+    frames = [(scene.render([spot]), spot) for spot in (scene.random_spot() for _ in range(8))]
+    corners = [np.float32(scene.corners) + SLIP, np.float32(scene.corners)]
+    stop = threading.Event()
+
+    def recalibrate():
+        i = 0
+        while not stop.is_set():
+            system.set_projector_corners(corners[i % 2])
+            i += 1
+
+    swapper = threading.Thread(target=recalibrate)
+    swapper.start()
+    try:
+        analysed = 0
+        for i in range(200):
+            frame, spot = frames[i % len(frames)]
+            system.gun_signal_queue.put(("a", 1000.0 + i * 1000, True))
+            hits = system.analyse_frame(frame.copy(), 1.0 + i)
+            assert len(hits) == 1
+            analysed += 1
+    finally:
+        stop.set()
+        swapper.join()
+    assert analysed == 200
+    assert system.calibration_swaps.labels("operator").value > 10
@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from clock_sync import DEVICE_CLOCK_WRAP, ClockSync, SequenceTracker
+from serial_protocol import format_gun_line, parse_gun_line
+
+
+def feed(clock, start_device_ms, offset_ms, drift, count, interval_ms=100, seed=0):
+    """Lines every interval_ms; the host sees them after 1-20 ms of serial/USB delay."""
+    rng = random.Random(seed)
+    device_ms = start_device_ms
+    for _ in range(count):
+        true_host_ms = device_ms + offset_ms + drift * (device_ms - start_device_ms)
+        clock.update(device_ms % DEVICE_CLOCK_WRAP, true_host_ms + rng.uniform(1, 20))
+        device_ms += interval_ms
+    return device_ms
+
+
+def test_offset_follows_the_least_delayed_lines():
+    clock = ClockSync()
+    assert clock.to_host(0) is None
+    feed(clock, 1000, 50_000, 0.0, 50)
+    # The lower envelope is about the minimum delay (1 ms) above the true offset
+    assert 50_000 <= clock.to_host(3000) - 3000 <= 50_003
+
+
+def test_drift_is_fitted():
+    clock = ClockSync()
+    drift = 50e-6  # 50 ppm crystal difference
+    end = feed(clock, 0, 20_000, drift, 250, interval_ms=1000)
+    assert clock.drift == pytest.approx(drift, abs=15e-6)
+    expected = end + 20_000 + drift * end
+    assert abs(clock.to_host(end) - expected) < 4
+
+
+def test_wraparound_keeps_host_time_continuous():
+    clock = ClockSync()
+    start = DEVICE_CLOCK_WRAP - 2000
+    feed(clock, start, 7_000, 0.0, 40)
+    assert clock.wraps == 1
+    # A timestamp from just before the wrap still maps before one from just after it
+    before, after = clock.to_host(DEVICE_CLOCK_WRAP - 10), clock.to_host(10)
+    assert after - before == pytest.approx(20, abs=0.01)
+
+
+def test_receiver_reboot_resets_synchronisation():
+    clock = ClockSync()
+    feed(clock, 600_000, 10_000, 0.0, 20)
+    # millis() restarts at 0 while host time goes on
+    clock.update(100, 612_000)
+    assert clock.resets == 1
+    assert len(clock.samples) == 1
+    assert clock.to_host(100) == pytest.approx(612_000)
+
+
+def test_sequence_tracker_counts_loss_duplicates_and_wraps():
+    tracker = SequenceTracker(modulo=256)
+    assert tracker.observe(5) == 0
+    assert tracker.observe(6) == 0
+    assert tracker.observe(9) == 2
+    assert tracker.observe(8) == -1
+    assert (tracker.lost, tracker.duplicates) == (2, 1)
+    for seq in range(10, 256):
+        tracker.observe(seq)
+    # 255 -> 0 is a reboot-or-wrap restart, 0 -> 3 then loses two
+    assert tracker.observe(0) == 0
+    assert tracker.observe(3) == 2
+    assert tracker.lost == 4
+
+
+def test_gun_line_keeps_the_button_digit():
+    event = parse_gun_line("IR laser fired from gun A2 seq=7 t=1234")
+    assert (event.gun, event.button, event.seq, event.device_ms) == ("a", "2", 7, 1234)
+    assert parse_gun_line("ir laser fired from gun c").button is None
+    assert parse_gun_line(format_gun_line("a", 3, 99, button="1")) == ("a", 3, 99, "1")
+    assert parse_gun_line("ir laser fired from gun a seq=x") is None
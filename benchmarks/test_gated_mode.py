@@ -0,0 +1,54 @@
+import pytest
+
+from camera_modes import CameraMode
+from conftest import make_system
+from synthetic_scene import SyntheticScene
+
+FPS = 30
+
+
+@pytest.mark.parametrize("synced, signal_delay_ms", [(True, 0), (False, 130)])
+def test_gated_mode_matches_signal(synced, signal_delay_ms):
+    """
+    A 50 ms pulse at t=10 s. A synced signal carries the trigger time, an unsynced one
+    is stamped on arrival, here 80 ms after the pulse ended.
+    """
+    scene = SyntheticScene(1280, 720, seed=6)
+    system = make_system(scene)
+    system.processing_mode = "gated"
+    trigger = 10.0
+    arrival = trigger + signal_delay_ms / 1000
+    spot = scene.projector_point_to_camera((800, 300))
+
+    hits = []
+    analysed = 0
+    queued = False
+    for i in range(FPS):
+        t = 9.7 + i / FPS
+        if not queued and t >= arrival:
+            system.gun_signal_queue.put(("a", arrival * 1000, synced))
+            queued = True
+        frame = scene.render([spot] if trigger <= t < trigger + system.LASER_PULSE_MS / 1000 else [])
+        for buffered_frame, buffered_time in system.gated_frames(frame, t):
+            analysed += 1
+            hits.extend(system.analyse_frame(buffered_frame.copy(), buffered_time))
+
+    assert [hit[0] for hit in hits] == ["a"]
+    _, x, y, frame_time, trigger_time, *_ = hits[0]
+    assert abs(x - 800) <= 2 and abs(y - 300) <= 2
+    assert trigger <= frame_time < trigger + 0.05
+    assert system.signals_unmatched.labels("a").value == 0
+    if synced:
+        # The gate only opened around the signal; unsynced ones keep it open for MAX_GUN_SIGNAL_AGE
+        assert analysed < FPS // 2
+
+
+def test_probed_delivery_delay_does_not_narrow_match_window():
+    scene = SyntheticScene(1280, 720, seed=6)
+    # A mode probe measuring 4 ms "latency" (buffered frames) must not shrink the window to the pulse
+    system = make_system(scene, camera_mode=CameraMode(1280, 720, measured_fps=30.0, latency_ms=4.0))
+    assert system.GUN_SIGNAL_WINDOW_AFTER == system.LASER_PULSE_MS + system.CAPTURE_LATENCY_MS
+    # Frame stamped 120 ms after a synced trigger, i.e. a late-arriving frame showing the pulse
+    system.gun_signal_queue.put(("a", 10_000.0, True))
+    hits = system.analyse_frame(scene.render([scene.projector_point_to_camera((800, 300))]), 10.12)
+    assert [hit[0] for hit in hits] == ["a"]
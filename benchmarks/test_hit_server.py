@@ -0,0 +1,87 @@
+import json
+import socket
+import threading
+import time
+
+import hit_server
+from hit_server import HitEventServer
+
+
+def client():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1.0)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+def wait_for_subscribers(server, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with server.lock:
+            server.poll_subscriptions()
+            if len(server.subscribers) == count:
+                return True
+        time.sleep(0.01)
+    return False
+
+
+def test_subscribe_publish_unsubscribe():
+    server = HitEventServer(port=0)
+    address = server.socket.getsockname()
+    sock = client()
+    try:
+        # Nothing is sent without subscribers
+        server.publish_hits(1.0, [])
+        assert server.sent == 0
+
+        sock.sendto(b"subscribe", address)
+        assert wait_for_subscribers(server, 1)
+        hit = {"gun": "a", "surface": "screen", "x": 10, "y": 20, "capture_time": 5.0, "trigger_time": 4.0,
+               "confidence": 1.0}
+        server.publish_hits(5.0, [hit])
+        server.publish_button("b", 6.0, "2")
+        messages = [json.loads(sock.recv(65536)) for _ in range(2)]
+        assert messages[0]["type"] == "hits" and messages[0]["hits"] == [hit]
+        assert messages[1] == {"type": "button", "gun": "b", "button": "2", "trigger_time": 6.0,
+                               "sent_time": messages[1]["sent_time"]}
+
+        sock.sendto(b"unsubscribe", address)
+        assert wait_for_subscribers(server, 0)
+    finally:
+        sock.close()
+        server.close()
+
+
+def test_expiry_from_several_threads(monkeypatch):
+    monkeypatch.setattr(hit_server, "SUBSCRIPTION_TIMEOUT", 0.05)
+    server = HitEventServer(port=0)
+    address = server.socket.getsockname()
+    sockets = [client() for _ in range(20)]
+    errors = []
+
+    def publish(publish_one):
+        try:
+            for _ in range(200):
+                publish_one()
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        for _ in range(5):
+            for sock in sockets:
+                sock.sendto(b"subscribe", address)
+            assert wait_for_subscribers(server, len(sockets))
+            time.sleep(0.06)
+            # Camera thread publishing hits and serial thread publishing buttons expire the same clients
+            threads = [threading.Thread(target=publish, args=(lambda: server.publish_hits(1.0, []),)),
+                       threading.Thread(target=publish, args=(lambda: server.publish_button("b", 1.0),))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert not errors
+            assert server.subscribers == {}
+    finally:
+        for sock in sockets:
+            sock.close()
+        server.close()
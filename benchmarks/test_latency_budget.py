@@ -0,0 +1,112 @@
+import time
+
+import numpy as np
+
+from conftest import make_system
+from latency_budget import LADDER
+from synthetic_scene import SyntheticScene
+
+STAGES = ("queue", "detect", "match")
+
+
+def make_budget_system(scene, budget_ms):
+    system = make_system(scene, show_preview=False, latency_budget_ms=budget_ms)
+    system.latency_controller.check_interval = 0
+    return system
+
+
+def run_frames(system, scene, frames, observe=True):
+    """
+    Shoots gun "a" at the screen center every frame like camera_feed does. Returns the
+    hits and the mean time of every stage over these frames.
+    """
+    before = {stage: (system.stage_ms.labels(stage).count, system.stage_ms.labels(stage).sum) for stage in STAGES}
+    frame = scene.render([scene.projector_point_to_camera((960, 540))])
+    hits = []
+    for _ in range(frames):
+        frame_time = time.monotonic()
+        system.gun_signal_queue.put(("a", frame_time * 1000, True))
+        start = time.perf_counter()
+        if system.should_analyse(frame_time):
+            hits.extend(system.analyse_frame(frame.copy(), frame_time))
+        if observe:
+            system.latency_controller.observe((time.perf_counter() - start) * 1000)
+    breakdown = {}
+    for stage, (count, total) in before.items():
+        summary = system.stage_ms.labels(stage)
+        breakdown[stage] = (summary.sum - total) / (summary.count - count)
+    return hits, breakdown
+
+
+def test_ladder_sheds_work_and_recovers():
+    scene = SyntheticScene(1920, 1080, seed=7)
+    # Far below what a 1080p frame takes, every check steps down the ladder
+    system = make_budget_system(scene, 0.01)
+    controller = system.latency_controller
+    defaults = controller.read_settings()
+    # No preview, recorder or analytics here: only the detector's own knobs are left
+    assert [knob for knob, _ in controller.ladder] == \
+        ["roi_margin", "roi_margin", "downscale", "downscale", "frame_skip", "frame_skip"]
+
+    hits, breakdown = run_frames(system, scene, 40)
+    assert controller.level == len(controller.ladder)
+    assert [(knob, new) for _, knob, _, new, _ in controller.adjustments] == \
+        [step for step in LADDER if step[0] in ("roi_margin", "downscale", "frame_skip")]
+    assert all("budget" in cause for *_, cause in controller.adjustments)
+    assert (system.DETECTION_ROI_MARGIN, system.DETECTION_SCALE, system.ANALYSIS_FRAME_SKIP) == (8, 0.5, 2)
+    # Gun signals keep every frame analysed, no shot is lost at any level
+    assert len(hits) == 40
+    assert all(abs(x - 960) <= 3 and abs(y - 540) <= 3 for _, x, y, *_ in hits)
+
+    controller.budget_ms = 1e6
+    controller.recover_checks = 1
+    run_frames(system, scene, 60)
+    assert controller.level == 0
+    assert controller.read_settings() == defaults
+
+
+def test_stage_breakdown_per_level():
+    scene = SyntheticScene(1920, 1080, seed=7)
+    system = make_budget_system(scene, 20.0)
+    controller = system.latency_controller
+    run_frames(system, scene, 5, observe=False)  # warm-up
+
+    breakdowns = {}
+    for level in (0, 4):
+        controller.set_level(level, "test", time.monotonic())
+        detect = []
+        for _ in range(5):
+            hits, breakdown = run_frames(system, scene, 6, observe=False)
+            assert len(hits) == 6
+            detect.append(breakdown["detect"])
+        breakdowns[level] = dict(breakdown, detect=float(np.median(detect)))
+        assert all(ms >= 0 for ms in breakdowns[level].values())
+
+    assert (system.DETECTION_ROI_MARGIN, system.DETECTION_SCALE) == (8, 0.5)
+    # Half the resolution in a tighter ROI: detection is the stage that gets cheaper
+    assert breakdowns[4]["detect"] < 0.8 * breakdowns[0]["detect"]
+
+    # The per-stage timings are exported with every profile
+    stages = system.profile_context()["stages_ms"]
+    for stage in STAGES:
+        assert stages[f"laser_stage_ms[{stage}]"]["count"] == 65
+    assert system.profile_context()["latency_budget_level"] == 4
+
+
+def test_missed_shot_does_not_stop_frame_skipping():
+    scene = SyntheticScene(1280, 720, seed=7)
+    system = make_system(scene)
+    system.ANALYSIS_FRAME_SKIP = 2
+    frame = scene.render()
+    # The shot misses the screen: no frame ever shows its spot
+    system.gun_signal_queue.put(("a", 10_000.0, True))
+    analysed = []
+    for i in range(30):
+        t = 10.0 + i / 30
+        if system.should_analyse(t):
+            analysed.append(i)
+            assert system.analyse_frame(frame.copy(), t) == []
+    # Every frame within the 150 ms match window, then every third again
+    assert analysed == list(range(5)) + list(range(7, 30, 3))
+    assert system.signals_unmatched.labels("a").value == 1
+    assert not system.pending_gun_signals
@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+
+from lens_calibration import (LensCalibration, calibrate_projected, load_calibration, render_projector_pattern,
+                              save_calibration)
+
+WIDTH, HEIGHT = 1280, 720
+# A wide-angle webcam with strong barrel distortion
+CAMERA_MATRIX = np.array([[1000.0, 0, WIDTH / 2], [0, 1000.0, HEIGHT / 2], [0, 0, 1]])
+DIST_COEFFS = np.array([-0.32, 0, 0, 0, 0])
+SCREEN = np.float32([[60, 45], [1225, 35], [1240, 690], [45, 675]])
+
+
+def distort(points):
+    """Camera pixels of ideal (pinhole) pixel positions through the wide-angle lens."""
+    points = np.asarray(points, np.float64).reshape(-1, 2)
+    normalized = (points - CAMERA_MATRIX[:2, 2]) / CAMERA_MATRIX[0, 0]
+    object_points = np.column_stack([normalized, np.ones(len(points))])
+    distorted, _ = cv2.projectPoints(object_points, np.zeros(3), np.zeros(3), CAMERA_MATRIX, DIST_COEFFS)
+    return distorted.reshape(-1, 2)
+
+
+def render_through_lens(pattern, homography):
+    # For every camera pixel: where the pinhole camera would have seen it, then the projector pixel there
+    grid = np.mgrid[0:HEIGHT, 0:WIDTH][::-1].reshape(2, -1).T.astype(np.float64)
+    distorted = (grid - CAMERA_MATRIX[:2, 2]) / CAMERA_MATRIX[0, 0]
+    radius_distorted = np.hypot(*distorted.T)
+    # Newton on r + k1 r^3 = r_d, exact unlike cv2.undistortPoints' few fixed-point steps
+    radius = radius_distorted.copy()
+    for _ in range(10):
+        radius -= (radius + DIST_COEFFS[0] * radius ** 3 - radius_distorted) / (1 + 3 * DIST_COEFFS[0] * radius ** 2)
+    ideal = distorted * (radius / np.maximum(radius_distorted, 1e-12))[:, None] * CAMERA_MATRIX[0, 0] \
+        + CAMERA_MATRIX[:2, 2]
+    projector = cv2.perspectiveTransform(ideal.reshape(-1, 1, 2), np.linalg.inv(homography))
+    projector = projector.astype(np.float32).reshape(HEIGHT, WIDTH, 2)
+    return cv2.remap(pattern, projector[..., 0], projector[..., 1], cv2.INTER_LINEAR,
+                     borderMode=cv2.BORDER_CONSTANT, borderValue=(90, 90, 90))
+
+
+def test_projected_pattern_calibration_undistorts_wide_angle_lens():
+    pattern, projector_corners = render_projector_pattern()
+    quad = np.float32([[0, 0], [pattern.shape[1], 0], [pattern.shape[1], pattern.shape[0]], [0, pattern.shape[0]]])
+    homography = cv2.getPerspectiveTransform(quad, SCREEN)
+    image = render_through_lens(pattern, homography)
+
+    calibration = calibrate_projected(image, projector_corners)
+    assert calibration is not None
+    print(calibration)
+    assert calibration.image_size == (WIDTH, HEIGHT)
+
+    # Points across the part of the screen the pattern covers; beyond its outer corners the fit extrapolates
+    (left, top), (right, bottom) = projector_corners.min(axis=0), projector_corners.max(axis=0)
+    screen_points = np.mgrid[left:right:25j, top:bottom:15j].T.reshape(-1, 2).astype(np.float32)
+    ideal = cv2.perspectiveTransform(screen_points.reshape(-1, 1, 2), homography).reshape(-1, 2)
+    seen = distort(ideal)
+    raw_error = np.hypot(*(seen - ideal).T)
+    error = np.hypot(*(calibration.undistort_points(seen) - ideal).T)
+    print(f"max error {raw_error.max():.1f} px uncorrected, {error.max():.2f} px corrected")
+    assert raw_error.max() > 40
+    assert error.max() < 0.5
+
+
+def test_calibration_file_round_trip(tmp_path):
+    path = str(tmp_path / "lens_calibration.json")
+    assert load_calibration(0, path=path) is None
+    calibration = LensCalibration(CAMERA_MATRIX, DIST_COEFFS, (WIDTH, HEIGHT), rms=0.25)
+    save_calibration(0, calibration, path=path)
+    save_calibration(2, LensCalibration(CAMERA_MATRIX * 2, DIST_COEFFS / 2, (2 * WIDTH, 2 * HEIGHT)), path=path)
+
+    loaded = load_calibration(0, path=path)
+    np.testing.assert_allclose(loaded.camera_matrix, CAMERA_MATRIX)
+    np.testing.assert_allclose(loaded.dist_coeffs, DIST_COEFFS)
+    assert loaded.image_size == (WIDTH, HEIGHT) and loaded.rms == 0.25
+    assert load_calibration(2, path=path).image_size == (2 * WIDTH, 2 * HEIGHT)
+
+    # Another capture resolution of the same lens: the same points, scaled
+    scaled = load_calibration(0, 2 * WIDTH, 2 * HEIGHT, path=path)
+    assert scaled.image_size == (2 * WIDTH, 2 * HEIGHT)
+    points = np.float32([[100, 80], [1200, 650], [640, 360]])
+    np.testing.assert_allclose(scaled.undistort_points(points * 2), calibration.undistort_points(points) * 2,
+                               atol=1e-2)
+
+    with open(path, "w") as f:
+        f.write("{not json")
+    assert load_calibration(0, path=path) is None
@@ -0,0 +1,96 @@
+import re
+import math
+import urllib.error
+import urllib.request
+
+import pytest
+
+from conftest import make_system
+from metrics import MetricsRegistry, MetricsServer
+from serial_protocol import format_gun_line
+from synthetic_scene import SyntheticScene
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$')
+
+
+def parse(text):
+    """{(name, labels): value} of an exposition, checking every sample follows the HELP and TYPE of its family."""
+    samples, types = {}, {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert kind in ("counter", "gauge", "summary")
+            types[name] = kind
+            continue
+        name, labels, value = SAMPLE.match(line).groups()
+        family = re.sub(r"_(sum|count)$", "", name) if name not in types else name
+        assert family in types, line
+        samples[(name, labels or "")] = float(value)
+    return samples, types
+
+
+def make_registry():
+    registry = MetricsRegistry()
+    hits = registry.counter("hits_total", "Hits delivered.", ["gun"])
+    hits.labels("a").inc()
+    hits.labels("a").inc(2)
+    hits.labels("c").inc()
+    registry.gauge("queue_depth", "Queued frames.").set(3)
+    registry.gauge_function("uptime_seconds", "Uptime.", lambda: 12.5)
+    registry.gauge_function("broken", "Raises.", lambda: 1 / 0)
+    latency = registry.summary("latency_ms", "Detection latency.")
+    for value in range(1, 101):
+        latency.observe(value)
+    registry.rate("capture_fps", "Captured frames per second.")
+    return registry
+
+
+def test_render_exposition_format():
+    samples, types = parse(make_registry().render())
+    assert types == {"laser_hits_total": "counter", "laser_queue_depth": "gauge", "laser_uptime_seconds": "gauge",
+                     "laser_broken": "gauge", "laser_latency_ms": "summary", "laser_capture_fps": "gauge"}
+    assert samples[("laser_hits_total", '{gun="a"}')] == 3
+    assert samples[("laser_hits_total", '{gun="c"}')] == 1
+    assert samples[("laser_queue_depth", "")] == 3
+    assert samples[("laser_uptime_seconds", "")] == 12.5
+    assert math.isnan(samples[("laser_broken", "")])
+    assert samples[("laser_latency_ms", '{quantile="0.5"}')] == 51
+    assert samples[("laser_latency_ms", '{quantile="0.9"}')] == 91
+    assert samples[("laser_latency_ms", '{quantile="0.99"}')] == 100
+    assert samples[("laser_latency_ms_sum", "")] == 5050
+    assert samples[("laser_latency_ms_count", "")] == 100
+    assert samples[("laser_capture_fps", "")] == 0
+
+
+def test_server_scrape():
+    registry = make_registry()
+    server = MetricsServer(registry, port=0)
+    port = server.server.server_address[1]
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"] == "text/plain; version=0.0.4"
+            body = response.read().decode("utf-8")
+        assert body == registry.render()
+
+        # Scrapes see the current values
+        registry.families[0].labels("a").inc()
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics?x=1", timeout=5) as response:
+            samples, _ = parse(response.read().decode("utf-8"))
+        assert samples[("laser_hits_total", '{gun="a"}')] == 4
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/other", timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.close()
+
+
+def test_system_registry_renders():
+    scene = SyntheticScene(1280, 720, seed=2)
+    system = make_system(scene)
+    system.handle_serial_line(format_gun_line("a"), 1000.0)
+    samples, types = parse(system.metrics.render())
+    assert samples[("laser_gun_signals_received_total", '{gun="a"}')] == 1
+    assert all(name.startswith("laser_") for name in types)
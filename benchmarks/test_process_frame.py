@@ -0,0 +1,61 @@
+import itertools
+import math
+
+import pytest
+
+from conftest import make_system
+
+# Run with:  python -m pytest benchmarks --benchmark-autosave
+# and compare against a saved baseline with --benchmark-compare.
+
+FRAMES = 16
+ACCURACY_FRAMES = 200
+
+
+def test_process_frame_throughput(benchmark, scene):
+    system = make_system(scene)
+    frames = [frame for frame, _ in scene.frames(FRAMES)]
+    cycle = itertools.cycle(frames)
+
+    benchmark.extra_info["resolution"] = f"{scene.width}x{scene.height}"
+    benchmark(lambda: system.process_frame(next(cycle).copy(), 0.0))
+
+
+def test_detect_laser_spots_throughput(benchmark, scene):
+    system = make_system(scene)
+    frames = [frame for frame, _ in scene.frames(FRAMES)]
+    cycle = itertools.cycle(frames)
+
+    benchmark.extra_info["resolution"] = f"{scene.width}x{scene.height}"
+    benchmark(lambda: system.detect_laser_spots(next(cycle)))
+
+
+def test_centroid_error(scene):
+    system = make_system(scene)
+    errors = []
+    missed = 0
+    for frame, (truth,) in scene.frames(ACCURACY_FRAMES):
+        spots = system.detect_laser_spots(frame)
+        if not spots:
+            missed += 1
+            continue
+        x, y = max(spots, key=lambda spot: spot["area"])["center"]
+        errors.append(math.hypot(x - truth[0], y - truth[1]))
+
+    errors.sort()
+    print(f"{scene.width}x{scene.height}: missed {missed}/{ACCURACY_FRAMES}, "
+          f"median error {errors[len(errors) // 2]:.3f} px, max {errors[-1]:.3f} px")
+    assert missed == 0
+    assert errors[len(errors) // 2] < 0.5
+
+
+def test_false_positive_rate(scene):
+    system = make_system(scene)
+    false_positives = 0
+    for _ in range(ACCURACY_FRAMES):
+        if system.detect_laser_spots(scene.render()):
+            false_positives += 1
+
+    rate = false_positives / ACCURACY_FRAMES
+    print(f"{scene.width}x{scene.height}: false positive rate {rate:.3f}")
+    assert rate <= 0.01
@@ -0,0 +1,133 @@
+import os
+import time
+
+import numpy as np
+
+from conftest import make_system
+from recorder import (INDEX_DTYPE, KIND_FRAME, KIND_SERIAL, SessionReader, SessionRecorder, list_segments, load_index,
+                      replay, segment_number, serial_line)
+from serial_protocol import format_gun_line
+from synthetic_scene import SyntheticScene
+
+FRAME_MS = 1000 / 30
+
+
+def test_events_alone_rotate_segments_and_old_ones_are_evicted(tmp_path):
+    # record_frames off: only serial lines, which must still be split and evicted
+    recorder = SessionRecorder(str(tmp_path), segment_seconds=1, max_segments=3, queue_size=4096)
+    for i in range(60):
+        recorder.record_serial(f"line {i}", 10_000 + i * 100)
+    recorder.close()
+
+    segments = list_segments(str(tmp_path))
+    assert recorder.segment_number == 6
+    assert [segment_number(base) for base in segments] == [3, 4, 5]
+    # Segments start at 0, 1.1, 2.2, 3.3, 4.4 and 5.5 s
+    lines = [serial_line(payload)[1] for _, _, payload in SessionReader(str(tmp_path)).records()]
+    assert lines == [f"line {i}" for i in range(33, 60)]
+
+    # A new recorder continues the numbering instead of overwriting
+    size_limited = SessionRecorder(str(tmp_path), max_segments=5, queue_size=4096, segment_bytes=200)
+    for i in range(200):
+        size_limited.record_serial(f"line {i}", 20_000 + i)
+    size_limited.close()
+    segments = list_segments(str(tmp_path))
+    assert len(segments) == 5 and segment_number(segments[0]) > 5
+    assert segment_number(segments[-1]) == size_limited.segment_number - 1
+    for base in segments:
+        assert os.path.getsize(base + ".data") < 200 + len('{"receiver": 0, "line": "line 199"}')
+    assert [payload for _, _, payload in SessionReader(str(tmp_path)).records()][-1] == \
+        {"receiver": 0, "line": "line 199"}
+
+
+def test_index_lookup_by_time(tmp_path):
+    scene = SyntheticScene(640, 360, seed=4)
+    roi = (100, 50, 400, 240)
+    recorder = SessionRecorder(str(tmp_path), queue_size=4096, roi=roi)
+    for i in range(20):
+        t = 1000 + i * FRAME_MS
+        recorder.record_frame(scene.render(), t)
+        recorder.record_serial(f"line {i}", t + 1)
+        while recorder.queue.qsize() > 4:
+            time.sleep(0.005)
+    recorder.close()
+
+    base, = list_segments(str(tmp_path))
+    index = load_index(base)
+    assert isinstance(index, np.memmap) and index.dtype == INDEX_DTYPE
+    assert len(index) == 41  # META + 20 frames + 20 lines
+    assert (index["kind"] == KIND_FRAME).sum() == 20
+
+    # A record cut off by a crash is ignored
+    with open(base + ".idx", "ab") as f:
+        f.write(b"\0" * (INDEX_DTYPE.itemsize // 2))
+    assert len(load_index(base)) == 41
+
+    reader = SessionReader(str(tmp_path))
+    assert reader.metadata()["roi"] == list(roi)
+    start, end = 1000 + 5 * FRAME_MS, 1000 + 9 * FRAME_MS
+    records = list(reader.records(start, end))
+    assert [kind for kind, _, _ in records] == [KIND_FRAME, KIND_SERIAL] * 4 + [KIND_FRAME]
+    assert all(start <= timestamp <= end for _, timestamp, _ in records)
+    assert [serial_line(payload) for kind, _, payload in records if kind == KIND_SERIAL] == \
+        [(0, f"line {i}") for i in range(5, 9)]
+    # ROI crops come back in full camera coordinates
+    frame = records[0][2]
+    assert frame.shape == (360, 640, 3)
+    assert not frame[:50].any() and frame[50:290, 100:500].any()
+
+
+def test_replay_reproduces_hits(tmp_path):
+    scene = SyntheticScene(1280, 720, seed=4)
+    recorder = SessionRecorder(str(tmp_path), queue_size=4096, jpeg_quality=95)
+    shots = [("a", (600, 400)), ("c", (1300, 750))]
+    t = 10_000.0
+    for shot, (gun, point) in enumerate(shots):
+        spot = scene.projector_point_to_camera(point)
+        recorder.record_serial(format_gun_line(gun, shot, int(t)), t + 5)
+        for k in range(-3, 8):
+            recorder.record_frame(scene.render([spot] if 0 <= k < 2 else []), t + k * FRAME_MS)
+            while recorder.queue.qsize() > 4:
+                time.sleep(0.005)
+        t += 1000
+    recorder.close()
+
+    system = make_system(scene)
+    delivered = []
+    system.deliver_hit = lambda gun, x, y, *hit: delivered.append((gun, x, y))
+    assert replay(str(tmp_path), system) == 22
+    assert [gun for gun, _, _ in delivered] == ["a", "c"]
+    for (_, x, y), (_, point) in zip(delivered, shots):
+        assert np.hypot(x - point[0], y - point[1]) < 4
+
+
+def test_replay_keeps_receivers_apart(tmp_path):
+    scene = SyntheticScene(1280, 720, seed=4)
+    recorder = SessionRecorder(str(tmp_path), queue_size=4096, jpeg_quality=95)
+    live = make_system(scene, serial_port=[None, None], recorder=recorder)
+    # Receiver 1 counts its own, lower, sequence numbers on a clock 5 s behind receiver 0's
+    shots = [(0, "a", 7, 0, (600, 400)), (1, "c", 1, -5000, (1300, 750)), (0, "a", 8, 0, (900, 300)),
+             (1, "c", 2, -5000, (500, 700))]
+    t = 10_000.0
+    for receiver_id, gun, seq, clock, point in shots:
+        spot = scene.projector_point_to_camera(point)
+        live.handle_serial_line(format_gun_line(gun, seq, int(t + clock)), t + 5, receiver_id)
+        for k in range(-3, 8):
+            recorder.record_frame(scene.render([spot] if 0 <= k < 2 else []), t + k * FRAME_MS)
+            while recorder.queue.qsize() > 4:
+                time.sleep(0.005)
+        t += 1000
+    recorder.close()
+
+    receivers = SessionReader(str(tmp_path)).metadata()["receivers"]
+    assert receivers == 2
+    system = make_system(scene, serial_port=[None] * receivers)
+    delivered = []
+    system.deliver_hit = lambda gun, x, y, *hit: delivered.append((gun, x, y))
+    replay(str(tmp_path), system)
+    assert [gun for gun, _, _ in delivered] == ["0:a", "1:c", "0:a", "1:c"]
+    for (_, x, y), (*_, point) in zip(delivered, shots):
+        assert np.hypot(x - point[0], y - point[1]) < 4
+    for receiver_id in (0, 1):
+        sequence = system.receiver_clocks[receiver_id][1]
+        assert (sequence.received, sequence.lost, sequence.duplicates) == (2, 0, 0)
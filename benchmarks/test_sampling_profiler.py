@@ -0,0 +1,49 @@
+import json
+import os
+import threading
+import time
+
+from conftest import make_system
+from synthetic_scene import SyntheticScene
+
+
+def run_frames(system, frames, seconds):
+    """Analyses frames on a "camera" thread for `seconds`, returns the frame rate."""
+    count = [0]
+
+    def loop():
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            system.process_frame(frames[count[0] % len(frames)].copy(), time.monotonic())
+            count[0] += 1
+
+    thread = threading.Thread(target=loop, name="camera")
+    thread.start()
+    thread.join()
+    return count[0] / seconds
+
+
+def test_profile_of_camera_thread(tmp_path):
+    scene = SyntheticScene(1920, 1080, seed=5)
+    system = make_system(scene)
+    system.profiler.output_directory = str(tmp_path)
+    frames = [frame for frame, _ in scene.frames(4)]
+
+    baseline_fps = run_frames(system, frames, 1.5)
+    system.toggle_profiler()
+    profiled_fps = run_frames(system, frames, 1.5)
+    path = system.toggle_profiler()
+
+    with open(path) as f:
+        summary = json.load(f)
+    print(f"{baseline_fps:.0f} fps unprofiled, {profiled_fps:.0f} fps profiled, "
+          f"sampler busy {summary['sampling_overhead'] * 100:.2f}% of the time")
+    camera = summary["threads"]["camera"]
+    assert camera["samples"] > 100
+    assert summary["context"]["stages_ms"]["laser_stage_ms[detect]"]["count"] > 0
+    with open(os.path.join(tmp_path, camera["file"])) as f:
+        stacks = f.read()
+    assert "detect.py:LaserDetectionSystem.detect_laser_spots" in stacks
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks.splitlines())
+    # The frame rates are printed for reference; on a shared core they vary more than the overhead
+    assert summary["sampling_overhead"] < 0.03
@@ -0,0 +1,74 @@
+import sys
+import time
+import logging
+import threading
+
+import pytest
+
+from detect import LaserDetectionSystem
+from serial_hub import SerialHub
+from serial_simulator import ReceiverSimulator
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="the PTY simulator needs a POSIX system")
+
+
+def test_hub_reads_several_receivers_and_reconnects():
+    simulators = [
+        ReceiverSimulator(rate=200, guns="ac", seed=1),
+        # Unplugged 1.2 s after starting, back 0.3 s later
+        ReceiverSimulator(rate=100, guns="abcd", garbage_rate=0.2, disconnect_every=1.2, disconnect_duration=0.3,
+                          seed=2),
+        ReceiverSimulator(rate=50, guns="c", seed=3),
+    ]
+    for simulator in simulators:
+        simulator.start(paused=True)
+    system = LaserDetectionSystem(0, [simulator.port for simulator in simulators], 115200,
+                                  [(0, 0), (1920, 0), (1920, 1080), (0, 1080)], 1920, 1080, output_mode="none")
+    system.logger.setLevel(logging.ERROR)
+    reconnects = []
+
+    def tracker(receiver_id):
+        return system.receiver_clocks[receiver_id][1]
+
+    hub = SerialHub(system.serial_ports, system.baudrate, system.handle_receiver_line, system.stop_event,
+                    reconnect_delay=0.2, on_reconnect=reconnects.append)
+    # All three receivers on this one thread
+    thread = threading.Thread(target=hub.run, name="serial", daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while None in hub.connections:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        for simulator in simulators:
+            simulator.resume()
+        time.sleep(2.5)
+        for simulator in simulators:
+            simulator.stop_event.set()
+            simulator.thread.join()
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and any(
+                tracker(i).received + tracker(i).lost < len(simulator.sent) for i, simulator in enumerate(simulators)):
+            time.sleep(0.05)
+    finally:
+        system.stop_event.set()
+        thread.join(5)
+        for simulator in simulators:
+            simulator.stop()
+    assert not thread.is_alive()
+
+    assert simulators[1].disconnects == 1 and reconnects == [1]
+    for receiver_id, simulator in enumerate(simulators):
+        sequence = tracker(receiver_id)
+        assert sequence.duplicates == 0
+        assert sequence.received + sequence.lost == len(simulator.sent), receiver_id
+        if receiver_id != 1:
+            # Steady receivers lose nothing to the one that was unplugged
+            assert sequence.lost == 0
+        received = {}
+        for gun in simulator.guns:
+            received[gun] = system.signals_received.labels(f"{receiver_id}:{gun}").value
+        assert sum(received.values()) == sequence.received
+    # Lines written while the port was being reopened are lost, and tracked per port
+    assert 0 < tracker(1).lost < len(simulators[1].sent) // 2
@@ -0,0 +1,37 @@
+import sys
+
+import pytest
+import serial
+
+from serial_protocol import parse_gun_line
+from serial_simulator import ReceiverSimulator, run_load_test
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="the PTY simulator needs a POSIX system")
+
+
+def test_simulator_emits_numbered_lines():
+    simulator = ReceiverSimulator(rate=200, guns="ac", garbage_rate=0.5, seed=1).start(paused=True)
+    try:
+        connection = serial.Serial(simulator.port, 115200, timeout=1)
+        simulator.resume()
+        events = []
+        while len(events) < 20:
+            event = parse_gun_line(connection.readline().decode("utf-8", errors="replace").strip().lower())
+            if event is not None:
+                events.append(event)
+        connection.close()
+    finally:
+        simulator.stop()
+    assert [event.seq for event in events] == list(range(20))
+    assert [event.gun for event in events] == [gun for _, gun in simulator.sent[:20]]
+    assert all(event.device_ms is not None for event in events)
+    assert simulator.garbage_sent > 0
+
+
+def test_load_test_receives_every_line():
+    result = run_load_test(duration=1.5, settle=3.0, rate=500, guns="abcd", garbage_rate=0.05, seed=2)
+    print(result)
+    assert result["ok"], result
+    assert result["received"] == result["sent"] > 500
+    assert result["lost"] == 0 and result["duplicates"] == 0
+    assert result["queued_in_order"]
@@ -0,0 +1,42 @@
+import threading
+
+from soak import run_soak
+
+# Minutes instead of hours: allocator warm-up and frames in flight extrapolate to
+# hundreds of MB per hour here, so the limits are scaled up accordingly
+SHORT_RUN = dict(hours=0.02, speedup=8.0, sample_every=4.0, warmup=0.3, restart_every=20.0)
+SHORT_LIMITS = {"rss_mb": 5000.0, "traced_mb": 5000.0, "frame_ms_p90": 1000.0}
+
+
+def test_soak_without_leaks_passes():
+    result = run_soak(limits=SHORT_LIMITS, **SHORT_RUN)
+    print(f"x{result['achieved_speedup']:.1f}, {result['hits']} hits, trends {result['trends']}")
+    assert result["ok"], result["failures"]
+    # Restarting the system must not leave threads behind
+    assert result["trends"]["threads"] == 0
+    assert max(row["threads"] for row in result["samples"]) <= result["samples"][0]["threads"] + 1
+
+
+def test_soak_detects_leaks():
+    leaked = []
+    stop = threading.Event()
+
+    def leak(system):
+        process_frame = system.process_frame
+
+        def leaky_process_frame(frame, frame_time=None):
+            leaked.append(bytearray(200_000))
+            return process_frame(frame, frame_time)
+
+        system.process_frame = leaky_process_frame
+        threading.Thread(target=stop.wait, daemon=True).start()
+
+    try:
+        result = run_soak(limits=SHORT_LIMITS, configure=leak, **SHORT_RUN)
+    finally:
+        stop.set()
+    print(result["failures"])
+    assert not result["ok"]
+    assert any(failure.startswith("traced_mb") for failure in result["failures"])
+    assert any(failure.startswith("threads") for failure in result["failures"])
+    assert "test_soak.py" in result["top_allocations"][0][0]
@@ -0,0 +1,81 @@
+import sys
+import math
+import time
+import types
+
+import numpy as np
+
+from conftest import make_system
+from synthetic_scene import SyntheticScene
+
+FPS = 30
+DELIVERY_LATENCY_MS = 60.0
+SWEEP_SPEED = 900.0  # projector px/s
+
+
+def sweep(t):
+    # Player sweeping left to right along a shallow arc, in projector pixels
+    return 300 + SWEEP_SPEED * t, 540 + 150 * math.sin(t * 1.5)
+
+
+def run_sweep(target, frames=45):
+    scene = SyntheticScene(1920, 1080, seed=4, distractors=0)
+    system = make_system(scene)
+    system.PREDICTION_TARGET = target
+    for _ in range(20):
+        # As if these deliveries had already been measured
+        system.injection_latency_ms.observe(DELIVERY_LATENCY_MS)
+
+    errors = []
+    for i in range(frames):
+        t = 100.0 + i / FPS
+        frame = scene.render([scene.projector_point_to_camera(sweep(t - 100.0))])
+        system.gun_signal_queue.put(("a", t * 1000, True))
+        hits = system.analyse_frame(frame, t)
+        if hits and i >= system.PREDICTION_MIN_HITS:
+            _, x, y, *_ = hits[0]
+            tx, ty = sweep(t - 100.0 + DELIVERY_LATENCY_MS / 1000)
+            errors.append(math.hypot(x - tx, y - ty))
+    return system, float(np.median(errors))
+
+
+def test_prediction_compensates_delivery_latency():
+    _, raw_error = run_sweep("none")
+    system, predicted_error = run_sweep("delivery")
+    horizon = system.prediction_horizon_ms.quantiles((0.5,))[0.5]
+    print(f"median error at delivery: raw {raw_error:.1f} px, predicted {predicted_error:.1f} px, "
+          f"horizon {horizon:.0f} ms")
+    assert horizon == DELIVERY_LATENCY_MS
+    # The raw centroid trails by speed * latency, about 54 px here
+    assert raw_error > 40
+    assert predicted_error < raw_error / 4
+
+
+def fake_pyautogui(calls, pause=0.1):
+    """A pyautogui module recording its calls and sleeping its default PAUSE after each one."""
+    module = types.ModuleType("pyautogui")
+
+    def call(name):
+        def function(*args, _pause=True, **kwargs):
+            calls.append((name, args))
+            if _pause:
+                time.sleep(pause)
+        return function
+
+    module.moveTo, module.press, module.click = call("moveTo"), call("press"), call("click")
+    return module
+
+
+def test_delivery_latency_is_taken_at_cursor_placement(monkeypatch):
+    calls = []
+    monkeypatch.setitem(sys.modules, "pyautogui", fake_pyautogui(calls))
+    scene = SyntheticScene(1280, 720, seed=4)
+    system = make_system(scene, output_mode="input")
+    for _ in range(5):
+        frame_time = time.monotonic() - DELIVERY_LATENCY_MS / 1000
+        system.deliver_hit("a", 640, 360, frame_time, frame_time * 1000, 1.0)
+    assert calls[:3] == [("moveTo", (640, 360)), ("press", ("f",)), ("click", ())]
+    # The pauses after the key press and click are in the call time, not in the delivery latency
+    assert system.injection_call_ms.quantiles((0.5,))[0.5] >= 200
+    assert system.injection_latency_ms.quantiles((0.5,))[0.5] < DELIVERY_LATENCY_MS + 50
+    assert system.prediction_horizon(frame_time, frame_time * 1000) < system.PREDICTION_MAX_HORIZON
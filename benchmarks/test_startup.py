@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import subprocess
+
+import cv2
+import pytest
+
+from synthetic_scene import SyntheticScene
+
+# Startup is measured in fresh interpreters, an import in this process would be cached.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["cv2", "numpy", "serial", "pyautogui", "PyQt6", "http.server", "concurrent.futures"]
+
+IMPORT_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import detect
+elapsed = time.perf_counter() - start
+print(json.dumps({"import_s": elapsed, "loaded": [m for m in HEAVY if m in sys.modules]}))
+"""
+
+FIRST_FRAME_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+from detect import LaserDetectionSystem
+from camera_modes import CameraMode
+from camera_session import CameraSession
+imported = time.perf_counter()
+session = CameraSession(VIDEO, CameraMode(1280, 720))
+subscription = session.subscribe()
+session.start()
+frame, frame_time = subscription.get(timeout=10)
+first_frame = time.perf_counter()
+system = LaserDetectionSystem(0, None, 115200, CORNERS, 1280, 720, camera_session=session,
+                              output_mode="none", show_preview=False)
+system.process_frame(frame.copy(), frame_time)
+processed = time.perf_counter()
+session.stop()
+print(json.dumps({"import_s": imported - start, "first_frame_s": first_frame - start,
+                  "first_processed_s": processed - start}))
+"""
+
+
+def run_child(script, **constants):
+    header = "".join(f"{name} = {value!r}\n" for name, value in constants.items())
+    env = dict(os.environ)
+    # Headless: detect must import without a display
+    env.pop("DISPLAY", None)
+    env.pop("WAYLAND_DISPLAY", None)
+    output = subprocess.run([sys.executable, "-c", header + script], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    scene = SyntheticScene(1280, 720, seed=5)
+    path = str(tmp_path_factory.mktemp("startup") / "scene.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (1280, 720))
+    for frame, _ in scene.frames(10):
+        writer.write(frame)
+    writer.release()
+    return path, scene.corners
+
+
+def test_detect_import_is_headless_and_lazy():
+    result = run_child(IMPORT_SCRIPT, HEAVY=HEAVY_MODULES)
+    print(f"import detect: {result['import_s'] * 1000:.0f} ms")
+    assert result["loaded"] == []
+    assert result["import_s"] < 0.5
+
+
+def test_import_time(benchmark):
+    benchmark.pedantic(run_child, args=(IMPORT_SCRIPT,), kwargs={"HEAVY": HEAVY_MODULES}, rounds=5)
+
+
+def test_time_to_first_frame(benchmark, video):
+    path, corners = video
+    result = benchmark.pedantic(run_child, args=(FIRST_FRAME_SCRIPT,), kwargs={"VIDEO": path, "CORNERS": corners},
+                                rounds=3)
+    benchmark.extra_info.update(result)
+    print(f"import {result['import_s'] * 1000:.0f} ms, first frame {result['first_frame_s'] * 1000:.0f} ms, "
+          f"first processed frame {result['first_processed_s'] * 1000:.0f} ms")
+    assert result["first_processed_s"] < 5
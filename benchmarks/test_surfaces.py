@@ -0,0 +1,88 @@
+import time
+
+import cv2
+import numpy as np
+
+from analytics import HitAnalytics
+from conftest import make_system
+from screen_calibration import ScreenCalibration
+from synthetic_scene import SyntheticScene
+
+# A target on the wall right of the screen, mapped next to the 1920x1080 desktop
+SIDE = {"name": "side", "corners": [(1120, 200), (1260, 210), (1255, 400), (1115, 390)], "region": [1920, 0, 640, 480]}
+
+
+def test_lookup_matches_homographies():
+    scene = SyntheticScene(1280, 720, seed=3)
+    start = time.perf_counter()
+    calibration = ScreenCalibration(scene.corners, (1920, 1080), side_surfaces=[SIDE])
+    build_ms = (time.perf_counter() - start) * 1000
+    rng = np.random.default_rng(0)
+    points = rng.uniform((0, 0), (1280, 720), (2000, 2)).astype(np.float32)
+
+    start = time.perf_counter()
+    located = [calibration.locate(point) for point in points]
+    locate_us = (time.perf_counter() - start) / len(points) * 1e6
+    print(f"lookup built in {build_ms:.1f} ms, locate {locate_us:.1f} us")
+
+    counts = {"screen": 0, "side": 0}
+    for point, result in zip(points, located):
+        for surface in calibration.surfaces:
+            x, y = cv2.perspectiveTransform(point.reshape(1, 1, 2), surface.homography)[0, 0]
+            if surface.contains(x, y):
+                expected = surface.name, (x, y)
+                break
+        else:
+            expected = None
+        if expected is None or result is None:
+            # Only a pixel's width from an edge may the two disagree
+            if expected is not None or result is not None:
+                quad = next(s.quad for s in calibration.surfaces if s.name == (expected or result)[0])
+                assert abs(cv2.pointPolygonTest(quad, tuple(map(float, point)), True)) < 1.5
+            continue
+        assert result[0] == expected[0]
+        assert np.hypot(result[1][0] - expected[1][0], result[1][1] - expected[1][1]) < 1.5
+        counts[result[0]] += 1
+    assert counts["screen"] > 500 and counts["side"] > 10
+
+
+def test_hits_on_side_surface():
+    scene = SyntheticScene(1280, 720, seed=3, distractors=0)
+    system = make_system(scene)
+    system.set_projector_corners(scene.corners)
+    assert system.calibration.side_surfaces == []
+    system.calibration = ScreenCalibration(scene.corners, (1920, 1080), side_surfaces=[SIDE])
+    # Swaps keep the side surfaces
+    system.set_projector_corners(scene.corners)
+
+    system.gun_signal_queue.put(("a", 1000.0, True))
+    hits = system.analyse_frame(scene.render([(1187.0, 300.0)]), 1.0)
+    gun, x, y, _, _, _, surface = hits[0]
+    assert (gun, surface) == ("a", "side")
+    assert 1920 + 250 < x < 1920 + 390 and 180 < y < 300
+
+    system.gun_signal_queue.put(("c", 2000.0, True))
+    gun, x, y, _, _, _, surface = system.analyse_frame(scene.render([scene.projector_point_to_camera((960, 540))]), 2.0)[0]
+    assert surface == "screen" and abs(x - 960) <= 2 and abs(y - 540) <= 2
+
+
+def test_offset_gauge_and_side_surface_analytics(tmp_path):
+    scene = SyntheticScene(1280, 720, seed=3, distractors=0)
+    system = make_system(scene)
+    system.set_projector_corners(np.float32(scene.corners) + 3, source="drift")
+    rendered = system.metrics.render()
+    line = next(line for line in rendered.splitlines() if line.startswith("laser_calibration_offset_px "))
+    assert abs(float(line.split()[1]) - np.hypot(3, 3)) < 1e-3
+
+    system.calibration = ScreenCalibration(scene.corners, (1920, 1080), side_surfaces=[SIDE])
+    system.analytics = HitAnalytics(str(tmp_path / "analytics.sqlite"))
+    try:
+        system.deliver_hit("a", 1920 + 600, 20, 1.0, 1000.0, 1.0, "side")
+        system.deliver_hit("a", 1900, 1000, 1.0, 1000.0, 1.0, "screen")
+        histograms = system.analytics.histograms
+        # Binned within the side region, not clamped onto the right edge of the screen
+        assert np.argwhere(histograms[("side", "a")]).tolist() == [[2, 90]]
+        assert np.argwhere(histograms[("screen", "a")]).tolist() == [[50, 95]]
+        assert [hit[4] for hit in system.recent_hits] == ["side", "screen"]
+    finally:
+        system.analytics.close()
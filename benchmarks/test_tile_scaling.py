@@ -0,0 +1,50 @@
+import itertools
+
+import pytest
+
+from conftest import make_system
+from synthetic_scene import SyntheticScene, RESOLUTIONS
+
+# Scaling of DETECTION_TILES on a 4K frame. Compare the groups with
+#   python -m pytest benchmarks/test_tile_scaling.py --benchmark-group-by=param:tiles
+# on the target mini PC; the speedup is bounded by its physical cores.
+
+FRAMES = 16
+TILE_COUNTS = [1, 2, 4, 8]
+
+
+@pytest.fixture(scope="module")
+def scene_4k():
+    return SyntheticScene(*RESOLUTIONS["4k"], seed=2)
+
+
+@pytest.mark.parametrize("tiles", TILE_COUNTS)
+def test_tiled_detection_throughput(benchmark, scene_4k, tiles):
+    system = make_system(scene_4k)
+    system.DETECTION_TILES = tiles
+    frames = [frame for frame, _ in scene_4k.frames(FRAMES, spots_per_frame=3)]
+    cycle = itertools.cycle(frames)
+
+    benchmark.extra_info["tiles"] = tiles
+    benchmark(lambda: system.detect_laser_spots(next(cycle)))
+    system.release_resources()
+
+
+@pytest.mark.parametrize("tiles", TILE_COUNTS[1:])
+def test_tiles_match_single_pass(scene_4k, tiles):
+    single = make_system(scene_4k)
+    tiled = make_system(scene_4k)
+    tiled.DETECTION_TILES = tiles
+
+    # Dots on and around every seam, where a blob is seen by two bands
+    x0, y0, x1, y1 = tiled.detection_roi((scene_4k.height, scene_4k.width))
+    seams = [y0 + (y1 - y0) * i / tiles for i in range(1, tiles)]
+    columns = [x0 + (x1 - x0) * f for f in (0.3, 0.5, 0.7)]
+    spots = [(x, seam + dy) for seam in seams for x, dy in zip(columns, (-2.5, 0.0, 3.0))]
+    frame = scene_4k.render(spots)
+
+    expected = sorted((round(s["center"][0], 3), round(s["center"][1], 3)) for s in single.detect_laser_spots(frame))
+    found = sorted((round(s["center"][0], 3), round(s["center"][1], 3)) for s in tiled.detect_laser_spots(frame))
+    tiled.release_resources()
+    assert len(expected) == len(spots)
+    assert found == expected
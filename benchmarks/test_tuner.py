@@ -0,0 +1,95 @@
+import json
+import time
+
+import numpy as np
+
+import detect
+from conftest import make_system
+from detect import LaserDetectionSystem
+from detection_config import load_detection_config
+from lens_calibration import LensCalibration
+from recorder import SessionRecorder
+from serial_protocol import format_gun_line
+from synthetic_scene import PROJECTOR_HEIGHT, PROJECTOR_WIDTH, SyntheticScene
+from tuner import DEFAULT_KNOBS, LABELS_FILE, LabelledSession, export, tune
+
+FRAME_MS = 1000 / 30
+SIDE = {"name": "side", "corners": [[1120, 200], [1260, 210], [1255, 400], [1115, 390]], "region": [1920, 0, 640, 480]}
+
+
+def record_session(directory, shots=12, seed=0, metadata=None):
+    """A recording with one laser dot per shot and its ground truth as labels.json."""
+    scene = SyntheticScene(1280, 720, seed=seed)
+    rng = np.random.default_rng(seed)
+    recorder = SessionRecorder(str(directory), jpeg_quality=95)
+    recorder.metadata["corners"] = [list(corner) for corner in scene.corners]
+    recorder.metadata.update(metadata or {})
+    hits = []
+    t = 10_000.0
+    for shot in range(shots):
+        gun = "ac"[shot % 2]
+        u, v = rng.uniform(0.1, 0.9) * PROJECTOR_WIDTH, rng.uniform(0.1, 0.9) * PROJECTOR_HEIGHT
+        spot = scene.projector_point_to_camera((u, v))
+        recorder.record_serial(format_gun_line(gun, shot, int(t)), t + 5)
+        for k in range(-3, 8):
+            recorder.record_frame(scene.render([spot] if 0 <= k < 2 else []), t + k * FRAME_MS)
+            while recorder.queue.qsize() > 4:
+                time.sleep(0.005)
+        hits.append({"time": t, "gun": gun, "x": u, "y": v})
+        t += 1000
+    recorder.close()
+    with open(directory / LABELS_FILE, "w") as f:
+        json.dump({"hits": hits, "tolerance_px": 30}, f)
+    return scene
+
+
+def test_tuner_ranks_and_exports(tmp_path):
+    session = tmp_path / "session"
+    scene = record_session(session)
+    points = [
+        dict(DEFAULT_KNOBS),
+        dict(DEFAULT_KNOBS, min_spot_area=60),  # larger than the dots, finds nothing
+        dict(DEFAULT_KNOBS, saturation_min=60, value_min=80, max_spot_area=2000),
+    ]
+    ranked = tune([str(session)], points, workers=2)
+    assert ranked[0]["hit_rate"] == 1.0
+    assert ranked[0]["false_positives"] == 0
+    assert ranked[0]["error_px"] < 5
+    assert ranked[-1]["knobs"]["min_spot_area"] == 60
+    assert ranked[-1]["hit_rate"] == 0.0
+
+    path = tmp_path / "detection_config.json"
+    export(ranked[0], [str(session)], str(path))
+    config = load_detection_config(str(path))
+    assert config["tuning"]["hit_rate"] == 1.0
+    system = LaserDetectionSystem(0, None, 115200, scene.corners, scene.width, scene.height, output_mode="none",
+                                  detection_config=config)
+    assert system.MIN_SPOT_AREA == ranked[0]["knobs"]["min_spot_area"]
+    assert list(system.lower_red2) == config["lower_red2"]
+
+
+def test_replays_with_the_recorded_lens_and_surfaces(tmp_path, monkeypatch):
+    scene = SyntheticScene(1280, 720, seed=0)
+    lens = LensCalibration([[900, 0, 640], [0, 900, 360], [0, 0, 1]], [-0.1, 0.01, 0, 0, 0], (1280, 720))
+    recorder = SessionRecorder(str(tmp_path / "live"))
+    make_system(scene, recorder=recorder, lens_calibration=lens, surfaces=[SIDE])
+    recorder.close()
+    assert recorder.metadata["lens_calibration"] == lens.to_dict()
+    assert recorder.metadata["surfaces"] == [SIDE]
+
+    # The tuning machine's own files must not leak into the scores
+    monkeypatch.setattr(detect, "load_calibration", lambda *args: lens)
+    monkeypatch.setattr(detect, "load_surfaces", lambda: [SIDE])
+    monkeypatch.setattr(detect, "load_mode", lambda camera_index: None)
+    session = tmp_path / "session"
+    record_session(session, shots=2, metadata={key: recorder.metadata[key] for key in ("lens_calibration", "surfaces")})
+    system = LabelledSession(str(session)).make_system({})
+    assert system.lens_calibration.to_dict() == lens.to_dict()
+    assert system.calibration.regions["side"] == tuple(SIDE["region"])
+
+    bare = tmp_path / "bare"
+    record_session(bare, shots=2)
+    system = LabelledSession(str(bare)).make_system({})
+    assert system.lens_calibration is None
+    assert list(system.calibration.regions) == ["screen"]
+    assert (system.CAMERA_MODE.width, system.CAMERA_MODE.height) == (1280, 720)
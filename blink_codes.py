@@ -0,0 +1,96 @@
+DEFAULT_BIT_MS = 25.0
+# One code per shooting gun, see LASER_CODE in Sender_ESP32.cpp. Every code starts with
+# its start bit 1, and any two differ in at least two bits.
+DEFAULT_CODES = {"a": "101101", "c": "110101"}
+
+
+class CodeAccumulator:
+    """
+    On/off samples of one spot track during one code, as two bitmasks: bit i
+    of `ones` is set when the spot was seen in slot i, bit i of `zeros` when a
+    frame in slot i did not show it.
+    """
+    __slots__ = ("start", "frame_time", "spot", "ones", "zeros")
+
+    def __init__(self, start, frame_time, spot):
+        self.start = start  # s, estimated start of the first bit
+        self.frame_time = frame_time  # s, first frame showing the spot
+        self.spot = spot  # (undistorted center, area) in that frame
+        self.ones = 0
+        self.zeros = 0
+
+    def bits(self, length):
+        """The samples as a code string, "?" for slots without a usable sample or with conflicting ones."""
+        return "".join(
+            "?" if (self.ones >> i & 1) == (self.zeros >> i & 1) else str(self.ones >> i & 1) for i in range(length))
+
+
+class BlinkDecoder:
+    """
+    Decodes the on/off codes the guns modulate their laser with.
+
+    Every slot of a code lasts bit_ms, a code starts when a spot appears on a
+    track. The pulse began between the previous analysed frame and that one,
+    so the start is estimated in the middle. Every following frame sets one
+    bit in the accumulator of each running code, unless it falls within
+    `guard` of a slot boundary, where the estimated start is too uncertain to
+    tell the slots apart. That needs frames at least every third of bit_ms.
+
+    A finished code is decoded to the gun whose code agrees with every
+    sample; static red objects, reflections and overlapping codes agree with
+    none or several and decode to None.
+    """
+    def __init__(self, codes=None, bit_ms=DEFAULT_BIT_MS, guard=0.2):
+        codes = DEFAULT_CODES if codes is None else codes
+        lengths = {len(code) for code in codes.values()}
+        if len(lengths) != 1 or any(not code.startswith("1") or set(code) - {"0", "1"} for code in codes.values()):
+            raise ValueError(f"Blink codes must be 0/1 strings of one length starting with 1: {codes}")
+        self.length = lengths.pop()
+        # Slot i is bit i
+        self.codes = {gun: int(code[::-1], 2) for gun, code in codes.items()}
+        self.bit_seconds = bit_ms / 1000
+        self.guard = guard
+        self.duration = self.length * self.bit_seconds
+        self.active = {}  # track id -> CodeAccumulator
+        self.last_time = None
+
+    def update(self, seen, t):
+        """
+        Adds the frame at `t`, `seen` maps the track ids of its spots to (center,
+        area). Returns the accumulators whose code ended with this frame.
+        """
+        finished = []
+        ended = set()
+        for track_id, accumulator in list(self.active.items()):
+            if not self.add(accumulator, track_id in seen, t):
+                finished.append(accumulator)
+                ended.add(track_id)
+                del self.active[track_id]
+
+        # A spot still seen as its code ends is the tail of that code, not a new one
+        for track_id, spot in seen.items():
+            if track_id not in self.active and track_id not in ended:
+                since_previous = 0.0 if self.last_time is None else min(t - self.last_time, self.bit_seconds)
+                accumulator = self.active[track_id] = CodeAccumulator(t - since_previous / 2, t, spot)
+                self.add(accumulator, True, t)
+        self.last_time = t
+        return finished
+
+    def add(self, accumulator, on, t):
+        """Sets the bit of the frame at `t`, False once the code is over."""
+        phase = (t - accumulator.start) / self.bit_seconds
+        slot = int(phase)
+        if slot >= self.length:
+            return False
+        if self.guard <= phase - slot <= 1 - self.guard:
+            if on:
+                accumulator.ones |= 1 << slot
+            else:
+                accumulator.zeros |= 1 << slot
+        return True
+
+    def decode(self, accumulator):
+        """The gun whose code agrees with all samples, None if no code or several codes do."""
+        guns = [gun for gun, code in self.codes.items()
+                if not accumulator.ones & ~code and not accumulator.zeros & code]
+        return guns[0] if len(guns) == 1 else None
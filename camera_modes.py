@@ -0,0 +1,230 @@
+import sys
+import os
+import json
+import time
+import logging
+import argparse
+
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+
+logger = logging.getLogger("CameraModes")
+
+MODES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "camera_modes.json")
+
+CANDIDATE_RESOLUTIONS = [(3840, 2160), (2560, 1440), (1920, 1080), (1280, 720), (640, 480)]
+CANDIDATE_FOURCCS = ["MJPG", "YUYV"]
+CANDIDATE_FPS = [60, 30, 15]
+
+# Latency targets in ms selectable from the CLI / GUI
+LATENCY_TARGETS = {"low": 40, "balanced": 70, "quality": 150}
+
+
+class CameraMode:
+    def __init__(self, width, height, fourcc="MJPG", fps=30, measured_fps=None, latency_ms=None):
+        self.width = int(width)
+        self.height = int(height)
+        self.fourcc = fourcc
+        self.fps = fps
+        self.measured_fps = measured_fps
+        self.latency_ms = latency_ms
+
+    def __repr__(self):
+        text = f"{self.width}x{self.height} {self.fourcc}@{self.fps}"
+        if self.measured_fps is not None:
+            text += f" (measured {self.measured_fps:.1f} fps, {self.latency_ms:.1f} ms)"
+        return text
+
+    def __eq__(self, other):
+        return isinstance(other, CameraMode) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def key(self):
+        return self.width, self.height, self.fourcc, self.fps
+
+    def to_dict(self):
+        return {
+            "width": self.width,
+            "height": self.height,
+            "fourcc": self.fourcc,
+            "fps": self.fps,
+            "measured_fps": self.measured_fps,
+            "latency_ms": self.latency_ms,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def default_backend():
+    if sys.platform == "win32":
+        return cv2.CAP_DSHOW
+    if sys.platform == "darwin":
+        return cv2.CAP_AVFOUNDATION
+    return cv2.CAP_ANY
+
+
+def decode_fourcc(value):
+    value = int(value)
+    return "".join(chr((value >> 8 * i) & 0xFF) for i in range(4))
+
+
+def apply_mode(cap, mode):
+    # FOURCC has to be set before the resolution, otherwise DirectShow/V4L2
+    # negotiate the size against the current (usually uncompressed) format.
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*mode.fourcc))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, mode.width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, mode.height)
+    cap.set(cv2.CAP_PROP_FPS, mode.fps)
+
+
+def read_active_mode(cap):
+    return CameraMode(
+        cap.get(cv2.CAP_PROP_FRAME_WIDTH),
+        cap.get(cv2.CAP_PROP_FRAME_HEIGHT),
+        decode_fourcc(cap.get(cv2.CAP_PROP_FOURCC)),
+        int(round(cap.get(cv2.CAP_PROP_FPS))),
+    )
+
+
+def open_capture(camera_index, backend=None, mode=None):
+    """
+    Opens a camera and applies the given mode. Falls back to the stored mode
+    for the camera, or to 1080p MJPG@30 if nothing was probed yet.
+    """
+    if backend is None:
+        backend = default_backend()
+    if mode is None:
+        mode = load_mode(camera_index) or CameraMode(1920, 1080)
+    cap = cv2.VideoCapture(camera_index, backend)
+    if cap.isOpened():
+        apply_mode(cap, mode)
+        logger.info(f"Camera {camera_index} opened with {read_active_mode(cap)} (requested {mode})")
+    return cap
+
+
+def measure_mode(cap, sample_frames=60, warmup_frames=5):
+    for _ in range(warmup_frames):
+        if not cap.read()[0]:
+            return None, None
+
+    read_times = []
+    start = time.perf_counter()
+    for _ in range(sample_frames):
+        t0 = time.perf_counter()
+        ret, _ = cap.read()
+        if not ret:
+            return None, None
+        read_times.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    # Time to a fresh frame after an idle gap. Drivers keep frames queued, so
+    # this is a delivery delay (buffer drain, frame interval) that ranks the
+    # modes; it is not the capture latency, which needs an external event
+    # such as a laser pulse and must not be used to size match windows.
+    latencies = []
+    for _ in range(5):
+        time.sleep(0.1)
+        cap.grab()
+        t0 = time.perf_counter()
+        cap.read()
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+
+    return sample_frames / elapsed, latencies[len(latencies) // 2] * 1000
+
+
+def probe_modes(camera_index, backend=None, resolutions=None, fourccs=None, fps_list=None, sample_frames=60):
+    if backend is None:
+        backend = default_backend()
+    resolutions = resolutions or CANDIDATE_RESOLUTIONS
+    fourccs = fourccs or CANDIDATE_FOURCCS
+    fps_list = fps_list or CANDIDATE_FPS
+
+    cap = cv2.VideoCapture(camera_index, backend)
+    if not cap.isOpened():
+        logger.error(f"Could not open camera with index {camera_index}.")
+        return []
+
+    results = []
+    seen = set()
+    try:
+        for width, height in resolutions:
+            for fourcc in fourccs:
+                for fps in fps_list:
+                    apply_mode(cap, CameraMode(width, height, fourcc, fps))
+                    active = read_active_mode(cap)
+                    # The driver silently substitutes unsupported combinations
+                    if active.key() in seen or (active.width, active.height) != (width, height):
+                        continue
+                    seen.add(active.key())
+                    active.measured_fps, active.latency_ms = measure_mode(cap, sample_frames)
+                    if active.measured_fps is None:
+                        continue
+                    logger.info(f"Probed {active}")
+                    results.append(active)
+    finally:
+        cap.release()
+    return results
+
+
+def select_best_mode(modes, latency_target_ms, min_fps=25):
+    usable = [m for m in modes if m.latency_ms <= latency_target_ms and m.measured_fps >= min_fps]
+    if usable:
+        return max(usable, key=lambda m: (m.width * m.height, m.measured_fps, -m.latency_ms))
+    if modes:
+        return min(modes, key=lambda m: (m.latency_ms, -m.measured_fps))
+    return None
+
+
+def load_modes_file(path=MODES_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read camera modes from {path}: {e}")
+        return {}
+
+
+def load_mode(camera_index, path=MODES_FILE):
+    data = load_modes_file(path).get(str(camera_index))
+    return CameraMode.from_dict(data) if data else None
+
+
+def save_mode(camera_index, mode, path=MODES_FILE):
+    data = load_modes_file(path)
+    data[str(camera_index)] = mode.to_dict()
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+    logger.info(f"Stored mode {mode} for camera {camera_index} in {path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Probe camera capture modes and store the best one.")
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--target", default="low", help=f"latency target ({', '.join(LATENCY_TARGETS)}) or ms")
+    parser.add_argument("--frames", type=int, default=60, help="frames measured per mode")
+    args = parser.parse_args()
+
+    target_ms = LATENCY_TARGETS.get(args.target)
+    if target_ms is None:
+        target_ms = float(args.target)
+
+    modes = probe_modes(args.camera, sample_frames=args.frames)
+    print("=== Supported capture modes ===")
+    for m in sorted(modes, key=lambda m: (-m.width * m.height, m.fourcc, -m.fps)):
+        print(m)
+
+    best = select_best_mode(modes, target_ms)
+    if best is None:
+        print("No usable mode found.")
+        sys.exit(1)
+    print(f"Best mode for {target_ms} ms target: {best}")
+    save_mode(args.camera, best)
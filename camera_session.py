@@ -0,0 +1,171 @@
+import threading
+import collections
+import time
+import logging
+
+from camera_modes import default_backend, open_capture
+
+logger = logging.getLogger("CameraSession")
+
+
+class FrameSubscription:
+    """
+    Bounded per-subscriber frame queue. A slow subscriber only loses its own
+    oldest frames, it never stalls the capture thread or the other subscribers.
+    """
+    def __init__(self, maxsize=2):
+        self.frames = collections.deque(maxlen=maxsize)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, item):
+        with self.condition:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append(item)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        # Returns (frame, timestamp) or None on timeout / close
+        with self.condition:
+            self.condition.wait_for(lambda: self.frames or self.closed, timeout)
+            if self.frames:
+                return self.frames.popleft()
+            return None
+
+    def qsize(self):
+        return len(self.frames)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class CameraSession:
+    """
+    Owns one open camera device and hands every frame to all subscribers.
+    Frames are shared between subscribers and must be treated as read-only;
+    copy before drawing on them. Timestamps are time.monotonic() seconds.
+    """
+    def __init__(self, camera_index, mode=None, backend=None):
+        self.camera_index = camera_index
+        self.mode = mode
+        self.backend = default_backend() if backend is None else backend
+
+        self.subscribers = []
+        self.subscribers_lock = threading.Lock()
+        self.latest = None
+        self.frame_count = 0
+        self.failed = False
+
+        self.opened_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        # The device is opened on the capture thread, DirectShow expects
+        # reads to happen on the thread that opened it.
+        self.thread = threading.Thread(target=self._run, name=f"camera-{self.camera_index}", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        start = time.perf_counter()
+        cap = open_capture(self.camera_index, self.backend, self.mode)
+        if not cap.isOpened():
+            logger.error(f"Could not open camera with index {self.camera_index}.")
+            self.failed = True
+            self.opened_event.set()
+            return
+        logger.info(f"Camera {self.camera_index} opened in {time.perf_counter() - start:.2f} s")
+        self.opened_event.set()
+
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = cap.read()
+                timestamp = time.monotonic()
+                if not ret:
+                    logger.error(f"Could not read frame from camera {self.camera_index}.")
+                    self.failed = True
+                    break
+
+                self.frame_count += 1
+                item = (frame, timestamp)
+                self.latest = item
+                with self.subscribers_lock:
+                    subscribers = list(self.subscribers)
+                for subscription in subscribers:
+                    subscription.push(item)
+        finally:
+            cap.release()
+            with self.subscribers_lock:
+                for subscription in self.subscribers:
+                    subscription.close()
+            logger.info(f"Camera {self.camera_index} released.")
+
+    def wait_until_opened(self, timeout=None):
+        self.opened_event.wait(timeout)
+        return self.opened_event.is_set() and not self.failed
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive() and not self.failed
+
+    def latest_frame(self):
+        item = self.latest
+        return item[0] if item else None
+
+    def subscribe(self, maxsize=2):
+        subscription = FrameSubscription(maxsize)
+        with self.subscribers_lock:
+            self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.subscribers_lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+        subscription.close()
+
+    def stop(self, timeout=3):
+        self.stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(camera_index, mode=None, backend=None):
+    """
+    Returns the running session for the camera, opening the device only if it
+    is not open yet or the requested mode/backend differs from the open one.
+    """
+    with _sessions_lock:
+        session = _sessions.get(camera_index)
+        if session is not None:
+            same_mode = mode is None or session.mode == mode
+            same_backend = backend is None or session.backend == backend
+            if same_mode and same_backend and session.is_running():
+                return session
+            session.stop()
+        session = CameraSession(camera_index, mode, backend).start()
+        _sessions[camera_index] = session
+        return session
+
+
+def release_session(camera_index):
+    with _sessions_lock:
+        session = _sessions.pop(camera_index, None)
+    if session is not None:
+        session.stop()
+
+
+def release_all():
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.stop()
@@ -0,0 +1,120 @@
+import collections
+import logging
+
+logger = logging.getLogger("ClockSync")
+
+DEVICE_CLOCK_WRAP = 2 ** 32  # ESP32 millis() is an unsigned 32 bit counter
+
+
+class ClockSync:
+    """
+    Maps device millis() timestamps to host time.monotonic() milliseconds.
+
+    Every line gives one (device_ms, host_ms) pair where host_ms includes the
+    serial/USB buffering delay. The least delayed samples form the lower
+    envelope of host - device, so the offset is fitted through the minimum of
+    each chunk of samples; a least-squares line through those minima gives the
+    crystal drift between the two clocks.
+    """
+    def __init__(self, window=256, chunk=16, reset_threshold_ms=5000):
+        self.samples = collections.deque(maxlen=window)
+        self.chunk = chunk
+        self.reset_threshold_ms = reset_threshold_ms
+        self.offset = None
+        self.drift = 0.0
+        self.reference_device_ms = 0.0
+        self.last_raw_device_ms = None
+        self.wraps = 0
+        self.resets = 0
+
+    def unwrap(self, device_ms):
+        if self.last_raw_device_ms is not None and device_ms < self.last_raw_device_ms - DEVICE_CLOCK_WRAP // 2:
+            self.wraps += 1
+        self.last_raw_device_ms = device_ms
+        return device_ms + self.wraps * DEVICE_CLOCK_WRAP
+
+    def reset(self):
+        self.samples.clear()
+        self.offset = None
+        self.drift = 0.0
+        self.last_raw_device_ms = None
+        self.wraps = 0
+        self.resets += 1
+
+    def update(self, device_ms, host_ms):
+        device_ms = self.unwrap(device_ms)
+        if self.offset is not None:
+            # A large jump means the receiver rebooted and millis() restarted
+            error = host_ms - self.to_host_unwrapped(device_ms)
+            if abs(error) > self.reset_threshold_ms:
+                logger.warning(f"Device clock jumped by {error:.0f} ms, resetting synchronisation.")
+                self.reset()
+                device_ms = self.unwrap(device_ms)
+        self.samples.append((device_ms, host_ms))
+        self.fit()
+
+    def fit(self):
+        samples = list(self.samples)
+        envelope = []
+        for i in range(0, len(samples), self.chunk):
+            chunk = samples[i:i + self.chunk]
+            envelope.append(min(chunk, key=lambda s: s[1] - s[0]))
+
+        self.reference_device_ms = samples[0][0]
+        if len(envelope) < 3 or envelope[-1][0] - envelope[0][0] < 10000:
+            # Not enough history to see drift yet, use the minimum delay only
+            self.drift = 0.0
+            self.offset = min(h - d for d, h in samples)
+            return
+
+        n = len(envelope)
+        xs = [d - self.reference_device_ms for d, _ in envelope]
+        ys = [h - d for d, h in envelope]
+        mean_x = sum(xs) / n
+        mean_y = sum(ys) / n
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        self.drift = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+        intercept = mean_y - self.drift * mean_x
+        # Shift the line down so that no sample arrives before its own send time
+        self.offset = intercept + min(
+            (h - d) - (intercept + self.drift * (d - self.reference_device_ms)) for d, h in samples
+        )
+
+    def to_host_unwrapped(self, device_ms):
+        return device_ms + self.offset + self.drift * (device_ms - self.reference_device_ms)
+
+    def to_host(self, device_ms):
+        """Host monotonic ms for a raw device timestamp, None until the first sample."""
+        if self.offset is None:
+            return None
+        wraps = self.wraps
+        if self.last_raw_device_ms is not None and device_ms > self.last_raw_device_ms + DEVICE_CLOCK_WRAP // 2:
+            wraps -= 1
+        return self.to_host_unwrapped(device_ms + wraps * DEVICE_CLOCK_WRAP)
+
+
+class SequenceTracker:
+    """Detects lost, duplicated and reordered messages from receiver sequence numbers."""
+    def __init__(self, modulo=DEVICE_CLOCK_WRAP):
+        self.modulo = modulo
+        self.expected = None
+        self.received = 0
+        self.lost = 0
+        self.duplicates = 0
+
+    def observe(self, seq):
+        """Returns the number of messages missing right before this one, or -1 for a duplicate."""
+        self.received += 1
+        if self.expected is None or seq == 0:
+            # First message, or the receiver rebooted
+            self.expected = (seq + 1) % self.modulo
+            return 0
+
+        gap = (seq - self.expected) % self.modulo
+        if gap >= self.modulo // 2:
+            # Behind the expected number: duplicate or late message
+            self.duplicates += 1
+            return -1
+        self.lost += gap
+        self.expected = (seq + 1) % self.modulo
+        return gap
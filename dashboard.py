@@ -0,0 +1,182 @@
+import time
+import collections
+
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+from PyQt6.QtWidgets import QWidget, QLabel, QGridLayout, QVBoxLayout, QHBoxLayout, QSizePolicy
+from PyQt6.QtGui import QColor, QImage, QPainter, QPen, QPixmap, QPolygonF
+from PyQt6.QtCore import Qt, QTimer, QPointF
+
+REFRESH_INTERVAL_MS = 500
+HISTORY_LENGTH = 120  # samples per sparkline, one minute at the refresh interval
+HEATMAP_SECONDS = 120  # hits older than this fade out of the heatmap
+HEATMAP_BINS = (48, 27)  # projector 16:9
+
+STAGES = [
+    ("queue", "Queue"),
+    ("detect", "Detect"),
+    ("match", "Match"),
+    ("injection_call", "Inject"),
+    ("total", "Capture to hit"),
+]
+
+
+class SparklineWidget(QWidget):
+    def __init__(self, color=QColor(80, 200, 120), parent=None):
+        super().__init__(parent)
+        self.values = collections.deque(maxlen=HISTORY_LENGTH)
+        self.color = color
+        self.setMinimumSize(120, 28)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
+
+    def add(self, value):
+        self.values.append(value)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(30, 30, 30))
+        values = [v for v in self.values if v == v]
+        if len(values) < 2:
+            return
+        top = max(values) or 1.0
+        w, h = self.width(), self.height()
+        step = w / (HISTORY_LENGTH - 1)
+        offset = HISTORY_LENGTH - len(self.values)
+        points = [
+            QPointF((offset + i) * step, h - 2 - (v / top) * (h - 4))
+            for i, v in enumerate(self.values) if v == v
+        ]
+        painter.setPen(QPen(self.color, 1.5))
+        painter.drawPolyline(QPolygonF(points))
+
+
+class DashboardPanel(QWidget):
+    """
+    Live health view of a running LaserDetectionSystem.
+
+    Everything shown is read from the system's metrics registry and its
+    recent_hits deque on a fixed QTimer, so the detection threads never call
+    into Qt and the cost does not depend on the hit or frame rate. Sparklines
+    plot the mean stage time between two refreshes (sum/count deltas of the
+    summaries) rather than individual observations.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.system = None
+        self.last_totals = {}
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.fps_label = QLabel("Detection not running.")
+        layout.addWidget(self.fps_label)
+
+        stages_layout = QGridLayout()
+        self.stage_labels = {}
+        self.sparklines = {}
+        for row, (stage, title) in enumerate(STAGES):
+            stages_layout.addWidget(QLabel(title), row, 0)
+            self.sparklines[stage] = SparklineWidget()
+            stages_layout.addWidget(self.sparklines[stage], row, 1)
+            self.stage_labels[stage] = QLabel("-")
+            self.stage_labels[stage].setMinimumWidth(70)
+            stages_layout.addWidget(self.stage_labels[stage], row, 2)
+        layout.addLayout(stages_layout)
+
+        bottom_layout = QHBoxLayout()
+        self.guns_label = QLabel()
+        self.guns_label.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
+        bottom_layout.addWidget(self.guns_label)
+        self.heatmap_view = QLabel()
+        self.heatmap_view.setMinimumSize(192, 108)
+        # Ignored: the pixmap is sized from the label, it must not grow the label in turn
+        self.heatmap_view.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
+        self.heatmap_view.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        bottom_layout.addWidget(self.heatmap_view, 1)
+        layout.addLayout(bottom_layout)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    def attach(self, system):
+        self.system = system
+        self.last_totals = {}
+        for sparkline in self.sparklines.values():
+            sparkline.values.clear()
+        self.timer.start(REFRESH_INTERVAL_MS)
+
+    def detach(self):
+        self.timer.stop()
+        self.system = None
+        self.fps_label.setText("Detection not running.")
+
+    def stage_summaries(self):
+        system = self.system
+        summaries = {stage: child for (stage,), child in list(system.stage_ms.children.items())}
+        summaries["injection_call"] = system.injection_call_ms.children[()]
+        summaries["total"] = system.injection_latency_ms.children[()]
+        return summaries
+
+    def interval_mean(self, stage, summary):
+        # Mean over the observations since the last refresh, NaN if there were none
+        count, total = summary.count, summary.sum
+        last_count, last_total = self.last_totals.get(stage, (0, 0.0))
+        self.last_totals[stage] = (count, total)
+        if count == last_count:
+            return float("nan")
+        return (total - last_total) / (count - last_count)
+
+    def refresh(self):
+        system = self.system
+        if system is None:
+            return
+        if system.stop_event.is_set():
+            self.detach()
+            return
+
+        self.fps_label.setText(
+            f"Capture {system.capture_fps.value:.1f} fps   Processing {system.processing_fps.value:.1f} fps   "
+            f"Serial lost {system.serial_lost.value}   Reconnects {system.serial_reconnects.value}"
+            + (f"   Budget level {system.latency_controller.level}" if system.latency_controller else ""))
+
+        for stage, summary in self.stage_summaries().items():
+            if stage not in self.sparklines:
+                continue
+            mean = self.interval_mean(stage, summary)
+            self.sparklines[stage].add(mean)
+            p90 = summary.quantiles((0.9,))[0.9]
+            self.stage_labels[stage].setText("-" if p90 != p90 else f"p90 {p90:.1f} ms")
+
+        matched = {gun: c.value for (gun,), c in list(system.signals_matched.children.items())}
+        missed = {gun: c.value for (gun,), c in list(system.signals_unmatched.children.items())}
+        lines = ["Gun   hits   misses"]
+        for gun in sorted(set(matched) | set(missed)):
+            lines.append(f"{gun:<5} {matched.get(gun, 0):>5}   {missed.get(gun, 0):>6}")
+        self.guns_label.setText("\n".join(lines))
+
+        self.update_heatmap()
+
+    def update_heatmap(self):
+        system = self.system
+        cutoff = time.monotonic() - HEATMAP_SECONDS
+        # The heatmap shows the main screen, side surfaces have output coordinates outside it
+        hits = [(x, y) for x, y, _, t, surface in list(system.recent_hits) if t >= cutoff and surface == "screen"]
+        histogram = np.zeros(HEATMAP_BINS[::-1], dtype=np.float32)
+        if hits:
+            points = np.array(hits, dtype=np.float32)
+            histogram, _, _ = np.histogram2d(
+                points[:, 1], points[:, 0], bins=HEATMAP_BINS[::-1],
+                range=[[0, system.SCREEN_HEIGHT], [0, system.SCREEN_WIDTH]])
+            histogram = cv2.GaussianBlur(histogram.astype(np.float32), (5, 5), 0)
+            histogram /= histogram.max() or 1.0
+        colored = cv2.applyColorMap((histogram * 255).astype(np.uint8), cv2.COLORMAP_JET)
+        size = self.heatmap_view.size()
+        width = max(16, min(size.width(), size.height() * 16 // 9))
+        colored = cv2.resize(colored, (width, width * 9 // 16), interpolation=cv2.INTER_LINEAR)
+        rgb = np.ascontiguousarray(cv2.cvtColor(colored, cv2.COLOR_BGR2RGB))
+        h, w, ch = rgb.shape
+        image = QImage(rgb.data, w, h, ch * w, QImage.Format.Format_RGB888)
+        self.heatmap_view.setPixmap(QPixmap.fromImage(image.copy()))
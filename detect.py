@@ -1,194 +1,841 @@
 import sys
-import cv2
-import pyautogui
-import serial
+import signal
 import threading
 import time
-import numpy as np
 import logging
 import queue
-import subprocess
-
+import collections
+
+from lazy_imports import lazy_import
+from camera_modes import CameraMode, default_backend, load_mode
+from camera_session import get_session, release_session
+from lens_calibration import load_calibration
+from latency_budget import LatencyBudgetController
+from screen_calibration import ScreenCalibration, CalibrationDriftTracker, load_surfaces
+from spot_tracker import SpotTracker
+from background_model import RunningBackground
+from blink_codes import BlinkDecoder
+from detection_config import apply_detection_config, load_detection_config
+from sampling_profiler import SamplingProfiler
+from clock_sync import ClockSync, SequenceTracker
+from serial_protocol import parse_gun_line
+from hit_server import DEFAULT_PORT, HitEventServer
+from metrics import MetricsRegistry, MetricsServer
+from serial_hub import SerialHub
+
+# Imported on first use: `import detect` stays fast and works headless
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+serial = lazy_import("serial")
 
 
 class LaserDetectionSystem:
-    def __init__(self, camera_index, serial_port, baudrate, projector_corners,camera_width,camera_height):
+    # Camera, serial and injection threads of the threaded (run) and asyncio (run_async) loops.
+    # run() drives the camera on the thread it is called from, the main thread or the GUI's.
+    PROFILED_THREADS = ("MainThread", "detection", "camera", "serial", "capture", "process", "injection", "detect-tile")
+
+    def __init__(self, camera_index, serial_port, baudrate, projector_corners,camera_width,camera_height,camera_mode=None,camera_session=None,
+                 output_mode="input",hit_server_port=DEFAULT_PORT,recorder=None,
+                 processing_mode="continuous",metrics_port=None,show_preview=True,analytics=None,
+                 lens_calibration=None,latency_budget_ms=None,track_drift=False,detection_config=None,surfaces=None,
+                 blink_codes=None,blink_bit_ms=25.0):
         # Config
         self.CAMERA_INDEX = camera_index
         self.CAMERA_WIDTH = camera_width
         self.CAMERA_HEIGHT = camera_height
+        # Resolution + FOURCC + FPS, see camera_modes.py. MJPG avoids the ~5 fps YUYV fallback.
+        self.CAMERA_MODE = camera_mode or load_mode(camera_index) or CameraMode(camera_width, camera_height)
         self.SCREEN_WIDTH = 1920
         self.SCREEN_HEIGHT = 1080
-        self.MAX_GUN_SIGNAL_AGE = 1000  # ms
+        self.MAX_GUN_SIGNAL_AGE = 1000  # ms, only for receivers without device timestamps
+        # Match window for device-timestamped signals, relative to the frame's monotonic timestamp.
+        # A frame shows the laser from the trigger until the 50 ms pulse ends plus the capture latency.
+        # With blink_codes ({gun: "101101"}, see blink_codes.py) every gun modulates its laser with its
+        # own code; the pulse lasts the whole code and hits are tagged with the gun decoded from the video
+        self.blink_decoder = BlinkDecoder(blink_codes, blink_bit_ms) if blink_codes else None
+        self.LASER_PULSE_MS = self.blink_decoder.duration * 1000 if self.blink_decoder else 50
+        self.GUN_SIGNAL_WINDOW_BEFORE = 15  # ms, clock sync error / frames stamped early
+        # The probed CameraMode.latency_ms is a delivery delay for ranking modes, not the capture
+        # latency (that needs an external event), so it must not narrow this window.
+        self.CAPTURE_LATENCY_MS = 100
+        self.GUN_SIGNAL_WINDOW_AFTER = self.LASER_PULSE_MS + self.CAPTURE_LATENCY_MS
+
+        # "continuous" analyses every frame, "gated" only buffers frames and analyses
+        # the ones around a gun signal, so the detector idles between shots.
+        self.processing_mode = processing_mode
+        self.GATE_BUFFER_SECONDS = 0.5
+        # ms, serial arrival time trails the trigger: frames this much older than an unsynced
+        # signal are gated in and may match it
+        self.GATE_UNSYNCED_LOOKBACK = 200
+        self.GATE_PREVIEW_INTERVAL = 0.2  # s, preview refresh while idle
+        self.gate_buffer = collections.deque()
+        self.gate_open_until = 0  # ms
+        self.last_analysed_time = 0  # s
+        self.last_preview_time = 0  # s
+
+        # Detection only looks at the bounding box of the calibrated corners plus this margin (px).
+        # DETECTION_TILES > 1 splits that box into overlapping horizontal bands analysed on a
+        # thread pool (OpenCV releases the GIL); TILE_OVERLAP must exceed the largest blob height.
+        self.DETECTION_ROI_MARGIN = 40
+        self.DETECTION_TILES = 1
+        self.TILE_OVERLAP = 32
+        self.tile_executor = None
+        self.tile_executor_size = 0
+        # Quality knobs, lowered by latency_budget.py under load
+        self.DETECTION_SCALE = 1.0  # detection runs on the ROI resized by this factor
+        self.ANALYSIS_FRAME_SKIP = 0  # frames skipped between analysed ones while no gun signal is pending
+        self.PREVIEW_INTERVAL = 0.0  # s between preview updates, None disables the preview
+        self.record_frames = True
+        self.record_analytics = True
+        self.frames_skipped = 0
+
+        # Spots are tracked across frames (spot_tracker.py) and a hit is placed where its
+        # track is at PREDICTION_TARGET: "delivery" (the measured capture-to-delivery
+        # latency after the frame), "trigger" (the trigger time) or "none" (the frame).
+        self.spot_tracker = SpotTracker()
+        self.PREDICTION_TARGET = "delivery"
+        self.PREDICTION_MIN_HITS = 3  # detections before a track's velocity is trusted
+        self.PREDICTION_MAX_HORIZON = 0.15  # s
 
         self.lower_red = np.array([0, 100, 100])
         self.upper_red = np.array([10, 255, 255])
 
         self.lower_red2 = np.array([170, 100, 100])
         self.upper_red2 = np.array([180, 255, 255])
+        self.MIN_SPOT_AREA = 5  # px, exclusive
+        self.MAX_SPOT_AREA = 500
+        # "colour" finds every red blob; "difference" only red pixels that also rose by more than
+        # DIFFERENCE_THRESHOLD above a running background (background_model.py), so static red
+        # scenery is no longer re-found on every frame
+        self.DETECTION_MODE = "colour"
+        self.DIFFERENCE_THRESHOLD = 40
+        self.BACKGROUND_ALPHA = 0.05
+        self.BACKGROUND_UPDATE_EVERY = 4  # analysed frames
+        self.BACKGROUND_ABSORB_FRAMES = 30  # analysed frames a change lasts before it counts as new scenery
+        self.backgrounds = {}  # analysed region -> RunningBackground
+        # The HSV bounds, spot area limits, detection mode and MAX_GUN_SIGNAL_AGE above can be
+        # tuned per venue with tuner.py, which writes detection_config.json
+        apply_detection_config(self, load_detection_config() if detection_config is None else detection_config)
         # Signals
 
         # State
+        # One port, or a list of receiver ports read together by serial_hub.py.
+        # With several receivers gun ids become "<receiver>:<gun>", e.g. "1:c".
         self.serial_port = serial_port
+        self.serial_ports = list(serial_port) if isinstance(serial_port, (list, tuple)) else [serial_port]
         self.baudrate = baudrate
-        self.projector_corners = np.array(projector_corners, dtype=np.float32)
 
         # Components
         self.serial_connection = None
+        # "input": pyautogui mouse/keyboard, "udp": hit_server.py events, "both",
+        # "none": no delivery (benchmarks, load tests)
+        self.output_mode = output_mode
+        self.hit_server = None
+        if output_mode in ("udp", "both"):
+            self.hit_server = HitEventServer(port=hit_server_port)
+        self.frame_hits = []
+        # (gun, timestamp, button) -> None, replaces deliver_button for button events when set;
+        # async_runtime.py moves the key presses off its event loop with it
+        self.on_button = None
+        # Optional black-box SessionRecorder (recorder.py), never blocks the detection loop
+        self.recorder = recorder
+        # Optional HitAnalytics (analytics.py): per-gun heatmaps, persisted off the detection thread
+        self.analytics = analytics
+        # Shared device owned by camera_session.py; the GUI hands over the one it calibrated with
+        self.camera_session = camera_session
         self.camera = None
-        self.gun_signal_queue = queue.Queue()
+        self.gun_signal_queue = queue.Queue()  # (gun, host monotonic ms, device timestamped)
+        self.pending_gun_signals = []  # signals taken off the queue that are not matched yet
+        self.clock_sync = ClockSync()
+        self.sequence_tracker = SequenceTracker()
+        # Receiver 0 uses the two above, every further receiver gets its own pair
+        self.receiver_clocks = {0: (self.clock_sync, self.sequence_tracker)}
         self.stop_event = threading.Event()
-        # Homography
-        src = np.float32(projector_corners)
-        dst = np.float32([[0, 0], [self.SCREEN_WIDTH, 0], [self.SCREEN_WIDTH, self.SCREEN_HEIGHT], [0, self.SCREEN_HEIGHT]])
-        self.screen_homography_matrix = cv2.getPerspectiveTransform(src, dst)
+        self.SERIAL_RECONNECT_DELAY = 2  # s
+        self.camera_subscription = None
+        # The GUI runs detection off its main thread and shows dashboard.py instead of the HighGUI window
+        self.show_preview = show_preview
+        # Output coordinates of the latest hits as (x, y, gun, monotonic s, surface), read by dashboard.py
+        self.recent_hits = collections.deque(maxlen=512)
+        self.setup_metrics()
+        self.metrics_server = MetricsServer(self.metrics, metrics_port) if metrics_port else None
+        # Sampling profiler of the pipeline threads, toggled with "p" in the preview, the GUI or
+        # SIGUSR1 (Ctrl+Break on Windows); writes to profiles/ tagged with profile_context()
+        self.profiler = SamplingProfiler(thread_prefixes=self.PROFILED_THREADS, context=self.profile_context)
+        # Optional lens model (lens_calibration.py). Only the detected spots and the
+        # calibrated corners are undistorted, frames are never remapped. None loads the
+        # stored one for the camera, False means no lens correction.
+        if lens_calibration is None:
+            lens_calibration = load_calibration(camera_index, self.CAMERA_MODE.width, self.CAMERA_MODE.height)
+        self.lens_calibration = lens_calibration or None
+        # Homography, ROI and surface lookup map, replaced as a whole by set_projector_corners() while running.
+        # Side surfaces (surfaces.json) are mapped next to the main screen, see load_surfaces().
+        self.calibration = ScreenCalibration(projector_corners, (self.SCREEN_WIDTH, self.SCREEN_HEIGHT),
+                                             self.undistort_points,
+                                             side_surfaces=load_surfaces() if surfaces is None else surfaces)
+        if self.recorder:
+            # Stored with every segment, tuner.py replays recordings with the corners they were taken with
+            self.recorder.metadata["corners"] = self.calibration.corners.tolist()
+            # Gun ids carry the receiver id with several receivers, replays need as many
+            self.recorder.metadata["receivers"] = len(self.serial_ports)
+            # And the lens and side surfaces, so a replay maps spots like this run did
+            self.recorder.metadata["lens_calibration"] = \
+                self.lens_calibration.to_dict() if self.lens_calibration else None
+            self.recorder.metadata["surfaces"] = self.calibration.side_surfaces
+        # Optional slow correction of small camera/projector drift (screen_calibration.py)
+        self.drift_tracker = CalibrationDriftTracker(self) if track_drift else None
+        # Reads the calibration for its ladder, so created after it
+        self.latency_controller = LatencyBudgetController(self, latency_budget_ms) if latency_budget_ms else None
 
         # Logger
         logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(message)s")
         self.logger = logging.getLogger("LaserSystem")
-        self.cv2_backend=cv2.CAP_ANY
         self.platform=sys.platform
-        if self.platform=="win32":
-            self.cv2_backend = cv2.CAP_DSHOW
-        else:
-            self.cv2_backend=cv2.CAP_AVFOUNDATION
+        self.cv2_backend = default_backend()
         self.button_to_key={"a":"f","b":"g","c":"o","d":"p"} #TODO Tolga'ya sor
-    def map_point_to_projector(self, point):
-        x, y = point
-        point_homogeneous = np.array([[x, y]], dtype=np.float32).reshape(-1, 1, 2)
-        transformed_point = cv2.perspectiveTransform(point_homogeneous, self.screen_homography_matrix)
-        projected_x, projected_y = transformed_point[0][0]
-
-        if 0 <= projected_x <= self.SCREEN_WIDTH and 0 <= projected_y <= self.SCREEN_HEIGHT:
-            return int(projected_x), int(projected_y)
+    def setup_metrics(self):
+        m = self.metrics = MetricsRegistry()
+        self.capture_fps = m.rate("capture_fps", "Frames received from the camera per second.")
+        self.processing_fps = m.rate("processing_fps", "Frames run through process_frame per second.")
+        m.gauge_function("dropped_frames_total", "Frames dropped by the camera subscription and the recorder.",
+                         lambda: (self.camera_subscription.dropped if self.camera_subscription else 0)
+                         + (self.recorder.dropped_frames if self.recorder else 0))
+        m.gauge_function("gun_signal_queue_depth", "Gun signals waiting to be matched.",
+                         lambda: self.gun_signal_queue.qsize() + len(self.pending_gun_signals))
+        self.signals_received = m.counter("gun_signals_received_total", "Gun signals parsed from serial.", ["gun"])
+        self.signals_matched = m.counter("gun_signals_matched_total", "Gun signals matched to a laser spot.", ["gun"])
+        self.signals_unmatched = m.counter("gun_signals_unmatched_total", "Gun signals expired without a laser spot.", ["gun"])
+        self.old_signal_discards = m.counter("old_signal_discards_total", "Calls of handle_old_gun_signals that discarded signals.")
+        self.serial_reconnects = m.counter("serial_reconnects_total", "Successful serial reconnects after an error.")
+        self.serial_lost = m.gauge_function("serial_lost_messages_total", "Gaps in receiver sequence numbers.",
+                                            lambda: sum(t.lost for _, t in self.receiver_clocks.values()))
+        self.process_frame_ms = m.summary("process_frame_ms", "Time spent in process_frame.")
+        self.injection_latency_ms = m.summary("injection_latency_ms", "Frame capture to hit delivered to the game.")
+        self.injection_call_ms = m.summary("injection_call_ms", "Time spent in the pyautogui / UDP delivery call.")
+        m.gauge_function("latency_budget_level", "Degradation steps applied by the latency budget controller.",
+                         lambda: self.latency_controller.level if self.latency_controller else 0)
+        self.prediction_horizon_ms = m.summary("prediction_horizon_ms", "Time the hit position was extrapolated by.")
+        self.prediction_shift_px = m.summary("prediction_shift_px", "Distance between the raw and the predicted spot.")
+        self.stage_ms = m.summary("stage_ms", "Per-stage time of the detection pipeline.", ["stage"])
+        self.queue_stage_ms = self.stage_ms.labels("queue")  # capture timestamp to analysis start
+        self.detect_stage_ms = self.stage_ms.labels("detect")
+        self.match_stage_ms = self.stage_ms.labels("match")
+        self.optical_attributions = m.counter(
+            "optical_attributions_total", "Blink codes decoded, by agreement with the serial signals.", ["result"])
+        self.candidate_blobs = m.summary("candidate_blobs", "Blobs found per analysed region before the area filter.")
+        self.calibration_swaps = m.counter("calibration_swaps_total", "Calibrations applied to the running system.", ["source"])
+        m.gauge_function("calibration_offset_px", "Largest corner offset of drift corrections from the operator calibration.",
+                         lambda: self.calibration.offset())
+
+    def undistort_points(self, points):
+        if self.lens_calibration is None:
+            return points
+        return self.lens_calibration.undistort_points(points)
+
+    @property
+    def projector_corners(self):
+        return self.calibration.corners
+
+    @property
+    def screen_homography_matrix(self):
+        return self.calibration.homography
+
+    def set_projector_corners(self, corners, source="operator"):
+        """
+        Applies new camera corners to a running system. The new calibration is
+        built on the calling thread and swapped in with one assignment; frames
+        already in analysis finish with the old one. Drift corrections keep the
+        operator's reference corners, an operator calibration replaces them.
+        The side surfaces are kept.
+        """
+        reference = self.calibration.reference if source == "drift" else None
+        self.calibration = ScreenCalibration(corners, (self.SCREEN_WIDTH, self.SCREEN_HEIGHT),
+                                             self.undistort_points, reference, self.calibration.side_surfaces)
+        self.calibration_swaps.labels(source).inc()
+        if self.recorder:
+            self.recorder.metadata["corners"] = self.calibration.corners.tolist()
+        if source == "drift":
+            self.logger.debug(f"Drift correction, corners now {self.calibration.corners.round(1).tolist()}")
         else:
-            return None
+            self.logger.info(f"Calibration applied ({source}): {self.calibration.corners.tolist()}")
+
+    def map_point_to_projector(self, point, calibration=None):
+        return (calibration or self.calibration).map_point(point)
+
+    def toggle_profiler(self):
+        return self.profiler.toggle()
+
+    def install_profiler_signal(self):
+        # Signal handlers can only be installed from the main thread (not when the GUI runs us)
+        signum = getattr(signal, "SIGUSR1", None) or getattr(signal, "SIGBREAK", None)
+        if signum is None or threading.current_thread() is not threading.main_thread():
+            return
+        # Writing the profile joins the sampler, keep that out of the interrupted frame
+        signal.signal(signum, lambda *_: threading.Thread(target=self.toggle_profiler, daemon=True).start())
+
+    def profile_context(self):
+        """Active configuration and per-stage timings, stored next to a profile."""
+        stages = {}
+        for family in self.metrics.families:
+            if family.kind != "summary":
+                continue
+            for values, child in list(family.children.items()):
+                if child.count:
+                    q = child.quantiles((0.5, 0.9, 0.99))
+                    stages[family.name + "".join(f"[{v}]" for v in values)] = {
+                        "count": child.count, "mean": child.sum / child.count, "p50": q[0.5], "p90": q[0.9], "p99": q[0.99],
+                    }
+        mode = self.CAMERA_MODE
+        return {
+            "camera_mode": {"width": mode.width, "height": mode.height, "fourcc": mode.fourcc, "fps": mode.fps},
+            "processing_mode": self.processing_mode,
+            "output_mode": self.output_mode,
+            "serial_ports": self.serial_ports,
+            "detection_roi_margin": self.DETECTION_ROI_MARGIN,
+            "detection_tiles": self.DETECTION_TILES,
+            "detection_scale": self.DETECTION_SCALE,
+            "detection_mode": self.DETECTION_MODE,
+            "analysis_frame_skip": self.ANALYSIS_FRAME_SKIP,
+            "preview_interval": self.PREVIEW_INTERVAL,
+            "record_frames": self.recorder is not None and self.record_frames,
+            "record_analytics": self.analytics is not None and self.record_analytics,
+            "prediction_target": self.PREDICTION_TARGET,
+            "blink_codes": self.blink_decoder is not None,
+            "lens_calibration": self.lens_calibration is not None,
+            "latency_budget_level": self.latency_controller.level if self.latency_controller else None,
+            "capture_fps": self.capture_fps.value,
+            "processing_fps": self.processing_fps.value,
+            "stages_ms": stages,
+        }
 
     def handle_old_gun_signals(self, old_signals):
         if old_signals:
+            self.old_signal_discards.inc()
+            for signal, _ in old_signals:
+                self.signals_unmatched.labels(signal).inc()
             print(old_signals)
             self.logger.warning(f"Handling {len(old_signals)} old gun signals.:{old_signals} ")
 
     def read_serial(self):
-        try:
-            while not self.stop_event.is_set():
-                if self.serial_connection and self.serial_connection.in_waiting > 0:
-                    data = self.serial_connection.readline().decode("utf-8").strip().lower()
-                    self.logger.info(f"Received from serial: {data}")
-                    gun_signal = None
-                    if data.startswith("ir laser fired from gun a"):
-                        gun_signal = "a"
-                    elif data.startswith("ir laser fired from gun b"):
-                        key=self.button_to_key.get("b",None)
-                        pyautogui.press(key)
-                    elif data.startswith("ir laser fired from gun c"):
-                        gun_signal = "c"
-                    elif data.startswith("ir laser fired from gun d"):
-                        key=self.button_to_key.get("d",None)
-                        pyautogui.press(key)
-                    self.logger.info(f"gun_signal: {gun_signal}")
-                    self.logger.info(f"data: {data}")
-
-                    if gun_signal:
-                        self.logger.debug("gun signal added : " + gun_signal)
-                        self.gun_signal_queue.put((gun_signal, time.time() * 1000))
+        while not self.stop_event.is_set():
+            if self.serial_connection is None:
+                # Reconnect after an unplugged receiver or a serial error
+                self.stop_event.wait(self.SERIAL_RECONNECT_DELAY)
+                if self.stop_event.is_set():
+                    break
+                self.start_serial()
+                if self.serial_connection:
+                    self.serial_reconnects.inc()
+                continue
+            try:
+                # Blocking readline (timeout=1 s) instead of polling in_waiting, which kept a core busy.
+                # A read that times out mid-line returns the partial line; keep it for the next read.
+                partial = b""
+                while not self.stop_event.is_set():
+                    line = self.serial_connection.readline()
+                    if not line:
+                        continue
+                    if not line.endswith(b"\n"):
+                        partial += line
+                        continue
+                    data = (partial + line).decode("utf-8", errors="replace").strip().lower()
+                    partial = b""
+                    self.handle_serial_line(data, time.monotonic() * 1000)
+
+            except serial.SerialException as e:
+                self.logger.error(f"Serial error: {e}")
+                try:
+                    self.serial_connection.close()
+                except Exception:
+                    pass
+                self.serial_connection = None
+
+    def read_serial_ports(self):
+        # Several receivers on one thread, see serial_hub.py
+        hub = SerialHub(self.serial_ports, self.baudrate, self.handle_receiver_line, self.stop_event,
+                        self.SERIAL_RECONNECT_DELAY, lambda receiver_id: self.serial_reconnects.inc())
+        hub.run()
+
+    def handle_receiver_line(self, receiver_id, data, host_ms):
+        self.handle_serial_line(data, host_ms, receiver_id)
+
+    def gun_id(self, receiver_id, gun):
+        if len(self.serial_ports) > 1:
+            return f"{receiver_id}:{gun}"
+        return gun
+
+    def key_for_gun(self, gun_id):
+        # "1:c" falls back to the key of "c" unless button_to_key maps it explicitly
+        key = self.button_to_key.get(gun_id)
+        if key is None:
+            key = self.button_to_key.get(gun_id.rpartition(":")[2])
+        return key
+
+    def handle_serial_line(self, data, host_ms, receiver_id=0):
+        # host_ms: time.monotonic() ms when the line was read, also used by recorder.replay()
+        self.logger.info(f"Received from serial: {data}")
+        if self.recorder:
+            self.recorder.record_serial(data, host_ms, receiver_id)
+        event = parse_gun_line(data)
+        if event is None:
+            return
 
-        except serial.SerialException as e:
-            self.logger.error(f"Serial error: {e}")
-            self.serial_connection = None
+        clock_sync, sequence_tracker = self.receiver_clocks.get(receiver_id) or \
+            self.receiver_clocks.setdefault(receiver_id, (ClockSync(), SequenceTracker()))
+
+        if event.seq is not None:
+            lost = sequence_tracker.observe(event.seq)
+            if lost > 0:
+                self.logger.warning(f"Lost {lost} gun signal(s) before seq {event.seq}.")
+            elif lost < 0:
+                self.logger.warning(f"Duplicate gun signal seq {event.seq} ignored.")
+                return
+
+        timestamp = host_ms
+        synced = False
+        if event.device_ms is not None:
+            clock_sync.update(event.device_ms, host_ms)
+            timestamp = clock_sync.to_host(event.device_ms)
+            synced = True
+
+        gun_id = self.gun_id(receiver_id, event.gun)
+        self.signals_received.labels(gun_id).inc()
+        gun_signal = None
+        if event.gun == "a" or event.gun == "c":
+            gun_signal = gun_id
+        elif event.gun == "b" or event.gun == "d":
+            (self.on_button or self.deliver_button)(gun_id, timestamp, event.button)
+        self.logger.info(f"gun_signal: {gun_signal}, button: {event.button}")
+
+        if gun_signal:
+            self.logger.debug("gun signal added : " + gun_signal)
+            self.gun_signal_queue.put((gun_signal, timestamp, synced))
+
+    def drain_gun_signals(self):
+        while not self.gun_signal_queue.empty():
+            self.pending_gun_signals.append(self.gun_signal_queue.get())
+
+    def gun_signal_window_start(self, timestamp, synced):
+        return timestamp - (self.GUN_SIGNAL_WINDOW_BEFORE if synced else self.GATE_UNSYNCED_LOOKBACK)
+
+    def gun_signal_window_end(self, timestamp, synced):
+        return timestamp + (self.GUN_SIGNAL_WINDOW_AFTER if synced else self.MAX_GUN_SIGNAL_AGE)
+
+    def expire_gun_signals(self, frame_ms):
+        """Drains the signal queue and passes the signals whose window ended before `frame_ms` to handle_old_gun_signals."""
+        self.drain_gun_signals()
+        old_signals = [(signal, timestamp) for signal, timestamp, synced in self.pending_gun_signals
+                       if frame_ms > self.gun_signal_window_end(timestamp, synced)]
+        if old_signals:
+            self.pending_gun_signals = [(signal, timestamp, synced)
+                                        for signal, timestamp, synced in self.pending_gun_signals
+                                        if frame_ms <= self.gun_signal_window_end(timestamp, synced)]
+            self.handle_old_gun_signals(old_signals)
 
-    def process_frame(self, frame):
+    def take_gun_signal(self, frame_ms, gun=None):
+        """
+        Returns the oldest (gun, timestamp, synced) whose window contains the frame time, or None.
+        Expired signals are passed to handle_old_gun_signals, signals newer than
+        the frame stay pending for the following frames. `gun` only takes that gun's signals.
+        """
+        self.drain_gun_signals()
+
+        matched = None
+        old_signals = []
+        remaining = []
+        for signal, timestamp, synced in self.pending_gun_signals:
+            if frame_ms > self.gun_signal_window_end(timestamp, synced):
+                old_signals.append((signal, timestamp))
+            elif matched is None and frame_ms >= self.gun_signal_window_start(timestamp, synced) \
+                    and gun in (None, signal):
+                matched = (signal, timestamp, synced)
+            else:
+                remaining.append((signal, timestamp, synced))
+        self.pending_gun_signals = remaining
+
+        self.handle_old_gun_signals(old_signals)
+        return matched
+
+    def deliver_hit(self, gun_signal, x, y, frame_time, trigger_time, confidence, surface="screen"):
+        self.signals_matched.labels(gun_signal).inc()
+        call_start = time.monotonic()
+        placed = None
+        if self.output_mode in ("udp", "both"):
+            self.frame_hits.append({
+                "gun": gun_signal,
+                "surface": surface,
+                "x": x,
+                "y": y,
+                "capture_time": frame_time * 1000,
+                "trigger_time": trigger_time,
+                "confidence": round(confidence, 3),
+            })
+        if self.output_mode in ("input", "both"):
+            # Imported on first use: pyautogui needs a display, the UDP output and benchmarks run headless
+            import pyautogui
+            key=self.key_for_gun(gun_signal)
+            print(f"key: ", key)
+            if key is not None:
+                # Without its PAUSE, so the latency is taken when the cursor lands and not 100 ms later
+                pyautogui.moveTo(x, y, _pause=False)
+                placed = time.monotonic()
+                pyautogui.press(key)
+                pyautogui.click()
+            else:
+                self.logger.error(f"Gun signal {gun_signal} not mapped to any key.")
+            # On Mac go to:
+            # System Settings -> Privacy & Security -> Accessibility
+            # Add your Terminal App to the list and give it permission. Without this PyAutoGUI cant control the mouse or keyboard.
+        now = time.monotonic()
+        self.injection_call_ms.observe((now - call_start) * 1000)
+        # Up to the cursor placement in input mode, the key press and click pauses come after it
+        self.injection_latency_ms.observe(((placed or now) - frame_time) * 1000)
+        self.recent_hits.append((x, y, gun_signal, now, surface))
+        if self.analytics and self.record_analytics:
+            self.analytics.record_hit(gun_signal, x, y, frame_time, trigger_time, surface,
+                                      self.calibration.regions.get(surface))
+
+    def deliver_button(self, gun_signal, timestamp, button=None):
+        if self.hit_server:
+            self.hit_server.publish_button(gun_signal, timestamp, button)
+        if self.output_mode in ("input", "both"):
+            import pyautogui
+            # button_to_key may map single buttons, e.g. "b2", before the gun's key
+            key = self.button_to_key.get(f"{gun_signal}{button}") if button else None
+            key = key or self.key_for_gun(gun_signal)
+            pyautogui.press(key)
+
+    def flush_hits(self, frame_time):
+        # One datagram per frame, so simultaneous hits from several guns arrive together
+        if self.frame_hits and self.hit_server:
+            self.hit_server.publish_hits(frame_time * 1000, self.frame_hits)
+            self.frame_hits = []
+
+    def gated_frames(self, frame, frame_time):
+        """
+        Buffers the frame and returns the (frame, frame_time) pairs that have to be
+        analysed now: nothing while no gun signal is pending, otherwise the buffered
+        frames from just before the earliest signal up to the end of its window.
+        """
+        self.gate_buffer.append((frame, frame_time))
+        while self.gate_buffer and frame_time - self.gate_buffer[0][1] > self.GATE_BUFFER_SECONDS:
+            self.gate_buffer.popleft()
+
+        self.drain_gun_signals()
+        frame_ms = frame_time * 1000
+        # Signals that were never matched must not keep the gate open
+        expired = [s for s in self.pending_gun_signals if frame_ms > self.gun_signal_window_end(s[1], s[2])]
+        if expired:
+            self.pending_gun_signals = [s for s in self.pending_gun_signals if s not in expired]
+            self.handle_old_gun_signals([(signal, timestamp) for signal, timestamp, _ in expired])
+
+        start_ms = None
+        for _, timestamp, synced in self.pending_gun_signals:
+            window_start = self.gun_signal_window_start(timestamp, synced)
+            start_ms = window_start if start_ms is None else min(start_ms, window_start)
+            self.gate_open_until = max(self.gate_open_until, self.gun_signal_window_end(timestamp, synced))
+
+        if start_ms is None and frame_ms > self.gate_open_until:
+            return []
+
+        frames = [
+            (f, t) for f, t in self.gate_buffer
+            if t > self.last_analysed_time and (start_ms is None or t * 1000 >= start_ms)
+        ]
+        self.last_analysed_time = frame_time
+        return frames
+
+    def detection_roi(self, frame_shape, calibration=None):
+        """(x0, y0, x1, y1) searched for spots: the corners' bounding box plus DETECTION_ROI_MARGIN."""
+        return (calibration or self.calibration).roi(frame_shape, self.DETECTION_ROI_MARGIN)
+
+    def detect_laser_spots(self, frame, calibration=None):
+        """Returns [{'center': (x, y), 'area': a}] for every red blob; centers are sub-pixel floats."""
+        x0, y0, x1, y1 = self.detection_roi(frame.shape, calibration)
+        tiles = self.DETECTION_TILES
+        if tiles <= 1:
+            return self.detect_spots_in_region(frame, x0, y0, x1, y1, y0, y1)
+
+        if self.tile_executor is None or self.tile_executor_size != tiles:
+            if self.tile_executor is not None:
+                self.tile_executor.shutdown(wait=False)
+            from concurrent.futures import ThreadPoolExecutor
+            self.tile_executor = ThreadPoolExecutor(tiles, thread_name_prefix="detect-tile")
+            self.tile_executor_size = tiles
+        # Every band owns rows [own_start, own_end) and reads TILE_OVERLAP rows beyond them,
+        # so a blob on a seam is seen whole by both bands but only kept by the owner of its center
+        bounds = np.linspace(y0, y1, tiles + 1).astype(int)
+        futures = [
+            self.tile_executor.submit(
+                self.detect_spots_in_region, frame, x0, max(y0, own_start - self.TILE_OVERLAP),
+                x1, min(y1, own_end + self.TILE_OVERLAP), own_start, own_end)
+            for own_start, own_end in zip(bounds[:-1], bounds[1:])
+        ]
+        potential_spots = []
+        for future in futures:
+            potential_spots.extend(future.result())
+        return potential_spots
+
+    def detect_spots_in_region(self, frame, x0, y0, x1, y1, own_start, own_end):
+        region = frame[y0:y1, x0:x1]
+        scale = self.DETECTION_SCALE
+        if scale != 1.0:
+            region = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
         # Convert the frame to HSV color space
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        hsv = cv2.cvtColor(region, cv2.COLOR_BGR2HSV)
 
         # Create masks for the red color ranges
         mask1 = cv2.inRange(hsv, self.lower_red, self.upper_red)
         mask2 = cv2.inRange(hsv, self.lower_red2, self.upper_red2)
         mask = cv2.bitwise_or(mask1, mask2)
+        if self.DETECTION_MODE == "difference":
+            mask = cv2.bitwise_and(mask, self.background_for((x0, y0, x1, y1, scale)).changed(region))
 
         contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        self.candidate_blobs.observe(len(contours))
 
         potential_spots = []
         for contour in contours:
-            area = cv2.contourArea(contour)
-            if 5 < area < 500:
+            # Areas and centers in full-resolution pixels
+            area = cv2.contourArea(contour) / (scale * scale)
+            if self.MIN_SPOT_AREA < area < self.MAX_SPOT_AREA:
                 M = cv2.moments(contour)
                 if M["m00"] != 0:
-                    cX = int(M["m10"] / M["m00"])
-                    cY = int(M["m01"] / M["m00"])
-                    potential_spots.append({'center': (cX, cY), 'area': area})
+                    center_y = y0 + M["m01"] / M["m00"] / scale
+                    if own_start <= center_y < own_end:
+                        potential_spots.append({'center': (x0 + M["m10"] / M["m00"] / scale, center_y), 'area': area})
+        return potential_spots
+
+    def background_for(self, region):
+        background = self.backgrounds.get(region)
+        if background is None:
+            # A new ROI, tiling or scale starts over; models of the old regions are dropped
+            if len(self.backgrounds) >= 2 * max(1, self.DETECTION_TILES):
+                self.backgrounds.clear()
+            background = self.backgrounds[region] = RunningBackground()
+        background.alpha = self.BACKGROUND_ALPHA
+        background.update_every = self.BACKGROUND_UPDATE_EVERY
+        background.threshold = self.DIFFERENCE_THRESHOLD
+        background.absorb_after = self.BACKGROUND_ABSORB_FRAMES
+        return background
+
+    def should_analyse(self, frame_time):
+        """
+        Applies ANALYSIS_FRAME_SKIP to the frame captured at `frame_time` (s); frames are never
+        skipped while a gun signal waits for its spot, nor with blink codes, which need every frame.
+        """
+        if not self.ANALYSIS_FRAME_SKIP or self.blink_decoder:
+            self.frames_skipped = 0
+            return True
+        # take_gun_signal only runs on frames with a spot: a shot that missed the screen
+        # would otherwise stop the skipping until the next detected one
+        self.expire_gun_signals(frame_time * 1000)
+        if self.pending_gun_signals:
+            self.frames_skipped = 0
+            return True
+        if self.frames_skipped >= self.ANALYSIS_FRAME_SKIP:
+            self.frames_skipped = 0
+            return True
+        self.frames_skipped += 1
+        return False
+
+    def preview_due(self, frame_time, min_interval=0.0):
+        if not self.show_preview or self.PREVIEW_INTERVAL is None:
+            return False
+        if frame_time - self.last_preview_time < max(self.PREVIEW_INTERVAL, min_interval):
+            return False
+        self.last_preview_time = frame_time
+        return True
+
+    def process_frame(self, frame, frame_time=None):
+        # frame_time: time.monotonic() seconds when the frame was captured
+        if frame_time is None:
+            frame_time = time.monotonic()
+        for hit in self.analyse_frame(frame, frame_time):
+            self.deliver_hit(*hit)
+        self.flush_hits(frame_time)
+        return frame
+
+    def prediction_horizon(self, frame_time, trigger_time):
+        """Seconds from the frame to the moment the hit is placed at; measured, not configured."""
+        if self.PREDICTION_TARGET == "trigger":
+            horizon = trigger_time / 1000 - frame_time
+        elif self.PREDICTION_TARGET == "delivery" and self.injection_latency_ms.recent:
+            horizon = self.injection_latency_ms.quantiles((0.5,))[0.5] / 1000
+        else:
+            return 0.0
+        return max(-self.PREDICTION_MAX_HORIZON, min(self.PREDICTION_MAX_HORIZON, horizon))
+
+    def predict_spot(self, track, center, frame_time, trigger_time):
+        """Camera position of the spot at the prediction target, the raw center for young tracks."""
+        if track.hits < self.PREDICTION_MIN_HITS:
+            return center
+        horizon = self.prediction_horizon(frame_time, trigger_time)
+        x, y = track.position_at(frame_time + horizon)
+        self.prediction_horizon_ms.observe(horizon * 1000)
+        self.prediction_shift_px.observe(float(np.hypot(x - center[0], y - center[1])))
+        return x, y
+
+    def analyse_frame(self, frame, frame_time):
+        """
+        Detection and signal matching without delivery. Draws the preview overlay
+        on `frame` and returns the hits as deliver_hit() argument tuples.
+        """
+        hits = []
+        process_start = time.perf_counter()
+        self.queue_stage_ms.observe((time.monotonic() - frame_time) * 1000)
+        self.processing_fps.tick()
+        # One calibration for the whole frame, set_projector_corners() may swap it meanwhile
+        calibration = self.calibration
+        potential_spots = self.detect_laser_spots(frame, calibration)
+        detect_end = time.perf_counter()
+        self.detect_stage_ms.observe((detect_end - process_start) * 1000)
+
+        centers = self.undistort_points([spot['center'] for spot in potential_spots])
+        tracks = self.spot_tracker.update(centers, frame_time)
 
         laser_spot = None
         if potential_spots:
-            best_spot = max(potential_spots, key=lambda spot: spot['area'])
-            laser_spot = best_spot['center']
-            cv2.circle(frame, best_spot['center'], 5, (0, 255, 0), -1)
-
-        if laser_spot:
+            best_index = max(range(len(potential_spots)), key=lambda i: potential_spots[i]['area'])
+            best_spot = potential_spots[best_index]
+            laser_spot = (int(best_spot['center'][0]), int(best_spot['center'][1]))
+            cv2.circle(frame, laser_spot, 5, (0, 255, 0), -1)
+
+        if self.blink_decoder:
+            hits = self.decode_blink_hits(potential_spots, centers, tracks, frame_time, calibration)
+            self.match_stage_ms.observe((time.perf_counter() - detect_end) * 1000)
+        elif laser_spot:
             self.logger.info(f"Laser Detected at: {laser_spot}")
-            gun_signal = None
-            old_signals = []
-            while not self.gun_signal_queue.empty():
-                self.logger.info(f"old_signals at: {old_signals}")
-                self.logger.info(f"gun_signal at: {gun_signal}")
-                signal, timestamp = self.gun_signal_queue.get()
-                if time.time() * 1000 - timestamp > self.MAX_GUN_SIGNAL_AGE:
-                    old_signals.append((signal, timestamp))
-                    self.logger.info(f"signal at: {signal}")
-                else:
-                    gun_signal = signal
-                    break
-
-            self.handle_old_gun_signals(old_signals)
-            
-            if gun_signal:
-                if self.map_point_to_projector(laser_spot):
+            matched = self.take_gun_signal(frame_time * 1000)
+
+            if matched:
+                gun_signal, trigger_time, synced = matched
+                aim_point = self.predict_spot(tracks[best_index], centers[best_index], frame_time, trigger_time)
+                surface, screen_point = calibration.locate(aim_point) or (None, None)
+                if self.recorder:
+                    self.recorder.record_detection({
+                        "spot": laser_spot, "gun": gun_signal, "trigger_time": trigger_time, "screen": screen_point,
+                        "surface": surface,
+                    }, frame_time * 1000)
+                if screen_point:
                     self.logger.debug("FIRE!!!!!!")
-                    self.logger.info(f"Gun Fired: Gun {gun_signal}, at {laser_spot} which is mapped to {self.map_point_to_projector(laser_spot)}")
-                    x,y=self.map_point_to_projector(laser_spot)
-                    key=self.button_to_key.get(gun_signal,None)
-                    print(f"key: ", key)
-                    if key is not None:
-                        pyautogui.moveTo(x,y)
-                        pyautogui.press(key)
-                        pyautogui.click()
-                    else:
-                        self.logger.error(f"Gun signal {gun_signal} not mapped to any key.")
-                    # On Mac go to:
-                    # System Settings -> Privacy & Security -> Accessibility
-                    # Add your Terminal App to the list and give it permission. Without this PyAutoGUI cant control the mouse or keyboard.
+                    self.logger.info(f"Gun Fired: Gun {gun_signal}, at {laser_spot} mapped to {screen_point} on {surface}")
+                    x,y=screen_point
+                    # Device-timestamped matches are far less ambiguous than the 1 s legacy window
+                    confidence = min(1.0, best_spot['area'] / 50) * (1.0 if synced else 0.5)
+                    hits.append((gun_signal, x, y, frame_time, trigger_time, confidence, surface))
                 else:
-                    self.logger.info("Gun fired but point is outside projector screen.")
-
-        if len(self.projector_corners) == 4:
-            cv2.polylines(frame, [self.projector_corners.astype(np.int32)], True, (0, 255, 255), 2)
-
-        return frame
+                    self.logger.info("Gun fired but point is outside every calibrated surface.")
+            elif self.recorder:
+                self.recorder.record_detection({"spot": laser_spot, "gun": None}, frame_time * 1000)
+            self.match_stage_ms.observe((time.perf_counter() - detect_end) * 1000)
+
+        for surface in calibration.surfaces:
+            cv2.polylines(frame, [surface.corners.astype(np.int32)], True, (0, 255, 255), 2)
+
+        self.process_frame_ms.observe((time.perf_counter() - process_start) * 1000)
+        return hits
+
+    def decode_blink_hits(self, potential_spots, centers, tracks, frame_time, calibration):
+        """
+        Blink code mode: the hits of the codes that ended with this frame, at the spot where
+        each code began and tagged with its decoded gun, so simultaneous shots of several
+        guns are told apart. The serial signal of that gun supplies the trigger time; a
+        missing one or a pending signal of another gun is counted in optical_attributions.
+        """
+        seen = {track.track_id: (centers[i], potential_spots[i]['area']) for i, track in enumerate(tracks)}
+        hits = []
+        for code in self.blink_decoder.update(seen, frame_time):
+            gun = self.blink_decoder.decode(code)
+            center, area = code.spot
+            spot = (int(center[0]), int(center[1]))
+            if gun is None:
+                self.optical_attributions.labels("unknown").inc()
+                if self.recorder:
+                    self.recorder.record_detection({
+                        "spot": spot, "gun": None, "code": code.bits(self.blink_decoder.length),
+                    }, code.frame_time * 1000)
+                continue
+
+            start_ms = code.start * 1000
+            matched = self.take_gun_signal(start_ms, gun)
+            if matched:
+                result, trigger_time = "agree", matched[1]
+            else:
+                others = [signal for signal, timestamp, synced in self.pending_gun_signals
+                          if self.gun_signal_window_start(timestamp, synced) <= start_ms
+                          <= self.gun_signal_window_end(timestamp, synced)]
+                result, trigger_time = ("disagree" if others else "no_serial"), start_ms
+                self.logger.warning(f"Blink code of gun {gun} at {spot} without its serial signal"
+                                    + (f", pending: {others}" if others else ""))
+            self.optical_attributions.labels(result).inc()
+
+            surface, screen_point = calibration.locate(center) or (None, None)
+            if self.recorder:
+                self.recorder.record_detection({
+                    "spot": spot, "gun": gun, "trigger_time": trigger_time, "screen": screen_point, "surface": surface,
+                    "serial": result,
+                }, code.frame_time * 1000)
+            if screen_point:
+                self.logger.info(f"Gun Fired: Gun {gun} (blink code), at {spot} mapped to {screen_point} on {surface}")
+                confidence = min(1.0, area / 50) * (1.0 if result == "agree" else 0.5)
+                hits.append((gun, screen_point[0], screen_point[1], code.frame_time, trigger_time, confidence, surface))
+        return hits
 
     def camera_feed(self):
-        self.camera = cv2.VideoCapture(self.CAMERA_INDEX, self.cv2_backend)
-        self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, self.CAMERA_WIDTH)
-        self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.CAMERA_HEIGHT)
-
-        if not self.camera.isOpened():
+        self.camera = self.camera_session or get_session(self.CAMERA_INDEX, self.CAMERA_MODE, self.cv2_backend)
+        if not self.camera.wait_until_opened(timeout=10):
             self.logger.error("Could not open camera.")
             return
 
-        while not self.stop_event.is_set():
-            ret, frame = self.camera.read()
-            if not ret:
-                self.logger.error("Could not read frame.")
-                break
-
-            processed_frame = self.process_frame(frame)
-            cv2.imshow("Camera Feed", cv2.resize(processed_frame, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA))
-
-            if cv2.waitKey(1) & 0xFF == ord("q"):
-                self.stop_event.set()
-                break
-
-        self.camera.release()
-        cv2.destroyAllWindows()
+        subscription = self.camera_subscription = self.camera.subscribe()
+        try:
+            while not self.stop_event.is_set():
+                item = subscription.get(timeout=1)
+                if item is None:
+                    if not self.camera.is_running():
+                        self.logger.error("Could not read frame.")
+                        break
+                    continue
+
+                # Frames are shared with the other subscribers, draw on a copy
+                frame, frame_time = item
+                busy_start = time.perf_counter()
+                self.capture_fps.tick()
+                if self.recorder and self.record_frames:
+                    self.recorder.record_frame(frame, frame_time * 1000)
+
+                processed_frame = None
+                if self.processing_mode == "gated":
+                    for buffered_frame, buffered_time in self.gated_frames(frame, frame_time):
+                        processed_frame = self.process_frame(buffered_frame.copy(), buffered_time)
+                elif self.should_analyse(frame_time):
+                    processed_frame = self.process_frame(frame.copy(), frame_time)
+
+                if processed_frame is None:
+                    # Gate idle or frame skipped: only a low-rate raw preview, no analysis
+                    if self.preview_due(frame_time, self.GATE_PREVIEW_INTERVAL):
+                        cv2.imshow("Camera Feed", cv2.resize(frame, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA))
+                else:
+                    if self.preview_due(frame_time):
+                        cv2.imshow("Camera Feed", cv2.resize(processed_frame, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA))
+                    if self.latency_controller:
+                        self.latency_controller.observe((time.perf_counter() - busy_start) * 1000)
+
+                if self.show_preview:
+                    key = cv2.waitKey(1) & 0xFF
+                    if key == ord("q"):
+                        self.stop_event.set()
+                        break
+                    if key == ord("p"):
+                        self.toggle_profiler()
+        finally:
+            self.camera.unsubscribe(subscription)
+            # Only release a device we opened ourselves, the GUI keeps its session alive
+            if self.camera_session is None:
+                release_session(self.CAMERA_INDEX)
+            if self.show_preview:
+                cv2.destroyAllWindows()
 
     def start_serial(self):
         try:
@@ -201,6 +848,7 @@ class LaserDetectionSystem:
     def start_external_app(self, app_path):
         # Safely try to start the external application
         if app_path:
+            import subprocess
             try:
                 subprocess.Popen(app_path)
                 self.logger.info(f"Started external application: {app_path}")
@@ -209,22 +857,43 @@ class LaserDetectionSystem:
         else:
             self.logger.critical("No external app path provided. Skipping launch.")
 
+    def run_async(self, external_app_path=None):
+        """Runs the system on the asyncio runtime (async_runtime.py) instead of free threads."""
+        from async_runtime import AsyncRuntime
+        try:
+            self.start_external_app(external_app_path)
+        except Exception as e:
+            self.logger.critical(f"Failed to start external application: {e}")
+            return
+        self.install_profiler_signal()
+        self.runtime = AsyncRuntime(self, show_preview=self.show_preview)
+        self.runtime.run()
+
     def run(self, external_app_path=None):
         try:
             self.start_external_app(external_app_path)
         except Exception as e:
             self.logger.critical(f"Failed to start external application: {e}")
             return
-        self.start_serial()
+        self.install_profiler_signal()
+        # serial_port=None runs without a receiver (soak tests, camera-only checks)
+        if len(self.serial_ports) == 1 and self.serial_port:
+            self.start_serial()
         if self.platform=="win32":
-            camera_thread = threading.Thread(target=self.camera_feed)
+            camera_thread = threading.Thread(target=self.camera_feed, name="camera")
             camera_thread.start()
 
-        if self.serial_connection:
-            serial_thread = threading.Thread(target=self.read_serial)
+        if len(self.serial_ports) == 1 and self.serial_port and not self.serial_connection:
+            self.logger.critical("Serial connection failure, retrying in the background.")
+        if len(self.serial_ports) > 1:
+            serial_thread = threading.Thread(target=self.read_serial_ports, name="serial")
             serial_thread.start()
-        else:
-            self.logger.critical("Serial connection failure.")
+        elif self.serial_port:
+            serial_thread = threading.Thread(target=self.read_serial, name="serial")
+            serial_thread.start()
+        if self.drift_tracker:
+            # Reads system.camera once camera_feed has opened it
+            self.drift_tracker.start()
         if self.platform!="win32":
             self.camera_feed()
         try:
@@ -234,9 +903,32 @@ class LaserDetectionSystem:
             self.logger.info("Exiting...")
             self.stop_event.set()
 
+        self.release_resources()
+
+    def release_resources(self):
+        if self.profiler.running:
+            self.profiler.stop()
+        if self.drift_tracker:
+            self.drift_tracker.stop()
         if self.serial_connection:
             self.serial_connection.close()
+            self.serial_connection = None
             self.logger.info("Closed serial connection.")
+        if self.hit_server:
+            self.hit_server.close()
+            self.hit_server = None
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+        if self.analytics:
+            self.analytics.close()
+            self.analytics = None
+        if self.tile_executor:
+            self.tile_executor.shutdown(wait=False)
+            self.tile_executor = None
+        if self.metrics_server:
+            self.metrics_server.close()
+            self.metrics_server = None
 
 def run_detection_app():
     projector_corners = [...]
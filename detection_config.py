@@ -0,0 +1,60 @@
+import os
+import json
+import logging
+
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger("DetectionConfig")
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "detection_config.json")
+
+# Config key -> LaserDetectionSystem attribute. Written by tuner.py for the venue's lighting.
+ATTRIBUTES = {
+    "lower_red": "lower_red",
+    "upper_red": "upper_red",
+    "lower_red2": "lower_red2",
+    "upper_red2": "upper_red2",
+    "min_spot_area": "MIN_SPOT_AREA",
+    "max_spot_area": "MAX_SPOT_AREA",
+    "max_gun_signal_age": "MAX_GUN_SIGNAL_AGE",
+    "detection_mode": "DETECTION_MODE",
+    "difference_threshold": "DIFFERENCE_THRESHOLD",
+}
+HSV_KEYS = ("lower_red", "upper_red", "lower_red2", "upper_red2")
+
+
+def load_detection_config(path=CONFIG_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read detection config from {path}: {e}")
+        return {}
+
+
+def save_detection_config(config, path=CONFIG_FILE):
+    with open(path, "w") as f:
+        json.dump(config, f, indent=2)
+    logger.info(f"Stored detection config in {path}")
+
+
+def read_detection_config(system):
+    config = {key: getattr(system, attribute) for key, attribute in ATTRIBUTES.items()}
+    for key in HSV_KEYS:
+        config[key] = [int(v) for v in config[key]]
+    return config
+
+
+def apply_detection_config(system, config):
+    """Sets the known keys of `config` on the system; "tuning" and other extra keys are ignored."""
+    for key, value in config.items():
+        attribute = ATTRIBUTES.get(key)
+        if attribute is None:
+            continue
+        if key in HSV_KEYS:
+            value = np.array(value)
+        setattr(system, attribute, value)
@@ -1,29 +1,77 @@
 import sys
-import cv2
-import numpy as np
-import serial.tools.list_ports
-import serial
+import time
+import threading
 import logging
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QLabel, QWidget,
     QVBoxLayout, QGraphicsScene, QGraphicsView, QGraphicsEllipseItem,
-    QGraphicsLineItem, QHBoxLayout, QSizePolicy, QComboBox, QMessageBox
+    QGraphicsLineItem, QHBoxLayout, QSizePolicy, QComboBox, QMessageBox, QCheckBox
 )
 from PyQt6.QtGui import QBrush, QColor, QPen, QPixmap, QImage
 from PyQt6.QtCore import Qt, pyqtSignal, QObject, QTimer, QSize
 from PyQt6.QtWidgets import QGraphicsPixmapItem
-from cv2_enumerate_cameras import enumerate_cameras
+from lazy_imports import lazy_import
 from detect import LaserDetectionSystem
+from camera_modes import CameraMode, load_mode
+from camera_session import get_session, release_session, release_all
+from analytics import HitAnalytics
+from dashboard import DashboardPanel
+
+# The window is shown before OpenCV and NumPy are loaded, see lazy_imports.py
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger("gui")
 
 CAMERA_WIDTH = 1920
 CAMERA_HEIGHT = 1080
+RECORDINGS_DIR = "recordings"
+METRICS_PORT = 9108  # http://127.0.0.1:9108/metrics while detection runs
+LATENCY_BUDGET_MS = 20  # per-frame processing budget before quality is traded for latency
+ANALYTICS_DB = "analytics.sqlite"  # python analytics.py --day YYYY-MM-DD renders the heatmaps
 
 class Communicator(QObject):
     coordinates_confirmed = pyqtSignal(list)
+    devices_enumerated = pyqtSignal(list, list)
+
+
+def list_cameras():
+    """[(label, index)] of the connected cameras. Slow (opens every device), keep it off the GUI thread."""
+    from cv2_enumerate_cameras import enumerate_cameras
+    backend = cv2.CAP_DSHOW if sys.platform == "win32" else cv2.CAP_ANY
+    return [(f"{camera_info.name} (Index: {camera_info.index})", camera_info.index)
+            for camera_info in enumerate_cameras(backend)]
+
+
+def list_com_ports():
+    """[(label, device)] of the serial ports."""
+    import serial.tools.list_ports
+    all_ports = serial.tools.list_ports.comports()
+    if sys.platform!= "win32":
+        ports=[port for port in all_ports if port.device.startswith("/dev/tty")]
+    else:
+        ports=all_ports
+    items = []
+    for port in ports:
+        display_text = port.description
+        # Check if the description already contains the device name in parentheses
+        if port.device not in display_text:  # Simple check: device name not in description
+            display_text = f"{port.description} ({port.device})"
+        elif display_text.endswith(f" ({port.device})"):  # More robust check: ends with "(COMx)"
+            # Description already ends with (COMx), use description as is
+            pass
+        else:  # Description contains device name, but not in the standard (COMx) format
+            # You might decide how you want to format this.
+            # For now, let's stick with the simpler display_text = port.description
+            display_text = port.description
+
+        # Fallback if description is empty or just whitespace
+        if not display_text.strip():
+            display_text = port.device
+        items.append((display_text, port.device))
+    return items
 
 class DraggablePoint(QGraphicsEllipseItem):
     def __init__(self, x, y, radius=8):
@@ -39,11 +87,14 @@ class DraggablePoint(QGraphicsEllipseItem):
 
 
 class CalibrationWindow(QWidget):
-    def __init__(self, communicator, camera_index):
+    def __init__(self, communicator, camera_session, initial_corners=None):
         super().__init__()
         self.setWindowTitle("Calibration")
         self.communicator = communicator
-        self.camera_index = camera_index
+        self.camera_session = camera_session
+        self.camera_index = camera_session.camera_index
+        # Recalibrating a running round starts from the corners in use (camera pixels)
+        self.initial_corners = initial_corners
 
         layout = QVBoxLayout(self)
 
@@ -76,9 +127,7 @@ class CalibrationWindow(QWidget):
 
         self.setLayout(layout)
 
-        self.cap = cv2.VideoCapture(self.camera_index)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+        self.last_frame_count = -1
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
         self.timer.start(30)
@@ -100,10 +149,15 @@ class CalibrationWindow(QWidget):
         error_msg.exec()
         self.close()  # Close the calibration window
     def update_frame(self):
-        ret, frame = self.cap.read()
-        if not ret:
+        if self.camera_session.failed:
+            self.timer.stop()
             self.show_camera_error()
             return
+        frame = self.camera_session.latest_frame()
+        # Device still opening, or no new frame since the last tick
+        if frame is None or self.camera_session.frame_count == self.last_frame_count:
+            return
+        self.last_frame_count = self.camera_session.frame_count
 
         if self.frame_size is None:
             self.frame_size = (frame.shape[1], frame.shape[0])
@@ -119,6 +173,12 @@ class CalibrationWindow(QWidget):
         )
         self.camera_item.setPixmap(pixmap)
         self.pixmap_size = (pixmap.width(), pixmap.height())
+        if self.initial_corners is not None:
+            scale_x = self.pixmap_size[0] / self.frame_size[0]
+            scale_y = self.pixmap_size[1] / self.frame_size[1]
+            for point, (x, y) in zip(self.points, self.initial_corners):
+                point.setPos(x * scale_x, y * scale_y)
+            self.initial_corners = None
 
         self.update_lines()
 
@@ -142,15 +202,13 @@ class CalibrationWindow(QWidget):
                 coords.append((cam_x, cam_y))
 
         self.projector_corners = coords
-        
-        self.cap.release()
+
         self.timer.stop()
         self.communicator.coordinates_confirmed.emit(coords)
         self.close()
 
     def closeEvent(self, event):
-        if self.cap.isOpened():
-            self.cap.release()
+        # The camera session stays open so detection can start without reopening the device
         self.timer.stop()
         event.accept()
 
@@ -175,6 +233,7 @@ class MainWindow(QMainWindow):
 
         self.communicator = Communicator()
         self.communicator.coordinates_confirmed.connect(self.update_coordinates)
+        self.communicator.devices_enumerated.connect(self.populate_devices)
 
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
@@ -191,6 +250,7 @@ class MainWindow(QMainWindow):
         self.camera_combo = RefreshableComboBox(self.populate_camera_dropdown)
         device_layout.addWidget(self.camera_combo)
         self.current_camera_index = 0
+        self.camera_mode = CameraMode(CAMERA_WIDTH, CAMERA_HEIGHT)
         self.camera_combo.currentIndexChanged.connect(self.update_camera_index)
 
         # Dropdown for COM port selection (using the custom combo box)
@@ -199,10 +259,27 @@ class MainWindow(QMainWindow):
         # Pass the populate method to the custom combo box
         self.selected_com_port = None
         self.com_port_combo = RefreshableComboBox(self.populate_com_port_dropdown)
-        self.populate_com_port_dropdown() # Populate initially
+        self.com_port_combo.addItem("Searching for COM ports...", None)
         device_layout.addWidget(self.com_port_combo)
         self.com_port_combo.currentIndexChanged.connect(self.update_com_port)
 
+        # Hit output: pyautogui mouse/keyboard injection or localhost UDP events (hit_server.py)
+        self.output_mode_label = QLabel("Hit Output:")
+        device_layout.addWidget(self.output_mode_label)
+        self.output_mode_combo = QComboBox()
+        self.output_mode_combo.addItem("Mouse / Keyboard", "input")
+        self.output_mode_combo.addItem("UDP Events", "udp")
+        self.output_mode_combo.addItem("Both", "both")
+        device_layout.addWidget(self.output_mode_combo)
+
+        # Trigger-gated processing idles the detector between shots
+        self.processing_mode_label = QLabel("Processing:")
+        device_layout.addWidget(self.processing_mode_label)
+        self.processing_mode_combo = QComboBox()
+        self.processing_mode_combo.addItem("Continuous tracking", "continuous")
+        self.processing_mode_combo.addItem("Trigger-gated", "gated")
+        device_layout.addWidget(self.processing_mode_combo)
+
         # Removed the manual Refresh button as it's now automatic
         # self.refresh_button = QPushButton("Refresh Devices")
         # self.refresh_button.clicked.connect(self.refresh_devices)
@@ -232,41 +309,121 @@ class MainWindow(QMainWindow):
         self.capture_button.setEnabled(False)
         self.main_layout.addWidget(self.capture_button)
 
+        self.record_checkbox = QCheckBox("Record session (black box)")
+        self.main_layout.addWidget(self.record_checkbox)
+
+        self.drift_checkbox = QCheckBox("Correct small calibration drift")
+        self.main_layout.addWidget(self.drift_checkbox)
+
         self.start_detection_button = QPushButton("Start Detection")
         self.start_detection_button.clicked.connect(self.start_detection)
         self.start_detection_button.setEnabled(False)
         self.main_layout.addWidget(self.start_detection_button)
 
+        self.stop_detection_button = QPushButton("Stop Detection")
+        self.stop_detection_button.clicked.connect(self.stop_detection)
+        self.stop_detection_button.setEnabled(False)
+        self.main_layout.addWidget(self.stop_detection_button)
+
+        # Sampling profiler of the running detection, writes flame graph input to profiles/
+        self.profile_button = QPushButton("Start Profiling")
+        self.profile_button.clicked.connect(self.toggle_profiling)
+        self.profile_button.setEnabled(False)
+        self.main_layout.addWidget(self.profile_button)
+
+        self.dashboard = DashboardPanel()
+        self.main_layout.addWidget(self.dashboard)
+        self.detection_system = None
+        self.detection_thread = None
+
         self.calibrated_coordinates = None
-        self.cap = None
-        self.populate_camera_dropdown() # Populate initially
+        self.camera_session = None
+        # Populate initially, in the background so the window shows up right away
+        self.camera_combo.addItem("Searching for cameras...", -1)
+        self.calibrate_button.setEnabled(False)
+        self.enumeration_started = time.perf_counter()
+        threading.Thread(target=self.enumerate_devices, name="device-enumeration", daemon=True).start()
+
+    def enumerate_devices(self):
+        cameras = list_cameras()
+        ports = list_com_ports()
+        # Queued signal: the combo boxes are filled on the GUI thread
+        self.communicator.devices_enumerated.emit(cameras, ports)
+
+    def populate_devices(self, cameras, ports):
+        logger.info(f"Device enumeration took {time.perf_counter() - self.enumeration_started:.2f} s")
+        self.populate_camera_dropdown(cameras)
+        self.populate_com_port_dropdown(ports)
 
     def start_detection(self):
+        recorder = None
+        if self.record_checkbox.isChecked():
+            # Only the calibrated screen area is stored, with some margin around it
+            x, y, w, h = cv2.boundingRect(np.array(self.calibrated_coordinates, dtype=np.int32))
+            margin = 40
+            x, y = max(0, x - margin), max(0, y - margin)
+            roi = (x, y, min(w + 2 * margin, self.camera_mode.width - x), min(h + 2 * margin, self.camera_mode.height - y))
+            from recorder import SessionRecorder
+            recorder = SessionRecorder(RECORDINGS_DIR, roi=roi)
 
         self.detection_system = LaserDetectionSystem(
             camera_index=self.current_camera_index,
             serial_port=self.selected_com_port,
             baudrate=115200,
             projector_corners=self.calibrated_coordinates,
-            camera_width=CAMERA_WIDTH,
-            camera_height=CAMERA_HEIGHT,
+            camera_width=self.camera_mode.width,
+            camera_height=self.camera_mode.height,
+            camera_mode=self.camera_mode,
+            camera_session=self.get_camera_session(),
+            output_mode=self.output_mode_combo.currentData(),
+            recorder=recorder,
+            processing_mode=self.processing_mode_combo.currentData(),
+            metrics_port=METRICS_PORT,
+            analytics=HitAnalytics(ANALYTICS_DB),
+            latency_budget_ms=LATENCY_BUDGET_MS,
+            track_drift=self.drift_checkbox.isChecked(),
+            # HighGUI windows only work off the main thread on Windows, elsewhere the dashboard has to do
+            show_preview=sys.platform == "win32",
         )
-        self.detection_system.run()
+        # Detection runs off the Qt thread so the window and dashboard stay live
+        self.detection_thread = threading.Thread(target=self.detection_system.run, name="detection", daemon=True)
+        self.detection_thread.start()
+        self.dashboard.attach(self.detection_system)
+        self.start_detection_button.setEnabled(False)
+        self.stop_detection_button.setEnabled(True)
+        self.profile_button.setEnabled(True)
+
+    def stop_detection(self):
+        if self.detection_system is not None:
+            self.detection_system.stop_event.set()
+            self.detection_thread.join(timeout=5)
+            self.detection_system = None
+        self.dashboard.detach()
+        self.stop_detection_button.setEnabled(False)
+        self.start_detection_button.setEnabled(True)
+        self.profile_button.setText("Start Profiling")
+        self.profile_button.setEnabled(False)
+
+    def toggle_profiling(self):
+        if self.detection_system is None:
+            return
+        path = self.detection_system.toggle_profiler()
+        if path:
+            self.status_label.setText(f"Profile written to {path}")
+        self.profile_button.setText("Stop Profiling" if self.detection_system.profiler.running else "Start Profiling")
 
-    def populate_camera_dropdown(self):
+    def populate_camera_dropdown(self, available_cameras=None):
         # Store current selection before clearing
         current_data = self.camera_combo.currentData()
+        if available_cameras is None:
+            available_cameras = list_cameras()
 
         self.camera_combo.blockSignals(True)
 
         self.camera_combo.clear()
-        if sys.platform== "win32":
-            available_cameras = list(enumerate_cameras(cv2.CAP_DSHOW))
-        else:
-            available_cameras = list(enumerate_cameras(cv2.CAP_ANY))
         if available_cameras:
-            for camera_info in available_cameras:
-                self.camera_combo.addItem(f"{camera_info.name} (Index: {camera_info.index})", camera_info.index)
+            for label, camera_index in available_cameras:
+                self.camera_combo.addItem(label, camera_index)
 
             # Try to restore previous selection
             index = self.camera_combo.findData(current_data)
@@ -296,6 +453,9 @@ class MainWindow(QMainWindow):
         self.current_camera_index = self.camera_combo.itemData(index)
         if self.current_camera_index is not None and self.current_camera_index != -1:
             logger.info(f"Selected camera index: {self.current_camera_index}")
+            # Use the mode stored by camera_modes.py, if the camera was probed
+            self.camera_mode = load_mode(self.current_camera_index) or CameraMode(CAMERA_WIDTH, CAMERA_HEIGHT)
+            logger.info(f"Camera mode: {self.camera_mode}")
         # Ensure calibrate button state is correct based on selection
         self.calibrate_button.setEnabled(self.current_camera_index is not None and self.current_camera_index != -1)
 
@@ -305,42 +465,28 @@ class MainWindow(QMainWindow):
         self.capture_button.setEnabled(False)
         self.image_view.clear()
 
-        # Release camera if it was open from a previous selection
-        if self.cap and self.cap.isOpened():
-            self.cap.release()
-            self.cap = None
+        # Release the device if a different camera was open from a previous selection
+        if self.camera_session and self.camera_session.camera_index != self.current_camera_index:
+            release_session(self.camera_session.camera_index)
+            self.camera_session = None
 
+    def get_camera_session(self):
+        # Reopens the device only if the camera selection or mode changed
+        self.camera_session = get_session(self.current_camera_index, self.camera_mode)
+        return self.camera_session
 
-    def populate_com_port_dropdown(self):
+
+    def populate_com_port_dropdown(self, ports=None):
         # Store current selection before clearing
         current_data = self.com_port_combo.currentData()
+        if ports is None:
+            ports = list_com_ports()
         self.com_port_combo.blockSignals(True)
 
         self.com_port_combo.clear()
-        all_ports = serial.tools.list_ports.comports()
-        if sys.platform!= "win32":
-            ports=[port for port in all_ports if port.device.startswith("/dev/tty")]
-        else:
-            ports=all_ports
         if ports:
-            for port in ports:
-                display_text = port.description
-                # Check if the description already contains the device name in parentheses
-                if port.device not in display_text:  # Simple check: device name not in description
-                    display_text = f"{port.description} ({port.device})"
-                elif display_text.endswith(f" ({port.device})"):  # More robust check: ends with "(COMx)"
-                    # Description already ends with (COMx), use description as is
-                    pass
-                else:  # Description contains device name, but not in the standard (COMx) format
-                    # You might decide how you want to format this.
-                    # For now, let's stick with the simpler display_text = port.description
-                    display_text = port.description
-
-                # Fallback if description is empty or just whitespace
-                if not display_text.strip():
-                    display_text = port.device
-
-                self.com_port_combo.addItem(display_text, port.device)
+            for display_text, device in ports:
+                self.com_port_combo.addItem(display_text, device)
             # Try to restore previous selection
             index = self.com_port_combo.findData(current_data)
             if index != -1:
@@ -368,11 +514,9 @@ class MainWindow(QMainWindow):
 
     def open_calibration_window(self):
         if self.current_camera_index is not None and self.current_camera_index != -1:
-            # Ensure camera is released before opening calibration window
-            if self.cap and self.cap.isOpened():
-                self.cap.release()
-                self.cap = None
-            self.calibration_window = CalibrationWindow(self.communicator, self.current_camera_index)
+            # Detection keeps running while the operator recalibrates, see update_coordinates
+            corners = self.detection_system.projector_corners.tolist() if self.detection_system else None
+            self.calibration_window = CalibrationWindow(self.communicator, self.get_camera_session(), corners)
             self.calibration_window.show()
         else:
             self.status_label.setText("No camera selected for calibration.")
@@ -387,6 +531,9 @@ class MainWindow(QMainWindow):
         # Only enable capture if coordinates are valid (not empty list etc.)
         self.capture_button.setEnabled(self.calibrated_coordinates is not None and len(self.calibrated_coordinates) == 4)
         logger.info(f"Saved coordinates for camera {self.current_camera_index}: {self.calibrated_coordinates}")
+        if self.detection_system is not None and len(coords) == 4:
+            # Swapped into the running round, no restart
+            self.detection_system.set_projector_corners(coords)
 
     def capture_and_transform(self):
         # Check if a camera is selected AND coordinates are calibrated
@@ -397,22 +544,21 @@ class MainWindow(QMainWindow):
             self.status_label.setText("Calibration not performed yet.")
             return
 
-        self.cap = cv2.VideoCapture(self.current_camera_index)
-        if not self.cap.isOpened():
+        session = self.get_camera_session()
+        if not session.wait_until_opened(timeout=5):
             self.status_label.setText(f"Error: Could not open camera with index {self.current_camera_index}.")
             # Disable capture button if camera fails to open
             self.capture_button.setEnabled(False)
             return
 
-        # Set properties only if the camera was successfully opened
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
-        ret, frame = self.cap.read()
-        self.cap.release()
+        subscription = session.subscribe(maxsize=1)
+        item = subscription.get(timeout=2)
+        session.unsubscribe(subscription)
 
-        if not ret:
+        if item is None:
             self.status_label.setText("Error: Could not capture frame.")
             return
+        frame, _ = item
 
         corner_coords = sorted(self.calibrated_coordinates, key=lambda x: (x[1], x[0]))
         top_left, top_right = sorted(corner_coords[:2], key=lambda x: x[0])
@@ -459,4 +605,7 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     main_window = MainWindow()
     main_window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    exit_code = app.exec()
+    main_window.stop_detection()
+    release_all()
+    sys.exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,63 @@
+import sys
+import json
+import socket
+import time
+import argparse
+
+from hit_server import DEFAULT_PORT, SUBSCRIPTION_TIMEOUT
+
+# Reference client for the hit event server. Game builds can copy this loop.
+
+
+def run_client(host="127.0.0.1", port=DEFAULT_PORT):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1.0)
+    server = (host, port)
+    last_subscribe = 0
+    latencies = []
+
+    print(f"Listening for hit events from udp://{host}:{port} (Ctrl+C to quit)")
+    try:
+        while True:
+            now = time.monotonic()
+            if now - last_subscribe > SUBSCRIPTION_TIMEOUT / 3:
+                sock.sendto(b"subscribe", server)
+                last_subscribe = now
+            try:
+                data, _ = sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            except ConnectionResetError:
+                # Server not running yet (Windows)
+                time.sleep(1)
+                continue
+
+            received = time.monotonic() * 1000
+            message = json.loads(data)
+            latency = received - message["sent_time"]
+            latencies.append(latency)
+            if message["type"] == "hits":
+                for hit in message["hits"]:
+                    print(f"gun {hit['gun']} hit ({hit['x']}, {hit['y']}) confidence {hit['confidence']:.2f}, "
+                          f"{received - hit['capture_time']:.1f} ms after capture, delivery {latency:.3f} ms")
+            else:
+                print(f"gun {message['gun']} button, delivery {latency:.3f} ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.sendto(b"unsubscribe", server)
+        sock.close()
+
+    if latencies:
+        latencies.sort()
+        print(f"{len(latencies)} messages, median delivery {latencies[len(latencies) // 2]:.3f} ms, "
+              f"max {latencies[-1]:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print hit events published by the detector.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    run_client(args.host, args.port)
+    sys.exit(0)
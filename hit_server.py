@@ -0,0 +1,87 @@
+import json
+import socket
+import time
+import threading
+import logging
+
+logger = logging.getLogger("HitServer")
+
+DEFAULT_PORT = 9999
+SUBSCRIPTION_TIMEOUT = 10  # s, clients re-send "subscribe" as a keepalive
+
+
+class HitEventServer:
+    """
+    Publishes hit events to local game builds over UDP instead of moving the
+    operator's mouse. A client sends b"subscribe" to the server port (and again
+    every few seconds as a keepalive) and receives one JSON datagram per frame:
+
+        {"type": "hits", "frame_time": 1234.5, "sent_time": 1240.1,
+         "hits": [{"gun": "a", "surface": "screen", "x": 812, "y": 400, "capture_time": 1234.5,
+                   "trigger_time": 1201.7, "confidence": 0.9}]}
+
+    Button events without a hit are sent as {"type": "button", "gun": "b", "button": "1", ...},
+    "button" being the sender's button digit or null for receivers that do not forward it.
+    All times are time.monotonic() milliseconds, which is a system-wide clock,
+    so a client on the same host can compute the delivery latency directly.
+
+    Hits are published from the camera thread and buttons from the serial
+    thread, so the subscriber table is only touched under `lock`.
+    """
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(self.address)
+        self.socket.setblocking(False)
+        self.subscribers = {}  # address -> last keepalive (monotonic s)
+        self.lock = threading.Lock()
+        self.sent = 0
+        logger.info(f"Hit event server listening on udp://{host}:{port}")
+
+    def poll_subscriptions(self):
+        while True:
+            try:
+                data, address = self.socket.recvfrom(256)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                # Windows reports ICMP port unreachable from an earlier sendto here
+                continue
+            command = data.strip().lower()
+            if command == b"subscribe":
+                if address not in self.subscribers:
+                    logger.info(f"Hit client subscribed: {address}")
+                self.subscribers[address] = time.monotonic()
+            elif command == b"unsubscribe":
+                self.subscribers.pop(address, None)
+                logger.info(f"Hit client unsubscribed: {address}")
+
+        now = time.monotonic()
+        for address, last_seen in list(self.subscribers.items()):
+            if now - last_seen > SUBSCRIPTION_TIMEOUT:
+                logger.info(f"Hit client timed out: {address}")
+                self.subscribers.pop(address, None)
+
+    def send(self, message):
+        with self.lock:
+            self.poll_subscriptions()
+            if not self.subscribers:
+                return
+            message["sent_time"] = time.monotonic() * 1000
+            payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+            for address in list(self.subscribers):
+                try:
+                    self.socket.sendto(payload, address)
+                    self.sent += 1
+                except OSError as e:
+                    logger.warning(f"Dropping hit client {address}: {e}")
+                    self.subscribers.pop(address, None)
+
+    def publish_hits(self, frame_time_ms, hits):
+        self.send({"type": "hits", "frame_time": frame_time_ms, "hits": hits})
+
+    def publish_button(self, gun, timestamp_ms, button=None):
+        self.send({"type": "button", "gun": gun, "button": button, "trigger_time": timestamp_ms})
+
+    def close(self):
+        self.socket.close()
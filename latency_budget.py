@@ -0,0 +1,135 @@
+import time
+import logging
+import collections
+
+logger = logging.getLogger("LatencyBudget")
+
+# Degradation ladder, cheapest loss first. Each step sets one knob; stepping
+# back restores the previous value. Preview, recording and analytics are shed
+# before anything that changes what the detector sees, and gun signals are
+# never skipped (see LaserDetectionSystem.should_analyse).
+LADDER = [
+    ("preview_interval", 0.1),
+    ("preview_interval", 0.25),
+    ("preview_interval", None),
+    ("recording_quality", 60),
+    ("recording_quality", 40),
+    ("recording", False),
+    ("analytics", False),
+    ("roi_margin", 20),
+    ("roi_margin", 8),
+    ("downscale", 0.75),
+    ("downscale", 0.5),
+    ("frame_skip", 1),
+    ("frame_skip", 2),
+]
+
+
+class LatencyBudgetController:
+    """
+    Keeps the per-frame processing time of a LaserDetectionSystem within a budget.
+
+    The detection loop calls observe() with the time it spent on each frame.
+    Every check_interval seconds the p90 of the recent observations is
+    compared to the budget: above it the next LADDER step is applied, below
+    recover_ratio * budget for recover_checks checks in a row the last step is
+    undone. Every change is logged with its cause and kept in `adjustments`.
+    """
+    def __init__(self, system, budget_ms=20.0, window=60, check_interval=1.0, recover_ratio=0.6,
+                 recover_checks=5):
+        self.system = system
+        self.budget_ms = budget_ms
+        self.check_interval = check_interval
+        self.recover_ratio = recover_ratio
+        self.recover_checks = recover_checks
+        self.samples = collections.deque(maxlen=window)
+        self.last_check = time.monotonic()
+        self.calm_checks = 0
+        self.level = 0
+        self.adjustments = collections.deque(maxlen=100)  # (monotonic s, knob, old, new, cause)
+
+        self.defaults = self.read_settings()
+        # Steps for work this system does not do would only delay the useful ones
+        self.ladder = [(knob, value) for knob, value in LADDER if self.applicable(knob)]
+
+    def applicable(self, knob):
+        system = self.system
+        if knob == "preview_interval":
+            return system.show_preview
+        if knob in ("recording_quality", "recording"):
+            return system.recorder is not None
+        if knob == "analytics":
+            return system.analytics is not None
+        if knob == "roi_margin":
+            return len(system.projector_corners) == 4
+        return True
+
+    def read_settings(self):
+        system = self.system
+        return {
+            "preview_interval": system.PREVIEW_INTERVAL,
+            "recording_quality": system.recorder.jpeg_quality if system.recorder else None,
+            "recording": system.record_frames,
+            "analytics": system.record_analytics,
+            "roi_margin": system.DETECTION_ROI_MARGIN,
+            "downscale": system.DETECTION_SCALE,
+            "frame_skip": system.ANALYSIS_FRAME_SKIP,
+        }
+
+    def apply_settings(self, settings):
+        system = self.system
+        system.PREVIEW_INTERVAL = settings["preview_interval"]
+        if system.recorder and settings["recording_quality"] is not None:
+            system.recorder.set_quality(settings["recording_quality"])
+        system.record_frames = settings["recording"]
+        system.record_analytics = settings["analytics"]
+        system.DETECTION_ROI_MARGIN = settings["roi_margin"]
+        system.DETECTION_SCALE = settings["downscale"]
+        system.ANALYSIS_FRAME_SKIP = settings["frame_skip"]
+
+    def settings_for_level(self, level):
+        settings = dict(self.defaults)
+        for knob, value in self.ladder[:level]:
+            settings[knob] = value
+        return settings
+
+    def observe(self, frame_ms):
+        self.samples.append(frame_ms)
+        now = time.monotonic()
+        if now - self.last_check >= self.check_interval:
+            self.last_check = now
+            self.check(now)
+
+    def check(self, now):
+        if len(self.samples) < 5:
+            return
+        ordered = sorted(self.samples)
+        p90 = ordered[int(0.9 * (len(ordered) - 1))]
+        if p90 > self.budget_ms:
+            self.calm_checks = 0
+            if self.level < len(self.ladder):
+                self.set_level(self.level + 1, f"p90 frame time {p90:.1f} ms > budget {self.budget_ms:.0f} ms", now)
+        elif p90 < self.budget_ms * self.recover_ratio and self.level > 0:
+            self.calm_checks += 1
+            if self.calm_checks >= self.recover_checks:
+                self.calm_checks = 0
+                self.set_level(self.level - 1, f"p90 frame time {p90:.1f} ms well under budget", now)
+        else:
+            self.calm_checks = 0
+
+    def set_level(self, level, cause, now):
+        old = self.settings_for_level(self.level)
+        new = self.settings_for_level(level)
+        self.apply_settings(new)
+        self.level = level
+        # Samples taken at the old settings would trigger the next step right away
+        self.samples.clear()
+        for knob in new:
+            if new[knob] != old[knob]:
+                self.adjustments.append((now, knob, old[knob], new[knob], cause))
+                logger.warning(f"Latency budget: {knob} {old[knob]} -> {new[knob]} ({cause}), level {level}/{len(self.ladder)}")
+
+    def reset(self):
+        self.apply_settings(self.defaults)
+        self.level = 0
+        self.samples.clear()
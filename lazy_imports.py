@@ -0,0 +1,22 @@
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    After the import the real module's namespace is copied into the stand-in,
+    so later lookups are plain attribute reads. importlib serialises
+    concurrent imports, which makes the first access safe from any thread
+    (the GUI can touch cv2 first on a camera thread).
+    """
+    def __getattr__(self, item):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, item)
+
+
+def lazy_import(name):
+    """`cv2 = lazy_import("cv2")` instead of `import cv2`; free until cv2 is used."""
+    return LazyModule(name)
@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import logging
+import argparse
+
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+logger = logging.getLogger("LensCalibration")
+
+CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lens_calibration.json")
+
+CHECKERBOARD = (9, 6)  # inner corners
+PROJECTED_PATTERN = (15, 8)
+MIN_CHECKERBOARD_VIEWS = 10
+SUBPIX_CRITERIA = (3, 30, 0.001)  # cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER
+
+# A projected pattern is a single planar view from a fixed camera, which cannot
+# separate the focal length from the screen distance. Neither matters here:
+# the screen is mapped by a homography, and radial distortion around a fixed
+# principal point is the same pixel-space correction for any focal length (k1
+# and k2 just rescale). So only k1 and k2 are fitted, against a free homography.
+PROJECTED_ITERATIONS = 30
+
+
+class LensCalibration:
+    """
+    Camera intrinsics and distortion coefficients for one capture resolution.
+
+    Only points are undistorted (cv2.undistortPoints with P = camera matrix),
+    so corrected coordinates stay in camera pixels and no frame is remapped.
+    """
+    def __init__(self, camera_matrix, dist_coeffs, image_size, rms=None):
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64).reshape(3, 3)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).ravel()
+        self.image_size = (int(image_size[0]), int(image_size[1]))
+        self.rms = rms
+
+    def __repr__(self):
+        fx, fy = self.camera_matrix[0, 0], self.camera_matrix[1, 1]
+        k = ", ".join(f"{c:.4f}" for c in self.dist_coeffs[:3])
+        rms = f", rms {self.rms:.3f} px" if self.rms is not None else ""
+        return f"{self.image_size[0]}x{self.image_size[1]} f=({fx:.1f}, {fy:.1f}) k=({k}){rms}"
+
+    def scaled(self, width, height):
+        """Same lens at another capture resolution of the same aspect ratio."""
+        if (width, height) == self.image_size:
+            return self
+        sx, sy = width / self.image_size[0], height / self.image_size[1]
+        camera_matrix = self.camera_matrix.copy()
+        camera_matrix[0] *= sx
+        camera_matrix[1] *= sy
+        return LensCalibration(camera_matrix, self.dist_coeffs, (width, height), self.rms)
+
+    def undistort_points(self, points):
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+        if len(points) == 0:
+            return points.reshape(-1, 2)
+        undistorted = cv2.undistortPoints(points, self.camera_matrix, self.dist_coeffs, P=self.camera_matrix)
+        return undistorted.reshape(-1, 2)
+
+    def to_dict(self):
+        return {
+            "camera_matrix": self.camera_matrix.tolist(),
+            "dist_coeffs": self.dist_coeffs.tolist(),
+            "image_size": list(self.image_size),
+            "rms": self.rms,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def find_checkerboard(image, pattern=CHECKERBOARD):
+    """Sub-pixel inner corners of a checkerboard in a BGR or gray image, or None."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    found, corners = cv2.findChessboardCorners(
+        gray, pattern, cv2.CALIB_CB_ADAPTIVE_THRESH | cv2.CALIB_CB_NORMALIZE_IMAGE)
+    if not found:
+        return None
+    return cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), SUBPIX_CRITERIA)
+
+
+def checkerboard_object_points(pattern=CHECKERBOARD, square_size=1.0):
+    points = np.zeros((pattern[0] * pattern[1], 3), np.float32)
+    points[:, :2] = np.mgrid[0:pattern[0], 0:pattern[1]].T.reshape(-1, 2) * square_size
+    return points
+
+
+def calibrate_checkerboard(images, pattern=CHECKERBOARD, square_size=1.0):
+    """
+    Full calibration from several views of a printed checkerboard held at
+    different angles and positions. Returns None with too few usable views.
+    """
+    object_points, image_points, image_size = [], [], None
+    template = checkerboard_object_points(pattern, square_size)
+    for image in images:
+        corners = find_checkerboard(image, pattern)
+        if corners is None:
+            continue
+        image_size = (image.shape[1], image.shape[0])
+        object_points.append(template)
+        image_points.append(corners)
+
+    if len(image_points) < MIN_CHECKERBOARD_VIEWS:
+        logger.error(f"Checkerboard found in {len(image_points)} views, at least {MIN_CHECKERBOARD_VIEWS} needed.")
+        return None
+    rms, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(
+        object_points, image_points, image_size, None, None)
+    return LensCalibration(camera_matrix, dist_coeffs, image_size, rms)
+
+
+def render_projector_pattern(width=1920, height=1080, pattern=PROJECTED_PATTERN, margin=0.04):
+    """
+    Full-screen checkerboard image for the projector and the projector-pixel
+    positions of its inner corners, in findChessboardCorners order. Cells are
+    stretched to the screen so the corners reach close to its edges, where
+    the distortion is largest.
+    """
+    columns, rows = pattern[0] + 1, pattern[1] + 1
+    cell_width = width * (1 - 2 * margin) / columns
+    cell_height = height * (1 - 2 * margin) / rows
+    left, top = width * margin, height * margin
+    image = np.full((height, width), 255, np.uint8)
+    for row in range(rows):
+        for column in range(columns):
+            if (row + column) % 2 == 0:
+                x0, y0 = int(round(left + column * cell_width)), int(round(top + row * cell_height))
+                x1, y1 = int(round(left + (column + 1) * cell_width)), int(round(top + (row + 1) * cell_height))
+                image[y0:y1, x0:x1] = 0
+    grid = np.mgrid[1:columns, 1:rows].T.reshape(-1, 2).astype(np.float32)
+    corners = np.column_stack([left + grid[:, 0] * cell_width, top + grid[:, 1] * cell_height]).astype(np.float32)
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR), corners
+
+
+def homography_residuals(calibration, image_points, plane_points):
+    undistorted = calibration.undistort_points(image_points)
+    homography, _ = cv2.findHomography(plane_points, undistorted, 0)
+    if homography is None:
+        return np.full(2 * len(plane_points), 1e6)
+    fitted = cv2.perspectiveTransform(plane_points.reshape(-1, 1, 2), homography).reshape(-1, 2)
+    return (fitted - undistorted).ravel()
+
+
+def fit_radial_distortion(image_points, plane_points, image_size):
+    """
+    k1, k2 that make a planar pattern's image points agree with a homography
+    of its plane points (Levenberg-Marquardt over the two coefficients).
+    """
+    width, height = image_size
+    focal = float(max(width, height))
+    camera_matrix = np.array([[focal, 0, width / 2], [0, focal, height / 2], [0, 0, 1]], dtype=np.float64)
+    image_points = np.asarray(image_points, dtype=np.float32).reshape(-1, 2)
+    plane_points = np.asarray(plane_points, dtype=np.float32).reshape(-1, 2)
+
+    def residuals(k):
+        return homography_residuals(LensCalibration(camera_matrix, [k[0], k[1], 0, 0, 0], image_size),
+                                    image_points, plane_points)
+
+    k = np.zeros(2)
+    error = residuals(k)
+    damping = 1e-3
+    for _ in range(PROJECTED_ITERATIONS):
+        jacobian = np.empty((len(error), 2))
+        for i, step in enumerate((1e-4, 1e-4)):
+            shifted = k.copy()
+            shifted[i] += step
+            jacobian[:, i] = (residuals(shifted) - error) / step
+        normal = jacobian.T @ jacobian
+        gradient = jacobian.T @ error
+        candidate = k - np.linalg.solve(normal + damping * np.diag(np.diag(normal) + 1e-12), gradient)
+        candidate_error = residuals(candidate)
+        if candidate_error @ candidate_error < error @ error:
+            converged = np.abs(candidate - k).max() < 1e-7
+            k, error = candidate, candidate_error
+            damping /= 10
+            if converged:
+                break
+        else:
+            damping *= 10
+    rms = float(np.sqrt(np.mean(error.reshape(-1, 2) ** 2) * 2))
+    return LensCalibration(camera_matrix, [k[0], k[1], 0, 0, 0], image_size, rms)
+
+
+def calibrate_projected(image, projector_corners, pattern=PROJECTED_PATTERN):
+    """
+    Calibration from one camera image of the projected pattern. The screen is
+    the calibration plane and projector pixels are its coordinates, so no
+    printed board is needed; only k1 and k2 are estimated.
+    """
+    corners = find_checkerboard(image, pattern)
+    if corners is None:
+        logger.error("Projected pattern not found in the camera image.")
+        return None
+    height, width = image.shape[:2]
+    return fit_radial_distortion(corners, projector_corners, (width, height))
+
+
+def load_calibration_file(path=CALIBRATION_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read lens calibration from {path}: {e}")
+        return {}
+
+
+def load_calibration(camera_index, width=None, height=None, path=CALIBRATION_FILE):
+    data = load_calibration_file(path).get(str(camera_index))
+    if not data:
+        return None
+    calibration = LensCalibration.from_dict(data)
+    if width and height:
+        calibration = calibration.scaled(width, height)
+    return calibration
+
+
+def save_calibration(camera_index, calibration, path=CALIBRATION_FILE):
+    data = load_calibration_file(path)
+    data[str(camera_index)] = calibration.to_dict()
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+    logger.info(f"Stored lens calibration {calibration} for camera {camera_index} in {path}")
+
+
+def capture_checkerboard_views(session, pattern, views, interval=1.0):
+    # Keeps one frame per `interval` seconds in which the board is visible; move the board between them
+    images, last = [], 0
+    subscription = session.subscribe(maxsize=1)
+    try:
+        while len(images) < views:
+            item = subscription.get(timeout=2)
+            if item is None:
+                break
+            frame, frame_time = item
+            if frame_time - last < interval or find_checkerboard(frame, pattern) is None:
+                continue
+            images.append(frame)
+            last = frame_time
+            logger.info(f"Checkerboard view {len(images)}/{views}")
+    finally:
+        session.unsubscribe(subscription)
+    return images
+
+
+def capture_projected_view(session, pattern, screen_size):
+    image, projector_corners = render_projector_pattern(*screen_size, pattern=pattern)
+    cv2.namedWindow("Lens calibration", cv2.WND_PROP_FULLSCREEN)
+    cv2.setWindowProperty("Lens calibration", cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    cv2.imshow("Lens calibration", image)
+    # Give the projector and the camera exposure time to settle
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline:
+        cv2.waitKey(50)
+    frame = session.latest_frame()
+    cv2.destroyWindow("Lens calibration")
+    return frame, projector_corners
+
+
+if __name__ == "__main__":
+    from camera_modes import load_mode, CameraMode, default_backend
+    from camera_session import get_session, release_all
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Estimate lens distortion for a camera and store it.")
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--pattern", default=None,
+                        help=f"inner corners, default {CHECKERBOARD[0]}x{CHECKERBOARD[1]} printed, "
+                             f"{PROJECTED_PATTERN[0]}x{PROJECTED_PATTERN[1]} projected")
+    parser.add_argument("--projected", action="store_true",
+                        help="project the pattern full screen instead of using a printed checkerboard")
+    parser.add_argument("--views", type=int, default=15, help="printed checkerboard views to capture")
+    parser.add_argument("--screen", default="1920x1080", help="projector resolution for --projected")
+    args = parser.parse_args()
+
+    if args.pattern:
+        pattern = tuple(int(v) for v in args.pattern.split("x"))
+    else:
+        pattern = PROJECTED_PATTERN if args.projected else CHECKERBOARD
+    mode = load_mode(args.camera) or CameraMode(1920, 1080)
+    session = get_session(args.camera, mode, default_backend())
+    try:
+        if not session.wait_until_opened(timeout=10):
+            raise SystemExit("Could not open camera.")
+        if args.projected:
+            frame, projector_corners = capture_projected_view(
+                session, pattern, tuple(int(v) for v in args.screen.split("x")))
+            calibration = calibrate_projected(frame, projector_corners, pattern) if frame is not None else None
+        else:
+            calibration = calibrate_checkerboard(capture_checkerboard_views(session, pattern, args.views), pattern)
+    finally:
+        release_all()
+
+    if calibration is None:
+        raise SystemExit(1)
+    print(calibration)
+    save_calibration(args.camera, calibration)
@@ -0,0 +1,196 @@
+import time
+import threading
+import collections
+import logging
+
+logger = logging.getLogger("Metrics")
+
+# Hot path updates are plain attribute increments and deque appends. Each
+# metric is only written by one thread (camera or serial), so no locks are
+# needed; the scraper reads whatever value is current.
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class GaugeFunction:
+    """Gauge evaluated at scrape time, costs nothing on the hot path."""
+    __slots__ = ("function",)
+
+    def __init__(self, function):
+        self.function = function
+
+    @property
+    def value(self):
+        try:
+            return self.function()
+        except Exception:
+            return float("nan")
+
+
+class RateMeter:
+    """Events per second over the interval between two scrapes."""
+    __slots__ = ("count", "last_count", "last_time", "rate")
+
+    def __init__(self):
+        self.count = 0
+        self.last_count = 0
+        self.last_time = time.monotonic()
+        self.rate = 0.0
+
+    def tick(self):
+        self.count += 1
+
+    @property
+    def value(self):
+        now = time.monotonic()
+        elapsed = now - self.last_time
+        if elapsed >= 0.5:
+            count = self.count
+            self.rate = (count - self.last_count) / elapsed
+            self.last_count = count
+            self.last_time = now
+        return self.rate
+
+
+class Summary:
+    """Count, sum and quantiles over the most recent observations."""
+    __slots__ = ("count", "sum", "recent")
+
+    def __init__(self, window=1024):
+        self.count = 0
+        self.sum = 0.0
+        self.recent = collections.deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def quantiles(self, qs=(0.5, 0.9, 0.99)):
+        values = sorted(self.recent)
+        if not values:
+            return {q: float("nan") for q in qs}
+        return {q: values[min(len(values) - 1, int(q * len(values)))] for q in qs}
+
+
+class MetricFamily:
+    def __init__(self, name, kind, help_text, factory, label_names=()):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.factory = factory
+        self.label_names = label_names
+        self.children = {}
+        if not label_names:
+            self.children[()] = factory()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            # setdefault keeps the first child if two threads race on a new label
+            child = self.children.setdefault(values, self.factory())
+        return child
+
+    def __getattr__(self, item):
+        # Unlabelled families forward inc/set/observe/tick to their single child
+        return getattr(self.children[()], item)
+
+    def render(self):
+        exposed = "summary" if self.kind == "summary" else ("counter" if self.kind == "counter" else "gauge")
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {exposed}"]
+        for values, child in list(self.children.items()):
+            labels = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, values))
+            if self.kind == "summary":
+                for q, v in child.quantiles().items():
+                    q_labels = ",".join(filter(None, [labels, f'quantile="{q}"']))
+                    lines.append(f"{self.name}{{{q_labels}}} {v}")
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{self.name}_sum{suffix} {child.sum}")
+                lines.append(f"{self.name}_count{suffix} {child.count}")
+            else:
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{self.name}{suffix} {child.value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, prefix="laser_"):
+        self.prefix = prefix
+        self.families = []
+
+    def _add(self, name, kind, help_text, factory, labels):
+        family = MetricFamily(self.prefix + name, kind, help_text, factory, tuple(labels))
+        self.families.append(family)
+        return family
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(name, "counter", help_text, Counter, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(name, "gauge", help_text, Gauge, labels)
+
+    def gauge_function(self, name, help_text, function):
+        return self._add(name, "gauge", help_text, lambda: GaugeFunction(function), ())
+
+    def rate(self, name, help_text, labels=()):
+        return self._add(name, "rate", help_text, RateMeter, labels)
+
+    def summary(self, name, help_text, labels=()):
+        return self._add(name, "summary", help_text, Summary, labels)
+
+    def render(self):
+        lines = []
+        for family in self.families:
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves the registry at http://127.0.0.1:<port>/metrics from a daemon thread."""
+    def __init__(self, registry, port=9108, host="127.0.0.1"):
+        # http.server costs ~30 ms of startup, only pay it when metrics are served
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] not in ("/metrics", "/"):
+                    handler.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+        self.thread.start()
+        logger.info(f"Metrics available at http://{host}:{port}/metrics")
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
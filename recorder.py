@@ -0,0 +1,316 @@
+import os
+import glob
+import json
+import time
+import queue
+import argparse
+import threading
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("Recorder")
+
+KIND_FRAME = 0
+KIND_SERIAL = 1
+KIND_DETECTION = 2
+KIND_META = 3
+
+# One fixed-size index record per stored item, so an index file can be opened
+# with np.memmap and searched by timestamp without reading the data file.
+INDEX_DTYPE = np.dtype([
+    ("timestamp", "<f8"),  # time.monotonic() ms
+    ("kind", "u1"),
+    ("offset", "<u8"),
+    ("length", "<u4"),
+])
+
+
+class SessionRecorder:
+    """
+    Black-box recorder for frames, serial lines and detection results.
+
+    Items are written by a separate thread into segment files
+    (segment_<n>.data + segment_<n>.idx). A segment is closed after
+    segment_seconds of recording time or segment_bytes of data, whether or
+    not frames are recorded, and only the newest max_segments are kept. The
+    record_* methods never block: when the queue is full, frames are
+    dropped and counted, and events are only dropped if even the reserved
+    headroom is used up.
+    """
+    def __init__(self, directory, segment_seconds=60, max_segments=30, queue_size=64,
+                 jpeg_quality=80, roi=None, segment_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.jpeg_quality = jpeg_quality
+        self.roi = roi  # (x, y, w, h) crop in camera pixels, None for full frames
+        # Extra JSON stored with every new segment, e.g. the calibrated corners set by detect.py
+        self.metadata = {}
+        os.makedirs(directory, exist_ok=True)
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.frame_queue_limit = queue_size // 2  # keep the other half for serial/detection events
+        self.dropped_frames = 0
+        self.dropped_events = 0
+        self.recorded_frames = 0
+
+        existing = list_segments(directory)
+        self.segment_number = segment_number(existing[-1]) + 1 if existing else 0
+        self.data_file = None
+        self.index_file = None
+        self.segment_started = None
+        self.segment_has_shape = False
+        self.frame_shape = None  # full camera frame shape, stored so ROI crops can be placed back
+        self.last_flush = 0
+
+        self.thread = threading.Thread(target=self._writer, name="recorder", daemon=True)
+        self.thread.start()
+
+    def set_quality(self, jpeg_quality):
+        self.jpeg_quality = jpeg_quality
+
+    def record_frame(self, frame, timestamp):
+        if self.queue.qsize() >= self.frame_queue_limit:
+            self.dropped_frames += 1
+            return
+        self.frame_shape = frame.shape
+        if self.roi is not None:
+            x, y, w, h = self.roi
+            frame = frame[y:y + h, x:x + w]
+        try:
+            self.queue.put_nowait((KIND_FRAME, timestamp, frame))
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def record_serial(self, line, timestamp, receiver_id=0):
+        self._put_event(KIND_SERIAL, timestamp, {"receiver": receiver_id, "line": line})
+
+    def record_detection(self, detection, timestamp):
+        self._put_event(KIND_DETECTION, timestamp, detection)
+
+    def _put_event(self, kind, timestamp, payload):
+        try:
+            self.queue.put_nowait((kind, timestamp, payload))
+        except queue.Full:
+            self.dropped_events += 1
+
+    def _open_segment(self, timestamp, frame_shape=None):
+        self._close_segment()
+        base = os.path.join(self.directory, f"segment_{self.segment_number:06d}")
+        self.segment_number += 1
+        self.data_file = open(base + ".data", "wb")
+        self.index_file = open(base + ".idx", "wb")
+        self.segment_started = timestamp
+        self.segment_has_shape = frame_shape is not None
+        self._write(KIND_META, timestamp, json.dumps(dict(
+            self.metadata,
+            roi=self.roi,
+            frame_shape=frame_shape,
+        )).encode("utf-8"))
+
+        segments = list_segments(self.directory)
+        for old in segments[:-self.max_segments]:
+            for path in (old + ".data", old + ".idx"):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Could not remove old segment {path}: {e}")
+
+    def _close_segment(self):
+        if self.data_file:
+            self.data_file.close()
+            self.index_file.close()
+            self.data_file = None
+            self.index_file = None
+
+    def _segment_full(self, timestamp):
+        return (timestamp - self.segment_started > self.segment_seconds * 1000
+                or self.data_file.tell() >= self.segment_bytes)
+
+    def _write(self, kind, timestamp, payload):
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        record["timestamp"] = timestamp
+        record["kind"] = kind
+        record["offset"] = self.data_file.tell()
+        record["length"] = len(payload)
+        self.data_file.write(payload)
+        self.index_file.write(record.tobytes())
+
+    def _writer(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            kind, timestamp, payload = item
+            try:
+                if kind == KIND_FRAME:
+                    ok, encoded = cv2.imencode(".jpg", payload, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                    if not ok:
+                        continue
+                    if self.data_file is None or not self.segment_has_shape or self._segment_full(timestamp):
+                        self._open_segment(timestamp, list(self.frame_shape))
+                    self._write(kind, timestamp, encoded.tobytes())
+                    self.recorded_frames += 1
+                else:
+                    # Without frames (record_frames off) events alone have to rotate the segments
+                    if self.data_file is None:
+                        self._open_segment(timestamp)
+                    elif self._segment_full(timestamp):
+                        self._open_segment(timestamp, list(self.frame_shape) if self.segment_has_shape else None)
+                    self._write(kind, timestamp, json.dumps(payload, default=str).encode("utf-8"))
+
+                now = time.monotonic()
+                if now - self.last_flush > 1:
+                    self.data_file.flush()
+                    self.index_file.flush()
+                    self.last_flush = now
+            except OSError as e:
+                logger.error(f"Recorder write failed: {e}")
+        self._close_segment()
+
+    def close(self):
+        # Blocking put is fine here, close() is not called from the detection loop
+        self.queue.put(None)
+        self.thread.join(timeout=10)
+        if self.dropped_frames or self.dropped_events:
+            logger.warning(f"Recorder dropped {self.dropped_frames} frames and {self.dropped_events} events.")
+
+
+def segment_number(base):
+    return int(os.path.basename(base).split("_")[1])
+
+
+def list_segments(directory):
+    return sorted(path[:-len(".idx")] for path in glob.glob(os.path.join(directory, "segment_*.idx")))
+
+
+def serial_line(payload):
+    """(receiver_id, line) of a serial record; recordings from before several receivers stored the bare line."""
+    if isinstance(payload, str):
+        return 0, payload
+    return payload["receiver"], payload["line"]
+
+
+def load_index(base):
+    size = os.path.getsize(base + ".idx")
+    count = size // INDEX_DTYPE.itemsize  # ignore a partially written last record
+    if count == 0:
+        return np.zeros(0, dtype=INDEX_DTYPE)
+    return np.memmap(base + ".idx", dtype=INDEX_DTYPE, mode="r", shape=(count,))
+
+
+class SessionReader:
+    """Reads recorded segments back in timestamp order."""
+    def __init__(self, directory):
+        self.directory = directory
+        self.segments = list_segments(directory)
+
+    def metadata(self):
+        """META record of the newest segment that has one (roi, frame_shape and SessionRecorder.metadata)."""
+        for base in reversed(self.segments):
+            index = load_index(base)
+            meta = index[index["kind"] == KIND_META]
+            if len(meta):
+                with open(base + ".data", "rb") as data_file:
+                    data_file.seek(int(meta["offset"][-1]))
+                    return json.loads(data_file.read(int(meta["length"][-1])))
+        return {}
+
+    def records(self, start=None, end=None, kinds=None, decode=True):
+        """
+        Yields (kind, timestamp, payload); frames are decoded to BGR images in full camera
+        coordinates, or with decode=False passed on as (JPEG buffer, meta) for decode_frame().
+        """
+        for base in self.segments:
+            index = load_index(base)
+            if len(index) == 0:
+                continue
+            if end is not None and index["timestamp"].min() > end:
+                continue
+            if start is not None and index["timestamp"].max() < start:
+                continue
+
+            # Serial and frame items are queued from different threads, order them by time
+            order = np.argsort(index["timestamp"], kind="stable")
+            meta = {}
+            with open(base + ".data", "rb") as data_file:
+                data = np.memmap(data_file, dtype=np.uint8, mode="r")
+                for i in order:
+                    kind = int(index["kind"][i])
+                    timestamp = float(index["timestamp"][i])
+                    offset = int(index["offset"][i])
+                    raw = data[offset:offset + int(index["length"][i])]
+                    if kind == KIND_META:
+                        meta = json.loads(raw.tobytes())
+                        continue
+                    if (start is not None and timestamp < start) or (end is not None and timestamp > end):
+                        continue
+                    if kinds is not None and kind not in kinds:
+                        continue
+                    if kind == KIND_FRAME:
+                        yield kind, timestamp, self.decode_frame(raw, meta) if decode else (np.array(raw), meta)
+                    else:
+                        yield kind, timestamp, json.loads(raw.tobytes())
+
+    @staticmethod
+    def decode_frame(raw, meta):
+        image = cv2.imdecode(np.asarray(raw), cv2.IMREAD_COLOR)
+        roi = meta.get("roi")
+        shape = meta.get("frame_shape")
+        if roi is None or shape is None:
+            return image
+        # ROI crops are pasted back so detections keep their camera coordinates
+        x, y = roi[0], roi[1]
+        frame = np.zeros(shape, dtype=np.uint8)
+        frame[y:y + image.shape[0], x:x + image.shape[1]] = image
+        return frame
+
+
+def replay(directory, system, start=None, end=None, realtime=False):
+    """
+    Feeds a recorded session through a LaserDetectionSystem: serial lines go
+    through handle_serial_line with their receiver id and frames through
+    process_frame, both with their recorded timestamps. The system needs as
+    many serial ports as the recording's "receivers" metadata, e.g.
+    serial_port=[None] * receivers, for the gun ids to match the live ones.
+    Returns the number of frames replayed.
+    """
+    frames = 0
+    first = None
+    wall_start = time.monotonic()
+    for kind, timestamp, payload in SessionReader(directory).records(start, end, (KIND_FRAME, KIND_SERIAL)):
+        if realtime:
+            if first is None:
+                first = timestamp
+            delay = (timestamp - first) / 1000 - (time.monotonic() - wall_start)
+            if delay > 0:
+                time.sleep(delay)
+        if kind == KIND_SERIAL:
+            receiver_id, line = serial_line(payload)
+            system.handle_serial_line(line, timestamp, receiver_id)
+        else:
+            system.process_frame(payload, timestamp / 1000)
+            frames += 1
+    return frames
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Inspect or view a recorded session.")
+    parser.add_argument("directory")
+    parser.add_argument("--show", action="store_true", help="play the recorded frames in a window")
+    args = parser.parse_args()
+
+    counts = {KIND_FRAME: 0, KIND_SERIAL: 0, KIND_DETECTION: 0}
+    for kind, timestamp, payload in SessionReader(args.directory).records():
+        counts[kind] += 1
+        if kind == KIND_FRAME and args.show:
+            cv2.imshow("Replay", cv2.resize(payload, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA))
+            if cv2.waitKey(30) & 0xFF == ord("q"):
+                break
+        elif kind != KIND_FRAME:
+            print(f"{timestamp:.1f} {payload}")
+    print(f"frames: {counts[KIND_FRAME]}, serial lines: {counts[KIND_SERIAL]}, detections: {counts[KIND_DETECTION]}")
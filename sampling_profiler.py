@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+import time
+import threading
+import logging
+import collections
+
+logger = logging.getLogger("Profiler")
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for a running process, toggled at runtime.
+
+    A daemon thread reads the stacks of all other threads (or of the threads
+    whose name starts with one of `thread_prefixes`) from sys._current_frames()
+    every `interval` seconds. Samples are counted per (thread, tuple of code
+    objects), labels are only built when the profile is written, which keeps a
+    sample at a few tens of microseconds. Blocked threads are sampled too, so
+    waits show up as e.g. `threading.py:Condition.wait`.
+
+    stop() writes one collapsed-stack file per thread (`frame;frame;... count`
+    lines, as read by flamegraph.pl, speedscope or inferno) and a JSON file
+    with the same stem holding `context()`, the sample counts and the
+    profiler's own overhead.
+    """
+    def __init__(self, interval=0.01, output_directory="profiles", thread_prefixes=None, context=None):
+        self.interval = interval
+        self.output_directory = output_directory
+        self.thread_prefixes = tuple(thread_prefixes) if thread_prefixes else None
+        self.context = context
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.samples = None
+        self.labels = {}  # code object -> frame label, kept across runs
+        self.started = 0.0
+        self.sampling_time = 0.0
+        self.ticks = 0
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def toggle(self):
+        """Starts or stops profiling; returns the written JSON path when it stopped."""
+        if self.running:
+            return self.stop()
+        self.start()
+        return None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.samples = collections.Counter()
+            self.sampling_time = 0.0
+            self.ticks = 0
+            self.stop_event.clear()
+            self.started = time.time()
+            self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self.thread.start()
+        logger.warning(f"Profiling started, sampling every {self.interval * 1000:.1f} ms.")
+
+    def stop(self):
+        with self.lock:
+            if self.thread is None:
+                return None
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+        return self.write()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        samples = self.samples
+        next_tick = time.perf_counter()
+        while not self.stop_event.is_set():
+            tick_start = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                name = names.get(thread_id)
+                if thread_id == own_id or name is None:
+                    continue
+                if self.thread_prefixes and not name.startswith(self.thread_prefixes):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                samples[(name, tuple(stack))] += 1
+            self.ticks += 1
+            now = time.perf_counter()
+            self.sampling_time += now - tick_start
+            # Fixed schedule: a slow tick shortens the next wait instead of shifting all later ones
+            next_tick = max(next_tick + self.interval, now)
+            self.stop_event.wait(next_tick - now)
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = self.labels[code] = f"{os.path.basename(code.co_filename)}:{name}".replace(";", ",")
+        return label
+
+    def collapsed(self):
+        """{thread name: {"root;...;leaf": count}}"""
+        threads = collections.defaultdict(collections.Counter)
+        for (name, stack), count in self.samples.items():
+            threads[name][";".join(self.label(code) for code in reversed(stack))] += count
+        return threads
+
+    def write(self):
+        duration = time.time() - self.started
+        stem = os.path.join(self.output_directory, "profile_" + time.strftime("%Y%m%d_%H%M%S", time.localtime(self.started)))
+        os.makedirs(self.output_directory, exist_ok=True)
+        threads = self.collapsed()
+        files = {}
+        for name, stacks in threads.items():
+            path = files[name] = f"{stem}_{''.join(c if c.isalnum() or c in '-_' else '_' for c in name)}.folded"
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in sorted(stacks.items()):
+                    f.write(f"{stack} {count}\n")
+
+        context = {}
+        if self.context is not None:
+            try:
+                context = self.context()
+            except Exception as e:
+                logger.error(f"Profile context failed: {e}")
+        summary = {
+            "started": self.started,
+            "duration_s": round(duration, 3),
+            "interval_ms": self.interval * 1000,
+            "ticks": self.ticks,
+            "sampling_overhead": round(self.sampling_time / duration, 5) if duration > 0 else None,
+            "threads": {name: {"samples": sum(stacks.values()), "file": os.path.basename(files[name])}
+                        for name, stacks in threads.items()},
+            "context": context,
+        }
+        with open(stem + ".json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, default=str)
+        logger.warning(f"Profile of {duration:.1f} s ({self.ticks} ticks) written to {stem}.json")
+        return stem + ".json"
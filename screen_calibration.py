@@ -0,0 +1,314 @@
+import os
+import json
+import math
+import threading
+import logging
+import collections
+
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+logger = logging.getLogger("ScreenCalibration")
+
+
+SURFACES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "surfaces.json")
+
+
+def load_surfaces(path=SURFACES_FILE):
+    """
+    Side surfaces seen by the camera besides the main screen, e.g. targets on
+    the walls: [{"name": ..., "corners": [TL, TR, BR, BL], "region": [x, y,
+    width, height]}], corners in camera pixels, region in output coordinates.
+    """
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read surfaces from {path}: {e}")
+        return []
+
+
+class Surface:
+    """One calibrated quad and the output rectangle (x, y, width, height) its homography maps it onto."""
+    def __init__(self, name, corners, region, undistort=None):
+        self.name = name
+        self.corners = np.array(corners, dtype=np.float32).reshape(-1, 2)
+        self.region = tuple(region)
+        # Undistorted camera pixels, the space spots are mapped in
+        self.quad = np.float32(undistort(self.corners) if undistort else self.corners).reshape(-1, 2)
+        x, y, width, height = self.region
+        dst = np.float32([[x, y], [x + width, y], [x + width, y + height], [x, y + height]])
+        self.homography = cv2.getPerspectiveTransform(self.quad, dst)
+
+    def contains(self, mapped_x, mapped_y):
+        x, y, width, height = self.region
+        return (mapped_x >= x) & (mapped_x <= x + width) & (mapped_y >= y) & (mapped_y <= y + height)
+
+
+class ScreenCalibration:
+    """
+    Everything derived from one set of calibrated corners: the homography to
+    projector pixels, the detection ROIs and the lookup map of all surfaces.
+
+    Instances are never modified after construction. LaserDetectionSystem
+    holds the current one in `calibration` and replaces it with a single
+    attribute assignment, and the detection loop reads that attribute once per
+    frame, so a frame is always analysed with one consistent calibration and a
+    swap never blocks or drops a frame.
+
+    `reference` are the corners the operator confirmed; drift corrections move
+    `corners` but keep the reference, which bounds how far they may wander.
+
+    `side_surfaces` (see load_surfaces) are calibrated next to the main screen,
+    which is the surface "screen" mapped onto (0, 0, screen_size). Where
+    surfaces overlap in the camera image the earlier one wins.
+    """
+    def __init__(self, corners, screen_size, undistort=None, reference=None, side_surfaces=()):
+        self.corners = np.array(corners, dtype=np.float32).reshape(-1, 2)
+        self.reference = self.corners if reference is None else np.array(reference, dtype=np.float32).reshape(-1, 2)
+        self.screen_width, self.screen_height = screen_size
+        self.side_surfaces = list(side_surfaces)
+        self.surfaces = []
+        if len(self.corners) == 4:
+            self.surfaces.append(Surface("screen", self.corners, (0, 0, self.screen_width, self.screen_height),
+                                         undistort))
+        for spec in self.side_surfaces:
+            self.surfaces.append(Surface(spec["name"], spec["corners"], spec["region"], undistort))
+        self.homography = self.surfaces[0].homography if len(self.corners) == 4 else None
+        self.regions = {surface.name: surface.region for surface in self.surfaces}
+        self.rois = {}  # (frame shape, margin) -> roi
+        self.build_lookup()
+
+    def build_lookup(self):
+        """
+        Precomputes, for every pixel of the undistorted camera image around the
+        surfaces, its surface (index + 1, 0 for none) and output coordinates,
+        so locate() is an array read instead of a perspectiveTransform per
+        surface. Built once per calibration, i.e. only when it changes.
+        """
+        self.lookup_origin = (0, 0)
+        self.surface_ids = np.zeros((0, 0), np.uint8)
+        self.map_x = self.map_y = np.zeros((0, 0), np.float32)
+        if not self.surfaces:
+            return
+        quads = np.concatenate([surface.quad for surface in self.surfaces])
+        x0, y0 = np.floor(quads.min(axis=0)).astype(int) - 1
+        x1, y1 = np.ceil(quads.max(axis=0)).astype(int) + 2
+        grid = np.stack(np.meshgrid(np.arange(x0, x1, dtype=np.float32), np.arange(y0, y1, dtype=np.float32)), -1)
+
+        self.lookup_origin = (int(x0), int(y0))
+        self.surface_ids = np.zeros(grid.shape[:2], np.uint8)
+        self.map_x = np.zeros(grid.shape[:2], np.float32)
+        self.map_y = np.zeros(grid.shape[:2], np.float32)
+        for index, surface in enumerate(self.surfaces):
+            mapped = cv2.perspectiveTransform(grid.reshape(-1, 1, 2), surface.homography).reshape(grid.shape)
+            inside = surface.contains(mapped[..., 0], mapped[..., 1]) & (self.surface_ids == 0)
+            self.surface_ids[inside] = index + 1
+            self.map_x[inside] = mapped[..., 0][inside]
+            self.map_y[inside] = mapped[..., 1][inside]
+
+    def roi(self, frame_shape, margin):
+        """(x0, y0, x1, y1): the surfaces' bounding box plus `margin`, the whole frame without corners."""
+        key = (frame_shape[:2], margin)
+        roi = self.rois.get(key)
+        if roi is None:
+            height, width = frame_shape[:2]
+            roi = (0, 0, width, height)
+            if self.surfaces:
+                corners = np.concatenate([surface.corners for surface in self.surfaces])
+                x, y, w, h = cv2.boundingRect(corners)
+                roi = (max(0, x - margin), max(0, y - margin), min(width, x + w + margin), min(height, y + h + margin))
+            self.rois[key] = roi
+        return roi
+
+    def locate(self, point):
+        """(surface name, (x, y) output pixel) of an (undistorted) camera point, None outside every surface."""
+        x = float(point[0]) - self.lookup_origin[0]
+        y = float(point[1]) - self.lookup_origin[1]
+        rows, columns = self.surface_ids.shape
+        column, row = math.floor(x), math.floor(y)
+        if not (0 <= column < columns - 1 and 0 <= row < rows - 1):
+            return None
+        fx, fy = x - column, y - row
+        # Scalar item() reads, numpy slicing would cost more than the homography it replaces
+        ids = self.surface_ids.item
+        surface = ids(row + round(fy), column + round(fx))
+        if surface == 0:
+            return None
+        if surface == ids(row, column) == ids(row, column + 1) == ids(row + 1, column) == ids(row + 1, column + 1):
+            # Bilinear between the four neighbours keeps the spot's sub-pixel position
+            mapped = []
+            for values in (self.map_x.item, self.map_y.item):
+                top = values(row, column) * (1 - fx) + values(row, column + 1) * fx
+                bottom = values(row + 1, column) * (1 - fx) + values(row + 1, column + 1) * fx
+                mapped.append(top * (1 - fy) + bottom * fy)
+            mapped_x, mapped_y = mapped
+        else:
+            # On a surface edge: transform exactly and clamp onto the surface's region
+            region_x, region_y, width, height = self.surfaces[surface - 1].region
+            mapped = cv2.perspectiveTransform(np.float32([[point]]), self.surfaces[surface - 1].homography)[0, 0]
+            mapped_x = min(max(float(mapped[0]), region_x), region_x + width)
+            mapped_y = min(max(float(mapped[1]), region_y), region_y + height)
+        return self.surfaces[surface - 1].name, (int(mapped_x), int(mapped_y))
+
+    def map_point(self, point):
+        """Output pixel of an (undistorted) camera point, None outside every surface."""
+        located = self.locate(point)
+        return located[1] if located else None
+
+    def offset(self):
+        """Largest distance in px between a corner and its reference."""
+        if len(self.corners) != len(self.reference) or not len(self.corners):
+            return 0.0
+        return float(np.max(np.hypot(*(self.corners - self.reference).T)))
+
+def edge_points(frame, start, end, search, samples, min_contrast):
+    """
+    Points on the strongest colour edge across the segment start-end.
+
+    The frame is sampled along `samples` normals of the segment, +-search px
+    long, and each normal contributes the sub-pixel position of its largest
+    colour step if that step reaches min_contrast (sum over the channels).
+    The ends of the segment are skipped, the corners themselves are blurry.
+    """
+    start = np.asarray(start, dtype=np.float32)
+    end = np.asarray(end, dtype=np.float32)
+    direction = end - start
+    length = float(np.hypot(*direction))
+    if length < 1:
+        return np.empty((0, 2), np.float32)
+    normal = np.float32([-direction[1], direction[0]]) / length
+    bases = start + np.linspace(0.1, 0.9, samples, dtype=np.float32)[:, None] * direction
+    offsets = np.arange(-search, search + 1, dtype=np.float32)
+    map_x = bases[:, 0:1] + offsets[None, :] * normal[0]
+    map_y = bases[:, 1:2] + offsets[None, :] * normal[1]
+    profiles = cv2.remap(frame, map_x, map_y, cv2.INTER_LINEAR).astype(np.float32)
+    profiles = cv2.GaussianBlur(profiles, (5, 1), 0)
+
+    steps = np.abs(profiles[:, 2:] - profiles[:, :-2])
+    steps = steps.sum(axis=2) if steps.ndim == 3 else steps
+    best = np.argmax(steps, axis=1)
+    strength = steps[np.arange(samples), best]
+    keep = (strength >= min_contrast) & (best > 0) & (best < steps.shape[1] - 1)
+
+    rows = np.nonzero(keep)[0]
+    best = best[rows]
+    left, centre, right = steps[rows, best - 1], steps[rows, best], steps[rows, best + 1]
+    denominator = left - 2 * centre + right
+    shift = np.where(denominator < 0, 0.5 * (left - right) / np.where(denominator < 0, denominator, -1), 0.0)
+    # steps[i] is centred on offsets[i + 1]
+    position = offsets[best + 1] + shift
+    return bases[rows] + position[:, None] * normal
+
+
+def intersect(line_a, line_b):
+    (vx1, vy1, x1, y1), (vx2, vy2, x2, y2) = line_a, line_b
+    determinant = vx1 * -vy2 + vy1 * vx2
+    if abs(determinant) < 1e-6:
+        return None
+    t = ((x2 - x1) * -vy2 + (y2 - y1) * vx2) / determinant
+    return x1 + t * vx1, y1 + t * vy1
+
+
+def estimate_screen_quad(frame, corners, search=24, samples=32, min_contrast=40.0, min_inliers=0.4):
+    """
+    Re-estimates the projected screen quad near `corners` (TL, TR, BR, BL).
+
+    Every edge is located within +-search px of the current one and fitted
+    with a robust line, the new corners are the intersections of neighbouring
+    lines. Returns None when an edge is not visible enough, e.g. a player
+    standing in front of it or a dark scene at the border.
+    """
+    corners = np.asarray(corners, dtype=np.float32)
+    lines = []
+    for i in range(4):
+        points = edge_points(frame, corners[i], corners[(i + 1) % 4], search, samples, min_contrast)
+        if len(points) < max(3, min_inliers * samples):
+            return None
+        lines.append(cv2.fitLine(points, cv2.DIST_HUBER, 0, 0.01, 0.01).ravel())
+
+    quad = []
+    for i in range(4):
+        point = intersect(lines[i - 1], lines[i])
+        if point is None:
+            return None
+        quad.append(point)
+    return np.float32(quad)
+
+
+class CalibrationDriftTracker:
+    """
+    Low-rate background correction of small calibration drift.
+
+    Every `interval` seconds the latest camera frame is searched for the
+    screen edges around the current corners (estimate_screen_quad). When the
+    last `agreement` estimates agree within `max_spread` px, the corners are
+    moved towards their median by at most `max_step` px per corner and check,
+    so a wrong estimate can never make the mapping jump. Corrections stop at
+    `max_drift` px from the operator's corners: a bumped camera needs a new
+    calibration, which is logged. Offsets below `deadband` px are left alone.
+    """
+    def __init__(self, system, interval=5.0, max_step=1.0, max_drift=20.0, deadband=1.0, agreement=3,
+                 max_spread=2.0):
+        self.system = system
+        self.interval = interval
+        self.max_step = max_step
+        self.max_drift = max_drift
+        self.deadband = deadband
+        self.max_spread = max_spread
+        self.estimates = collections.deque(maxlen=agreement)
+        self.corrections = 0
+        self.last_error = 0.0  # px, largest corner offset of the last agreed estimate
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="calibration-drift", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            camera = self.system.camera
+            frame = camera.latest_frame() if camera is not None else None
+            if frame is not None:
+                try:
+                    self.check(frame)
+                except cv2.error as e:
+                    logger.warning(f"Drift check failed: {e}")
+
+    def check(self, frame):
+        """One estimate-and-correct step. Returns True if the corners were moved."""
+        calibration = self.system.calibration
+        if len(calibration.corners) != 4:
+            return False
+        quad = estimate_screen_quad(frame, calibration.corners)
+        if quad is None:
+            return False
+        self.estimates.append(quad)
+        if len(self.estimates) < self.estimates.maxlen:
+            return False
+        estimates = np.stack(self.estimates)
+        target = np.median(estimates, axis=0)
+        if np.max(np.hypot(*(estimates - target).transpose(2, 0, 1))) > self.max_spread:
+            return False
+
+        delta = target - calibration.corners
+        self.last_error = float(np.max(np.hypot(*delta.T)))
+        if self.last_error < self.deadband:
+            return False
+        if np.max(np.hypot(*(target - calibration.reference).T)) > self.max_drift:
+            logger.warning(f"Screen moved {self.last_error:.1f} px, beyond drift correction; recalibrate.")
+            return False
+        corners = calibration.corners + np.clip(delta, -self.max_step, self.max_step)
+        self.system.set_projector_corners(corners, source="drift")
+        self.corrections += 1
+        return True
@@ -0,0 +1,127 @@
+import sys
+import time
+import logging
+import selectors
+
+from lazy_imports import lazy_import
+
+serial = lazy_import("serial")
+
+logger = logging.getLogger("SerialHub")
+
+
+class SerialHub:
+    """
+    Reads several receivers on a single thread and calls
+    on_line(receiver_id, line, host_ms) in arrival order.
+
+    On POSIX the ports are multiplexed with a selector. Windows serial handles
+    cannot be selected, so there the hub polls in_waiting of every port and
+    sleeps for a millisecond when none had data. Receiver ids are the indexes
+    in `ports`. A failing port is closed and reopened in the background
+    without stalling the other receivers.
+    """
+    def __init__(self, ports, baudrate, on_line, stop_event, reconnect_delay=2.0, on_reconnect=None):
+        self.ports = list(ports)
+        self.baudrate = baudrate
+        self.on_line = on_line
+        self.stop_event = stop_event
+        self.reconnect_delay = reconnect_delay
+        self.on_reconnect = on_reconnect
+        self.connections = [None] * len(self.ports)
+        self.buffers = [b""] * len(self.ports)
+        self.retry_at = [0.0] * len(self.ports)
+        self.ever_connected = [False] * len(self.ports)
+        self.use_selector = sys.platform != "win32"
+        self.selector = selectors.DefaultSelector() if self.use_selector else None
+
+    def open_port(self, receiver_id):
+        port = self.ports[receiver_id]
+        try:
+            connection = serial.Serial(port, self.baudrate, timeout=0)
+        except serial.SerialException as e:
+            logger.error(f"Serial connection to {port} failed: {e}")
+            self.retry_at[receiver_id] = time.monotonic() + self.reconnect_delay
+            return
+        self.connections[receiver_id] = connection
+        self.buffers[receiver_id] = b""
+        if self.use_selector:
+            self.selector.register(connection.fileno(), selectors.EVENT_READ, receiver_id)
+        if self.ever_connected[receiver_id] and self.on_reconnect:
+            self.on_reconnect(receiver_id)
+        self.ever_connected[receiver_id] = True
+        logger.info(f"Connected to serial port {port} as receiver {receiver_id}")
+
+    def close_port(self, receiver_id, error=None):
+        connection = self.connections[receiver_id]
+        if connection is None:
+            return
+        if error is not None:
+            logger.error(f"Serial error on {self.ports[receiver_id]}: {error}")
+        if self.use_selector:
+            try:
+                self.selector.unregister(connection.fileno())
+            except (KeyError, ValueError):
+                pass
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self.connections[receiver_id] = None
+        self.retry_at[receiver_id] = time.monotonic() + self.reconnect_delay
+
+    def read_available(self, receiver_id, lines):
+        connection = self.connections[receiver_id]
+        try:
+            chunk = connection.read(max(1, connection.in_waiting))
+        except (serial.SerialException, OSError) as e:
+            self.close_port(receiver_id, e)
+            return
+        host_ms = time.monotonic() * 1000
+        data = self.buffers[receiver_id] + chunk
+        *complete, self.buffers[receiver_id] = data.split(b"\n")
+        for raw in complete:
+            lines.append((host_ms, receiver_id, raw.decode("utf-8", errors="replace").strip().lower()))
+
+    def run(self):
+        for receiver_id in range(len(self.ports)):
+            self.open_port(receiver_id)
+
+        try:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                for receiver_id, connection in enumerate(self.connections):
+                    if connection is None and now >= self.retry_at[receiver_id]:
+                        self.open_port(receiver_id)
+
+                lines = []
+                if self.use_selector:
+                    if self.selector.get_map():
+                        for key, _ in self.selector.select(timeout=0.5):
+                            self.read_available(key.data, lines)
+                    else:
+                        self.stop_event.wait(0.5)
+                else:
+                    for receiver_id, connection in enumerate(self.connections):
+                        if connection is None:
+                            continue
+                        try:
+                            waiting = connection.in_waiting
+                        except serial.SerialException as e:
+                            self.close_port(receiver_id, e)
+                            continue
+                        if waiting:
+                            self.read_available(receiver_id, lines)
+                    if not lines:
+                        time.sleep(0.001)
+
+                # Merge the receivers into one stream ordered by arrival time
+                lines.sort(key=lambda line: line[0])
+                for host_ms, receiver_id, data in lines:
+                    if data:
+                        self.on_line(receiver_id, data, host_ms)
+        finally:
+            for receiver_id in range(len(self.ports)):
+                self.close_port(receiver_id)
+            if self.selector:
+                self.selector.close()
@@ -0,0 +1,44 @@
+from collections import namedtuple
+
+# Receiver line format (Receiver_ESP32.cpp):
+#   "ir laser fired from gun a1 seq=12 t=345678"
+# The digit is the sender's button ("A1", "A2"). It, seq and t (device millis())
+# are optional so older receivers keep working.
+GUN_LINE_PREFIX = "ir laser fired from gun "
+
+GunEvent = namedtuple("GunEvent", ["gun", "seq", "device_ms", "button"], defaults=(None,))
+
+
+def parse_gun_line(data):
+    data = data.strip().lower()
+    if not data.startswith(GUN_LINE_PREFIX):
+        return None
+    fields = data[len(GUN_LINE_PREFIX):].split()
+    if not fields:
+        return None
+
+    seq = None
+    device_ms = None
+    for field in fields[1:]:
+        key, _, value = field.partition("=")
+        try:
+            if key == "seq":
+                seq = int(value)
+            elif key == "t":
+                device_ms = int(value)
+        except ValueError:
+            # Corrupted line, e.g. cut off by a serial buffer overrun
+            return None
+    gun, button = fields[0], None
+    if len(gun) > 1 and gun[1:].isdigit():
+        gun, button = gun[0], gun[1:]
+    return GunEvent(gun, seq, device_ms, button)
+
+
+def format_gun_line(gun, seq=None, device_ms=None, button=None):
+    line = GUN_LINE_PREFIX + gun + (button or "")
+    if seq is not None:
+        line += f" seq={seq}"
+    if device_ms is not None:
+        line += f" t={device_ms}"
+    return line
@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+
+from serial_protocol import format_gun_line
+
+logger = logging.getLogger("ReceiverSimulator")
+
+GARBAGE_LINES = [
+    b"Receiver ready!",
+    b"ir laser fired from gun",
+    b"ir laser fired from gun a seq=x t=",
+    b"\x00\xff\xfe garbage",
+    b"E (1234) ESPNOW: peer not found",
+]
+
+
+class ReceiverSimulator:
+    """
+    Emulates the ESP32 receiver on a pseudo-terminal (POSIX only).
+
+    `port` is a stable symlink to the current pty slave, so it can be passed as
+    `serial_port` to LaserDetectionSystem and survives simulated disconnects
+    (the pty is closed and a new one is linked after `disconnect_duration`).
+    Every emitted gun line is kept in `sent` as (seq, gun) for loss checks.
+    Opening a serial port flushes its input buffer, so a reader that opens the
+    port after start() loses the first lines; start(paused=True) and resume()
+    once the port is open avoids that.
+    """
+    def __init__(self, rate=10.0, jitter=0.0, guns="abcd", burst_size=1, garbage_rate=0.0,
+                 disconnect_every=None, disconnect_duration=1.0, timestamps=True, seed=None):
+        if sys.platform == "win32":
+            raise RuntimeError("The PTY receiver simulator needs a POSIX system.")
+        self.rate = rate  # bursts per second
+        self.jitter = jitter  # +- fraction of the interval
+        self.guns = guns
+        self.burst_size = burst_size  # lines written back to back per burst
+        self.garbage_rate = garbage_rate  # probability of a garbage line per burst
+        self.disconnect_every = disconnect_every  # s between disconnects, None for never
+        self.disconnect_duration = disconnect_duration
+        self.timestamps = timestamps
+        self.random = random.Random(seed)
+
+        self.port = os.path.join(tempfile.mkdtemp(prefix="esp32-sim-"), "ttySIM")
+        self.master = None
+        self.slave = None
+        self.sent = []
+        self.garbage_sent = 0
+        self.disconnects = 0
+        self.sequence = 0
+        self.start_time = None
+        self.stop_event = threading.Event()
+        self.emitting = threading.Event()
+        self.thread = None
+
+    def open_pty(self):
+        import tty
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        tmp_link = self.port + ".new"
+        os.symlink(os.ttyname(self.slave), tmp_link)
+        os.replace(tmp_link, self.port)
+
+    def close_pty(self):
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.master = None
+        self.slave = None
+
+    def start(self, paused=False):
+        self.open_pty()
+        self.start_time = time.monotonic()
+        if not paused:
+            self.emitting.set()
+        self.thread = threading.Thread(target=self._run, name="receiver-simulator", daemon=True)
+        self.thread.start()
+        logger.info(f"Simulated receiver on {self.port}")
+        return self
+
+    def resume(self):
+        """Starts emitting after start(paused=True); device timestamps count from here."""
+        self.start_time = time.monotonic()
+        self.emitting.set()
+
+    def write_line(self, line):
+        os.write(self.master, line + b"\r\n")
+
+    def _run(self):
+        while not self.emitting.wait(0.1):
+            if self.stop_event.is_set():
+                return
+        interval = 1.0 / self.rate
+        next_time = time.monotonic()
+        next_disconnect = next_time + self.disconnect_every if self.disconnect_every else None
+
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            if next_disconnect is not None and now >= next_disconnect:
+                logger.info("Simulating receiver disconnect.")
+                self.close_pty()
+                self.disconnects += 1
+                if self.stop_event.wait(self.disconnect_duration):
+                    break
+                self.open_pty()
+                now = time.monotonic()
+                next_time = now
+                next_disconnect = now + self.disconnect_every
+
+            try:
+                for _ in range(self.burst_size):
+                    gun = self.random.choice(self.guns)
+                    device_ms = int((time.monotonic() - self.start_time) * 1000) if self.timestamps else None
+                    self.write_line(format_gun_line(gun, self.sequence, device_ms).encode("utf-8"))
+                    self.sent.append((self.sequence, gun))
+                    self.sequence += 1
+                if self.garbage_rate and self.random.random() < self.garbage_rate:
+                    self.write_line(self.random.choice(GARBAGE_LINES))
+                    self.garbage_sent += 1
+            except OSError as e:
+                logger.error(f"Simulator write failed: {e}")
+                break
+
+            next_time += interval * (1 + self.random.uniform(-self.jitter, self.jitter))
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        self.close_pty()
+        try:
+            os.remove(self.port)
+            os.rmdir(os.path.dirname(self.port))
+        except OSError:
+            pass
+
+
+def run_load_test(duration=10.0, settle=5.0, **simulator_options):
+    """
+    Streams simulated events into LaserDetectionSystem.read_serial and checks
+    that every emitted line was received exactly once. Returns a result dict.
+    With simulated disconnects the lines written while the port was being
+    reopened are lost like on real hardware; they must show up in `lost`.
+    """
+    from detect import LaserDetectionSystem
+
+    simulator = ReceiverSimulator(**simulator_options).start(paused=True)
+    system = LaserDetectionSystem(
+        camera_index=0,
+        serial_port=simulator.port,
+        baudrate=115200,
+        projector_corners=[(0, 0), (1920, 0), (1920, 1080), (0, 1080)],
+        camera_width=1920,
+        camera_height=1080,
+        output_mode="none",
+    )
+    # Per-line INFO logging would be the bottleneck at thousands of lines per second
+    system.logger.setLevel(logging.WARNING)
+    system.start_serial()
+    reader = threading.Thread(target=system.read_serial, name="serial", daemon=True)
+    reader.start()
+    # Lines written before the port is open would be flushed by the open
+    simulator.resume()
+
+    time.sleep(duration)
+    simulator.stop_event.set()
+    simulator.thread.join()
+    elapsed = time.monotonic() - simulator.start_time
+    sent = len(simulator.sent)
+    # Give the reader time to drain the pty buffer before shutting everything down
+    deadline = time.monotonic() + settle
+    while time.monotonic() < deadline and sum(c.value for c in system.signals_received.children.values()) < sent:
+        time.sleep(0.05)
+    system.stop_event.set()
+    reader.join(timeout=5)
+    simulator.stop()
+
+    received = sum(c.value for c in system.signals_received.children.values())
+    queued = []
+    while not system.gun_signal_queue.empty():
+        queued.append(system.gun_signal_queue.get()[0])
+    expected_queued = [gun for _, gun in simulator.sent if gun in ("a", "c")]
+    return {
+        "ok": system.sequence_tracker.duplicates == 0 and (
+            simulator.disconnects > 0 or (received == sent and queued == expected_queued)),
+        "sent": sent,
+        "received": received,
+        "lost": system.sequence_tracker.lost,
+        "duplicates": system.sequence_tracker.duplicates,
+        "queued_in_order": queued == expected_queued if not simulator.disconnects else None,
+        "garbage_sent": simulator.garbage_sent,
+        "disconnects": simulator.disconnects,
+        "reconnects": system.serial_reconnects.value,
+        "rate": sent / elapsed,
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Simulate the ESP32 receiver on a pseudo-terminal.")
+    parser.add_argument("--rate", type=float, default=10.0, help="bursts per second")
+    parser.add_argument("--jitter", type=float, default=0.0, help="interval jitter as a fraction")
+    parser.add_argument("--burst", type=int, default=1, help="lines per burst")
+    parser.add_argument("--guns", default="abcd")
+    parser.add_argument("--garbage", type=float, default=0.0, help="garbage line probability per burst")
+    parser.add_argument("--disconnect-every", type=float, default=None, help="seconds between disconnects")
+    parser.add_argument("--disconnect-duration", type=float, default=1.0)
+    parser.add_argument("--no-timestamps", action="store_true", help="emit the old line format")
+    parser.add_argument("--load-test", type=float, default=None, metavar="SECONDS",
+                        help="run read_serial against the simulator and check for lost/duplicated signals")
+    args = parser.parse_args()
+
+    options = dict(rate=args.rate, jitter=args.jitter, guns=args.guns, burst_size=args.burst,
+                   garbage_rate=args.garbage, disconnect_every=args.disconnect_every,
+                   disconnect_duration=args.disconnect_duration, timestamps=not args.no_timestamps)
+    if args.load_test:
+        result = run_load_test(args.load_test, **options)
+        for key, value in result.items():
+            print(f"{key}: {value}")
+        sys.exit(0 if result["ok"] else 1)
+
+    simulator = ReceiverSimulator(**options).start()
+    print(f"Simulated receiver running, use serial_port={simulator.port!r} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
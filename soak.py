@@ -0,0 +1,358 @@
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+import tracemalloc
+
+import numpy as np
+
+from camera_session import FrameSubscription
+from serial_protocol import format_gun_line
+from synthetic_scene import RESOLUTIONS, SyntheticScene, make_system
+
+logger = logging.getLogger("Soak")
+
+# Largest tolerated growth per simulated hour, after the warm-up
+LIMITS = {
+    "rss_mb": 4.0,
+    "traced_mb": 1.0,
+    "threads": 0.5,
+    "signal_queue": 2.0,
+    "frame_queue": 1.0,
+    "frame_ms_p90": 0.5,
+}
+
+
+class SyntheticCamera:
+    """
+    Stands in for a CameraSession and plays a SyntheticScene at fps * speedup.
+
+    Every frame gets the current time.monotonic() stamp, so the simulated day
+    runs `speedup` times faster than real time while every latency and match
+    window of the detector keeps its real length. `shot_rate` times per
+    simulated second a gun fires: its receiver line (with seq and device
+    timestamp) goes to `on_serial` and its dot is drawn into the frames of the
+    next LASER_PULSE_MS. Every `stall_every` simulated seconds the camera
+    delivers nothing for `stall_duration` seconds while the guns keep firing,
+    like a USB camera that hangs. Frames are copies of a few pre-rendered noisy
+    frames, rendering would otherwise cost more than detection.
+    """
+    LASER_PULSE_MS = 50
+
+    def __init__(self, scene, fps=30, speedup=4.0, shot_rate=1.0, guns="aacb", seed=0, pool=4,
+                 stall_every=None, stall_duration=5.0):
+        self.scene = scene
+        self.camera_index = 0
+        self.fps = fps
+        self.speedup = speedup
+        self.shot_rate = shot_rate
+        self.guns = guns
+        self.random = random.Random(seed)
+        self.pool = [scene.render() for _ in range(pool)]
+        self.on_serial = None  # (line, host_ms), set by the soak run for the current system
+        self.stall_every = stall_every
+        self.stall_duration = stall_duration
+
+        self.subscribers = []
+        self.subscribers_lock = threading.Lock()
+        self.latest = None
+        self.frame_count = 0
+        self.ticks = 0  # frame intervals, stalled or not
+        self.failed = False
+        self.sequence = 0
+        self.shots = 0
+        self.device_start = time.monotonic()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def simulated_seconds(self):
+        return self.ticks / self.fps
+
+    def stalled(self):
+        if not self.stall_every:
+            return False
+        return self.simulated_seconds % self.stall_every >= self.stall_every - self.stall_duration
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="synthetic-camera", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        interval = 1.0 / (self.fps * self.speedup)
+        pulse_frames = max(1, round(self.LASER_PULSE_MS / 1000 * self.fps))
+        shot_probability = self.shot_rate / self.fps
+        spot, spot_frames = None, 0
+        next_time = time.monotonic()
+        while not self.stop_event.is_set():
+            frame_time = time.monotonic()
+            line = None
+            if spot_frames == 0 and self.random.random() < shot_probability:
+                gun = self.random.choice(self.guns)
+                line = format_gun_line(gun, self.sequence, int((frame_time - self.device_start) * 1000))
+                self.sequence += 1
+                self.shots += 1
+                spot, spot_frames = self.scene.random_spot(), pulse_frames
+            if not self.stalled():
+                frame = self.pool[self.frame_count % len(self.pool)].copy()
+                if spot_frames:
+                    self.scene.draw_spots(frame, [spot])
+                item = (frame, frame_time)
+                self.latest = item
+                self.frame_count += 1
+                with self.subscribers_lock:
+                    subscribers = list(self.subscribers)
+                for subscription in subscribers:
+                    subscription.push(item)
+            spot_frames = max(0, spot_frames - 1)
+            self.ticks += 1
+            if line is not None and self.on_serial is not None:
+                self.on_serial(line, time.monotonic() * 1000)
+
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                # Behind schedule: run as fast as the machine allows instead of bursting
+                next_time = time.monotonic()
+
+    def wait_until_opened(self, timeout=None):
+        return True
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def latest_frame(self):
+        item = self.latest
+        return item[0] if item else None
+
+    def subscribe(self, maxsize=2):
+        subscription = FrameSubscription(maxsize)
+        with self.subscribers_lock:
+            self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.subscribers_lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+        subscription.close()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+
+def rss_bytes():
+    """Resident set size of this process; the peak RSS where the current one is not available."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb)
+        return counters.WorkingSetSize
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def theil_sen_slope(x, y):
+    """Median of the pairwise slopes; a GC pause or one slow sample does not make a trend."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    i, j = np.triu_indices(len(x), 1)
+    dx = x[j] - x[i]
+    valid = dx > 0
+    if not valid.any():
+        return 0.0
+    return float(np.median((y[j] - y[i])[valid] / dx[valid]))
+
+
+def make_soak_system(scene, camera):
+    system = make_system(scene, camera_session=camera, show_preview=False)
+    # Per-frame INFO logging would dominate the run and fill the disk
+    system.logger.setLevel(logging.ERROR)
+    return system
+
+
+def sample(system, camera, started):
+    subscription = system.camera_subscription
+    frame_ms = system.process_frame_ms.quantiles((0.5, 0.9, 0.99))
+    injection_ms = system.injection_latency_ms.quantiles((0.9,))
+    return {
+        "sim_hours": camera.simulated_seconds / 3600,
+        "wall_s": time.monotonic() - started,
+        "frames": camera.frame_count,
+        "rss_mb": rss_bytes() / 2 ** 20,
+        "traced_mb": tracemalloc.get_traced_memory()[0] / 2 ** 20 if tracemalloc.is_tracing() else float("nan"),
+        "threads": threading.active_count(),
+        "signal_queue": system.gun_signal_queue.qsize() + len(system.pending_gun_signals),
+        "frame_queue": subscription.qsize() if subscription else 0,
+        "frame_ms_p50": frame_ms[0.5],
+        "frame_ms_p90": frame_ms[0.9],
+        "frame_ms_p99": frame_ms[0.99],
+        "injection_ms_p90": injection_ms[0.9],
+        "hits": sum(c.value for c in system.signals_matched.children.values()),
+    }
+
+
+def run_soak(hours=1.0, speedup=4.0, resolution="720p", fps=30, shot_rate=1.0, sample_every=300.0, warmup=0.2,
+             restart_every=None, stall_every=None, trace=True, limits=None, configure=None, csv_path=None, seed=0):
+    """
+    Runs LaserDetectionSystem.run() on synthetic frames and serial lines for
+    `hours` of simulated time and samples memory, threads, queues and latency
+    every `sample_every` simulated seconds. `restart_every` (simulated s)
+    stops the system and starts a fresh one, so threads or memory that
+    outlive a system show up as a trend too; `configure(system)` is called on
+    every new system. `stall_every` (simulated s) makes the camera hang for a
+    few seconds now and then, see SyntheticCamera.
+
+    The samples after the `warmup` fraction are checked for a Theil-Sen trend
+    per simulated hour above `limits` (LIMITS by default); any such trend
+    fails the run. Returns a result dict with "ok", "failures", "trends",
+    "samples" and the tracemalloc allocators that grew most after warm-up.
+    """
+    limits = dict(LIMITS, **(limits or {}))
+    scene = SyntheticScene(*RESOLUTIONS[resolution], seed=seed)
+    camera = SyntheticCamera(scene, fps=fps, speedup=speedup, shot_rate=shot_rate, seed=seed, stall_every=stall_every)
+    if trace:
+        tracemalloc.start(1)
+
+    def start_system():
+        system = make_soak_system(scene, camera)
+        if configure:
+            configure(system)
+        camera.on_serial = system.handle_serial_line
+        thread = threading.Thread(target=system.run, name="detection", daemon=True)
+        thread.start()
+        return system, thread
+
+    def stop_system(system, thread):
+        camera.on_serial = None
+        system.stop_event.set()
+        thread.join(timeout=10)
+        if thread.is_alive():
+            logger.error("LaserDetectionSystem.run() did not return within 10 s of stop_event.")
+
+    started = time.monotonic()
+    camera.start()
+    system, thread = start_system()
+    samples = []
+    warm_snapshot = None
+    next_sample = 0.0
+    next_restart = restart_every
+    end = hours * 3600
+    try:
+        while True:
+            simulated = camera.simulated_seconds
+            if next_restart is not None and simulated >= next_restart:
+                stop_system(system, thread)
+                system, thread = start_system()
+                next_restart += restart_every
+            if simulated >= next_sample or simulated >= end:
+                row = sample(system, camera, started)
+                samples.append(row)
+                logger.info(" ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+                if trace and warm_snapshot is None and simulated >= warmup * end:
+                    warm_snapshot = tracemalloc.take_snapshot()
+                next_sample += sample_every
+                if simulated >= end:
+                    break
+            time.sleep(0.05)
+    finally:
+        final_snapshot = tracemalloc.take_snapshot() if trace else None
+        stop_system(system, thread)
+        camera.stop()
+        if trace:
+            tracemalloc.stop()
+
+    steady = [row for row in samples if row["sim_hours"] >= warmup * hours]
+    trends, failures = {}, []
+    if len(steady) >= 3:
+        for key, limit in limits.items():
+            # nan: not measured, e.g. no frame analysed yet right after a restart
+            points = [(row["sim_hours"], row[key]) for row in steady if row[key] == row[key]]
+            if len(points) < 3:
+                continue
+            trends[key] = theil_sen_slope(*zip(*points))
+            if trends[key] > limit:
+                failures.append(f"{key} grows {trends[key]:.3g}/h (limit {limit:g}/h)")
+    else:
+        failures.append(f"only {len(steady)} samples after warm-up, need 3")
+
+    top_allocations = []
+    if warm_snapshot is not None:
+        for stat in final_snapshot.compare_to(warm_snapshot, "lineno")[:10]:
+            frame = stat.traceback[0]
+            top_allocations.append((f"{frame.filename}:{frame.lineno}", stat.size_diff, stat.count_diff))
+
+    if csv_path:
+        with open(csv_path, "w") as f:
+            f.write(",".join(samples[0]) + "\n")
+            for row in samples:
+                f.write(",".join(str(v) for v in row.values()) + "\n")
+
+    wall = time.monotonic() - started
+    return {
+        "ok": not failures,
+        "failures": failures,
+        "trends": trends,
+        "samples": samples,
+        "top_allocations": top_allocations,
+        "simulated_hours": camera.simulated_seconds / 3600,
+        "wall_seconds": wall,
+        "achieved_speedup": camera.simulated_seconds / wall,
+        "shots": camera.shots,
+        "hits": samples[-1]["hits"] if samples else 0,
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Soak-test the detection pipeline for memory, thread and queue growth.")
+    parser.add_argument("--hours", type=float, default=12.0, help="simulated hours")
+    parser.add_argument("--speedup", type=float, default=4.0, help="frames are played this much faster than real time")
+    parser.add_argument("--resolution", choices=list(RESOLUTIONS), default="720p")
+    parser.add_argument("--fps", type=int, default=30, help="simulated camera frame rate")
+    parser.add_argument("--shot-rate", type=float, default=1.0, help="shots per simulated second")
+    parser.add_argument("--sample-every", type=float, default=300.0, help="simulated seconds between samples")
+    parser.add_argument("--warmup", type=float, default=0.2, help="fraction of the run ignored by the trend check")
+    parser.add_argument("--restart-every", type=float, default=None, help="simulated seconds between system restarts")
+    parser.add_argument("--stall-every", type=float, default=None, help="simulated seconds between camera stalls")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="tracemalloc slows Python allocations down")
+    parser.add_argument("--csv", default=None, help="write the samples to this file")
+    args = parser.parse_args()
+
+    result = run_soak(hours=args.hours, speedup=args.speedup, resolution=args.resolution, fps=args.fps,
+                      shot_rate=args.shot_rate, sample_every=args.sample_every, warmup=args.warmup,
+                      restart_every=args.restart_every, stall_every=args.stall_every, trace=not args.no_tracemalloc, csv_path=args.csv)
+    print(f"simulated {result['simulated_hours']:.2f} h in {result['wall_seconds'] / 3600:.2f} h "
+          f"(x{result['achieved_speedup']:.1f}), {result['shots']} shots, {result['hits']} hits")
+    for key, slope in result["trends"].items():
+        print(f"trend {key}: {slope:+.3g}/h")
+    if result["top_allocations"]:
+        print("largest allocation growth after warm-up:")
+        for location, size, count in result["top_allocations"]:
+            print(f"  {size / 1024:+10.1f} KiB {count:+8d} blocks  {location}")
+    for failure in result["failures"]:
+        print(f"FAIL: {failure}")
+    sys.exit(0 if result["ok"] else 1)
@@ -0,0 +1,110 @@
+import itertools
+
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+
+class KalmanTrack:
+    """
+    Constant-velocity Kalman filter for one laser spot, state (x, y, vx, vy).
+
+    Times are monotonic seconds. Process noise is white acceleration with
+    spectral density `acceleration_noise` (px/s^2), the measurement noise is
+    the centroid jitter in px.
+    """
+    def __init__(self, track_id, x, y, t, acceleration_noise=3000.0, measurement_noise=1.0,
+                 initial_velocity_noise=2000.0):
+        self.track_id = track_id
+        self.state = np.array([x, y, 0.0, 0.0])
+        self.covariance = np.diag([measurement_noise ** 2, measurement_noise ** 2,
+                                   initial_velocity_noise ** 2, initial_velocity_noise ** 2])
+        self.acceleration_noise = acceleration_noise
+        self.measurement_noise = measurement_noise
+        self.time = t
+        self.first_time = t
+        self.hits = 1
+
+    @staticmethod
+    def transition(dt):
+        F = np.eye(4)
+        F[0, 2] = F[1, 3] = dt
+        return F
+
+    def process_noise(self, dt):
+        q = self.acceleration_noise ** 2
+        a, b, c = dt ** 4 / 4, dt ** 3 / 2, dt ** 2
+        return q * np.array([[a, 0, b, 0], [0, a, 0, b], [b, 0, c, 0], [0, b, 0, c]])
+
+    def predicted(self, t):
+        dt = t - self.time
+        return self.transition(dt) @ self.state, dt
+
+    def update(self, x, y, t):
+        dt = max(0.0, t - self.time)
+        F = self.transition(dt)
+        state = F @ self.state
+        covariance = F @ self.covariance @ F.T + self.process_noise(dt)
+
+        # Position-only measurement, H = [I 0]
+        innovation = np.array([x, y]) - state[:2]
+        S = covariance[:2, :2] + np.eye(2) * self.measurement_noise ** 2
+        K = covariance[:, :2] @ np.linalg.inv(S)
+        self.state = state + K @ innovation
+        self.covariance = (np.eye(4) - K @ np.eye(2, 4)) @ covariance
+        self.time = t
+        self.hits += 1
+
+    def position_at(self, t):
+        state, _ = self.predicted(t)
+        return float(state[0]), float(state[1])
+
+    @property
+    def velocity(self):
+        return float(self.state[2]), float(self.state[3])
+
+
+class SpotTracker:
+    """
+    Associates the spots of consecutive frames into KalmanTracks.
+
+    Detections are matched greedily to the track whose predicted position is
+    closest, within max_distance px; unmatched detections start new tracks and
+    tracks without a detection for max_age seconds are dropped. Laser pulses
+    are short, so a sweeping player shows up as a series of spots a few frames
+    apart and max_age has to span the gap between two shots.
+    """
+    def __init__(self, max_distance=80.0, max_age=0.5, **track_options):
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.track_options = track_options
+        self.tracks = []
+        self.ids = itertools.count()
+
+    def update(self, points, t):
+        """Returns the track of every point in `points`, in the same order."""
+        self.tracks = [track for track in self.tracks if t - track.time <= self.max_age]
+
+        candidates = []
+        for i, (x, y) in enumerate(points):
+            for track in self.tracks:
+                state, _ = track.predicted(t)
+                distance = float(np.hypot(state[0] - x, state[1] - y))
+                if distance <= self.max_distance:
+                    candidates.append((distance, i, track))
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        assigned = [None] * len(points)
+        used = set()
+        for _, i, track in candidates:
+            if assigned[i] is None and track.track_id not in used:
+                track.update(points[i][0], points[i][1], t)
+                assigned[i] = track
+                used.add(track.track_id)
+
+        for i, (x, y) in enumerate(points):
+            if assigned[i] is None:
+                track = KalmanTrack(next(self.ids), x, y, t, **self.track_options)
+                self.tracks.append(track)
+                assigned[i] = track
+        return assigned
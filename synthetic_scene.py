@@ -0,0 +1,151 @@
+import logging
+
+import cv2
+import numpy as np
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+PROJECTOR_WIDTH = 1920
+PROJECTOR_HEIGHT = 1080
+
+# Drawing with cv2 shift bits gives 1/16 px positioning for the laser dots
+SUBPIXEL_SHIFT = 4
+
+
+class SyntheticScene:
+    """
+    Renders camera frames of a projected game image without a camera.
+
+    The game image is drawn in projector space and warped into the camera frame
+    through the homography of `corners` (TL, TR, BR, BL in camera pixels), like
+    a slightly keystoned projection. Red distractors are either too large or too
+    dark for the detector's filters, so every detection that is not one of the
+    rendered laser dots counts as a false positive.
+    """
+    def __init__(self, width, height, seed=0, corners=None, noise_sigma=4.0, distractors=6, noise_frames=4):
+        self.width = width
+        self.height = height
+        self.rng = np.random.default_rng(seed)
+        if corners is None:
+            corners = [
+                (0.18 * width, 0.17 * height),
+                (0.82 * width, 0.15 * height),
+                (0.85 * width, 0.86 * height),
+                (0.15 * width, 0.84 * height),
+            ]
+        self.corners = [(float(x), float(y)) for x, y in corners]
+
+        src = np.float32([[0, 0], [PROJECTOR_WIDTH, 0], [PROJECTOR_WIDTH, PROJECTOR_HEIGHT], [0, PROJECTOR_HEIGHT]])
+        self.projector_to_camera = cv2.getPerspectiveTransform(src, np.float32(self.corners))
+
+        self.distractor_mask = np.zeros((PROJECTOR_HEIGHT, PROJECTOR_WIDTH), dtype=np.uint8)
+        game = self.render_game_image(distractors)
+        background = np.full((height, width, 3), (40, 45, 50), dtype=np.uint8)
+        warped = cv2.warpPerspective(game, self.projector_to_camera, (width, height))
+        screen_mask = cv2.warpPerspective(np.full((PROJECTOR_HEIGHT, PROJECTOR_WIDTH), 255, np.uint8),
+                                          self.projector_to_camera, (width, height))
+        self.base = np.where(screen_mask[..., None] > 0, warped, background)
+
+        # A few precomputed noise fields, generating noise per frame would dominate 4K benchmarks
+        self.noise = []
+        for _ in range(noise_frames):
+            noise = np.zeros((height, width, 3), dtype=np.int16)
+            cv2.randn(noise, 0, noise_sigma)
+            self.noise.append(noise)
+        self.frame_count = 0
+
+    def render_game_image(self, distractors):
+        rng = self.rng
+        game = np.zeros((PROJECTOR_HEIGHT, PROJECTOR_WIDTH, 3), dtype=np.uint8)
+        # Dark blue/green scenery, well outside the red hue bands
+        gradient = np.linspace(30, 110, PROJECTOR_WIDTH, dtype=np.uint8)
+        game[..., 0] = gradient
+        game[..., 1] = gradient[::-1] // 2 + 30
+        game[..., 2] = 20
+        for _ in range(12):
+            x, y = rng.integers(0, PROJECTOR_WIDTH), rng.integers(0, PROJECTOR_HEIGHT)
+            color = (int(rng.integers(80, 200)), int(rng.integers(80, 200)), int(rng.integers(0, 60)))
+            cv2.circle(game, (int(x), int(y)), int(rng.integers(20, 120)), color, -1)
+
+        for i in range(distractors):
+            x, y = int(rng.integers(0, PROJECTOR_WIDTH - 200)), int(rng.integers(0, PROJECTOR_HEIGHT - 200))
+            if i % 2 == 0:
+                # Large red scenery: inside the hue band, above the blob area limit
+                corner = (x + int(rng.integers(80, 200)), y + int(rng.integers(80, 200)))
+                cv2.rectangle(game, (x, y), corner, (20, 20, 220), -1)
+                cv2.rectangle(self.distractor_mask, (x - 20, y - 20), (corner[0] + 20, corner[1] + 20), 255, -1)
+            else:
+                # Small dark red objects: below the HSV value threshold
+                cv2.circle(game, (x, y), int(rng.integers(3, 8)), (10, 10, 70), -1)
+        return game
+
+    def random_spot(self, margin=0.05, on_distractors=False):
+        # Dots on the large red scenery merge with it, which the colour detector cannot separate
+        while True:
+            u = self.rng.uniform(margin, 1 - margin) * PROJECTOR_WIDTH
+            v = self.rng.uniform(margin, 1 - margin) * PROJECTOR_HEIGHT
+            if on_distractors or not self.distractor_mask[int(v), int(u)]:
+                return self.projector_point_to_camera((u, v))
+
+    def projector_point_to_camera(self, point):
+        p = np.array([[point]], dtype=np.float32)
+        x, y = cv2.perspectiveTransform(p, self.projector_to_camera)[0][0]
+        return float(x), float(y)
+
+    def render(self, spots=(), radius=3.0):
+        """
+        Returns a BGR frame with a laser dot at every (x, y) in `spots`
+        (camera pixels, sub-pixel accurate).
+        """
+        frame = self.base.astype(np.int16)
+        frame += self.noise[self.frame_count % len(self.noise)]
+        self.frame_count += 1
+        frame = np.clip(frame, 0, 255).astype(np.uint8)
+        return self.draw_spots(frame, spots, radius)
+
+    @staticmethod
+    def draw_spots(frame, spots, radius=3.0):
+        """Draws laser dots into `frame` in place, e.g. into a copy of a pre-rendered frame."""
+        scale = 1 << SUBPIXEL_SHIFT
+        for x, y in spots:
+            center = (int(round(x * scale)), int(round(y * scale)))
+            cv2.circle(frame, center, int(round(radius * scale)), (30, 30, 255), -1, cv2.LINE_AA, SUBPIXEL_SHIFT)
+        return frame
+
+    def frames(self, count, spots_per_frame=1):
+        """Yields (frame, spots) with random laser positions on the screen."""
+        for _ in range(count):
+            spots = [self.random_spot() for _ in range(spots_per_frame)]
+            yield self.render(spots), spots
+
+
+def make_system(scene, **options):
+    """
+    A LaserDetectionSystem for `scene` that reads none of the working tree's config
+    files (camera mode, detection config, surfaces, lens), so every run sees the same
+    defaults. `options` override the constructor arguments.
+    """
+    from camera_modes import CameraMode
+    from detect import LaserDetectionSystem
+    arguments = dict(
+        camera_index=0,
+        serial_port=None,
+        baudrate=115200,
+        projector_corners=scene.corners,
+        camera_width=scene.width,
+        camera_height=scene.height,
+        camera_mode=CameraMode(scene.width, scene.height),
+        output_mode="none",
+        detection_config={},
+        surfaces=[],
+        lens_calibration=False,
+    )
+    arguments.update(options)
+    system = LaserDetectionSystem(**arguments)
+    # process_frame logs every detection at INFO, keep that out of the timings
+    system.logger.setLevel(logging.WARNING)
+    return system
@@ -0,0 +1,316 @@
+import os
+import sys
+import json
+import time
+import bisect
+import random
+import logging
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from camera_modes import CameraMode
+from detect import LaserDetectionSystem
+from detection_config import CONFIG_FILE, save_detection_config
+from lens_calibration import LensCalibration
+from recorder import KIND_DETECTION, KIND_FRAME, KIND_SERIAL, SessionReader, serial_line
+
+logger = logging.getLogger("Tuner")
+
+LABELS_FILE = "labels.json"
+
+# Searched values per knob, the LaserDetectionSystem defaults are among them
+SEARCH_SPACE = {
+    "hue_low_max": [6, 8, 10, 12, 15],  # upper_red[0]
+    "hue_high_min": [165, 168, 170, 173, 176],  # lower_red2[0]
+    "saturation_min": [60, 80, 100, 130, 160],
+    "value_min": [80, 100, 130, 160, 200],
+    "min_spot_area": [2, 5, 10, 20],
+    "max_spot_area": [200, 500, 1000, 2000],
+    "max_gun_signal_age": [300, 500, 1000, 1500],  # ms, receivers without device timestamps
+}
+DEFAULT_KNOBS = {
+    "hue_low_max": 10, "hue_high_min": 170, "saturation_min": 100, "value_min": 100,
+    "min_spot_area": 5, "max_spot_area": 500, "max_gun_signal_age": 1000,
+}
+
+# Frames replayed around every serial line and label (ms), covers the largest match window
+WINDOW_BEFORE = 300
+WINDOW_AFTER = max(SEARCH_SPACE["max_gun_signal_age"]) + 200
+
+
+def knobs_to_config(knobs):
+    """detection_config.json content for one point of the search space."""
+    return {
+        "lower_red": [0, knobs["saturation_min"], knobs["value_min"]],
+        "upper_red": [knobs["hue_low_max"], 255, 255],
+        "lower_red2": [knobs["hue_high_min"], knobs["saturation_min"], knobs["value_min"]],
+        "upper_red2": [180, 255, 255],
+        "min_spot_area": knobs["min_spot_area"],
+        "max_spot_area": knobs["max_spot_area"],
+        "max_gun_signal_age": knobs["max_gun_signal_age"],
+    }
+
+
+def candidates(search="random", samples=200, seed=0, space=SEARCH_SPACE):
+    """The default configuration first, then the grid or `samples` distinct random points."""
+    keys = list(space)
+    if search == "grid":
+        points = [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    else:
+        rng = random.Random(seed)
+        total = int(np.prod([len(space[k]) for k in keys]))
+        seen, points = set(), []
+        while len(points) < min(samples, total):
+            values = tuple(rng.choice(space[k]) for k in keys)
+            if values not in seen:
+                seen.add(values)
+                points.append(dict(zip(keys, values)))
+    return [dict(DEFAULT_KNOBS)] + [p for p in points if p != DEFAULT_KNOBS]
+
+
+def load_labels(directory):
+    """
+    labels.json of a recorded session:
+    {"hits": [{"time": ms, "gun": "a", "x": px, "y": px}, ...], "corners": [[x, y] * 4],
+     "tolerance_px": 40, "time_tolerance_ms": 100}
+    time is the trigger time on the recording's clock, x/y are projector pixels.
+    corners default to the ones stored by the recorder.
+    """
+    with open(os.path.join(directory, LABELS_FILE), "r") as f:
+        return json.load(f)
+
+
+def draft_labels(directory, force=False):
+    """
+    Writes labels.json from the hits the system detected while recording, to be
+    corrected by hand: delete false hits, add missed ones, fix positions.
+    """
+    path = os.path.join(directory, LABELS_FILE)
+    if os.path.exists(path) and not force:
+        raise FileExistsError(f"{path} exists, use --force to overwrite it")
+    reader = SessionReader(directory)
+    hits = []
+    for _, _, detection in reader.records(kinds=(KIND_DETECTION,)):
+        if detection.get("gun") and detection.get("screen"):
+            x, y = detection["screen"]
+            hits.append({"time": detection["trigger_time"], "gun": detection["gun"], "x": x, "y": y})
+    labels = {"corners": reader.metadata().get("corners"), "tolerance_px": 40, "time_tolerance_ms": 100, "hits": hits}
+    with open(path, "w") as f:
+        json.dump(labels, f, indent=2)
+    return path, len(hits)
+
+
+class LabelledSession:
+    """
+    The part of a recorded session the tuner replays: every serial line and the
+    frames within WINDOW_BEFORE/WINDOW_AFTER of a serial line or a label. Only
+    those frames can produce or miss a hit. Up to cache_mb of them are kept
+    decoded, the rest stay JPEG and are decoded on every replay.
+    """
+    def __init__(self, directory, cache_mb=512):
+        self.directory = directory
+        labels = load_labels(directory)
+        reader = SessionReader(directory)
+        meta = reader.metadata()
+        self.corners = labels.get("corners") or meta.get("corners")
+        if not self.corners:
+            raise ValueError(f"{directory}: no corners in {LABELS_FILE} or in the recording")
+        self.hits = labels["hits"]
+        self.receivers = meta.get("receivers", 1)
+        # As recorded, never the tuning machine's lens_calibration.json and surfaces.json;
+        # recordings from before they were stored replay without either
+        self.lens_calibration = meta.get("lens_calibration")
+        self.surfaces = meta.get("surfaces", [])
+        self.tolerance_px = labels.get("tolerance_px", 40)
+        self.time_tolerance_ms = labels.get("time_tolerance_ms", 100)
+
+        times = sorted([t for _, t, _ in reader.records(kinds=(KIND_SERIAL,))] + [h["time"] for h in self.hits])
+        windows = []
+        for t in times:
+            if windows and t - WINDOW_BEFORE <= windows[-1][1]:
+                windows[-1][1] = t + WINDOW_AFTER
+            else:
+                windows.append([t - WINDOW_BEFORE, t + WINDOW_AFTER])
+        starts = [start for start, _ in windows]
+
+        self.records = []
+        self.frame_shape = None
+        budget = cache_mb * 2 ** 20
+        for kind, timestamp, payload in reader.records(kinds=(KIND_FRAME, KIND_SERIAL), decode=False):
+            if kind == KIND_FRAME:
+                i = bisect.bisect_right(starts, timestamp) - 1
+                if i < 0 or timestamp > windows[i][1]:
+                    continue
+                if budget > 0 or self.frame_shape is None:
+                    payload = SessionReader.decode_frame(*payload)
+                    self.frame_shape = payload.shape
+                    budget -= payload.nbytes
+            self.records.append((kind, timestamp, payload))
+        self.frames = sum(1 for kind, _, _ in self.records if kind == KIND_FRAME)
+
+    def frame(self, payload):
+        # analyse_frame draws on the frame, cached frames are reused by every candidate
+        return payload.copy() if isinstance(payload, np.ndarray) else SessionReader.decode_frame(*payload)
+
+    def make_system(self, config):
+        height, width = self.frame_shape[:2]
+        system = LaserDetectionSystem(
+            camera_index=0,
+            # One placeholder per recorded receiver, so gun ids get the same "receiver:gun" form
+            serial_port=[None] * self.receivers if self.receivers > 1 else None,
+            baudrate=115200,
+            projector_corners=self.corners,
+            camera_width=width,
+            camera_height=height,
+            camera_mode=CameraMode(width, height),
+            output_mode="none",
+            show_preview=False,
+            lens_calibration=LensCalibration.from_dict(self.lens_calibration) if self.lens_calibration else False,
+            detection_config=config,
+            surfaces=self.surfaces,
+        )
+        # Scored on the detected position, not the extrapolated one
+        system.PREDICTION_TARGET = "none"
+        system.logger.setLevel(logging.ERROR)
+        return system
+
+
+def match_hits(hits, labels, tolerance_px, time_tolerance_ms):
+    """Greedy one-to-one matching of (gun, x, y, trigger_time) hits to labels; returns [(hit, label, distance)]."""
+    pairs = []
+    for i, (gun, x, y, trigger_time) in enumerate(hits):
+        for j, label in enumerate(labels):
+            if label["gun"] != gun or abs(label["time"] - trigger_time) > time_tolerance_ms:
+                continue
+            distance = float(np.hypot(label["x"] - x, label["y"] - y))
+            if distance <= tolerance_px:
+                pairs.append((distance, i, j))
+    pairs.sort()
+    used_hits, used_labels, matches = set(), set(), []
+    for distance, i, j in pairs:
+        if i not in used_hits and j not in used_labels:
+            used_hits.add(i)
+            used_labels.add(j)
+            matches.append((hits[i], labels[j], distance))
+    return matches
+
+
+def evaluate(sessions, knobs):
+    """Replays every session with one configuration and scores its hits against the labels."""
+    config = knobs_to_config(knobs)
+    labels = matched = delivered = frames = 0
+    busy = 0.0
+    errors = []
+    for session in sessions:
+        system = session.make_system(config)
+        hits = []
+        for kind, timestamp, payload in session.records:
+            if kind == KIND_SERIAL:
+                receiver_id, line = serial_line(payload)
+                system.handle_serial_line(line, timestamp, receiver_id)
+                continue
+            frame = session.frame(payload)
+            start = time.perf_counter()
+            for gun, x, y, _, trigger_time, *_ in system.analyse_frame(frame, timestamp / 1000):
+                hits.append((gun, x, y, trigger_time))
+            busy += time.perf_counter() - start
+            frames += 1
+        matches = match_hits(hits, session.hits, session.tolerance_px, session.time_tolerance_ms)
+        labels += len(session.hits)
+        matched += len(matches)
+        delivered += len(hits)
+        errors.extend(distance for _, _, distance in matches)
+
+    false_positives = delivered - matched
+    return {
+        "knobs": knobs,
+        "labels": labels,
+        "matched": matched,
+        "false_positives": false_positives,
+        "hit_rate": matched / labels if labels else 0.0,
+        # A false hit costs as much as a missed one
+        "score": (matched - false_positives) / labels if labels else 0.0,
+        "frame_ms": busy * 1000 / frames if frames else float("nan"),
+        "error_px": float(np.mean(errors)) if errors else float("nan"),
+    }
+
+
+_sessions = None
+
+
+def _init_worker(directories, cache_mb):
+    global _sessions
+    logging.getLogger("LaserSystem").setLevel(logging.ERROR)
+    _sessions = [LabelledSession(directory, cache_mb) for directory in directories]
+
+
+def _evaluate(knobs):
+    return evaluate(_sessions, knobs)
+
+
+def tune(directories, points, workers=None, cache_mb=512):
+    """
+    Evaluates every configuration in `points` on a process pool; each worker
+    loads the sessions once. Results are ranked by score, then by frame cost.
+    """
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(list(directories), cache_mb)) as pool:
+        results = list(pool.map(_evaluate, points))
+    return sorted(results, key=lambda r: (-r["score"], r["frame_ms"]))
+
+
+def export(result, directories, path=CONFIG_FILE):
+    config = knobs_to_config(result["knobs"])
+    config["tuning"] = {
+        "sessions": [os.path.abspath(d) for d in directories],
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        **{k: result[k] for k in ("labels", "matched", "false_positives", "hit_rate", "score", "frame_ms", "error_px")},
+    }
+    save_detection_config(config, path)
+    return config
+
+
+def print_ranking(results, top):
+    print(f"{'#':>3} {'score':>6} {'hits':>9} {'false':>6} {'ms/frame':>9} {'err px':>7}  knobs")
+    for rank, r in enumerate(results[:top], 1):
+        knobs = " ".join(f"{k}={v}" for k, v in r["knobs"].items())
+        default = " (default)" if r["knobs"] == DEFAULT_KNOBS else ""
+        print(f"{rank:>3} {r['score']:>6.3f} {r['matched']:>4}/{r['labels']:<4} {r['false_positives']:>6} "
+              f"{r['frame_ms']:>9.2f} {r['error_px']:>7.1f}  {knobs}{default}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(
+        description="Search detection parameters on labelled recordings and export the best as detection_config.json.")
+    parser.add_argument("sessions", nargs="+", help="recording directories, each with a labels.json")
+    parser.add_argument("--draft-labels", action="store_true",
+                        help="write labels.json from the recorded detections for hand correction, then exit")
+    parser.add_argument("--force", action="store_true", help="overwrite existing labels.json with --draft-labels")
+    parser.add_argument("--search", choices=["random", "grid"], default="random")
+    parser.add_argument("--samples", type=int, default=200, help="configurations tried by the random search")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes, default one per core")
+    parser.add_argument("--cache-mb", type=int, default=512, help="decoded frames kept per worker")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--output", default=CONFIG_FILE)
+    parser.add_argument("--dry-run", action="store_true", help="only print the ranking")
+    args = parser.parse_args()
+
+    if args.draft_labels:
+        for directory in args.sessions:
+            path, count = draft_labels(directory, args.force)
+            print(f"{path}: {count} hits drafted")
+        sys.exit(0)
+
+    points = candidates(args.search, args.samples, args.seed)
+    print(f"Evaluating {len(points)} configurations on {len(args.sessions)} session(s)...")
+    started = time.perf_counter()
+    ranked = tune(args.sessions, points, args.workers, args.cache_mb)
+    print(f"done in {time.perf_counter() - started:.0f} s")
+    print_ranking(ranked, args.top)
+    if not args.dry_run:
+        export(ranked[0], args.sessions, args.output)
+        print(f"Best configuration written to {args.output}, LaserDetectionSystem loads it on start.")